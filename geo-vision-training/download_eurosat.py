@@ -3,82 +3,99 @@ Download EuroSAT dataset and organize for training.
 
 Run: python download_eurosat.py
 Result: data/EuroSAT/ folder with 10 class subdirectories
+
+Optional packed copy for faster training (see packed_dataset.py):
+  python download_eurosat.py --pack        download, then pack
+  python download_eurosat.py --pack-only   pack an existing data/EuroSAT
+Result: data/EuroSAT_packed/ with uint8 shards and a checksummed index
 """
 
+import argparse
 import os
 import shutil
+import time
 
-print("Downloading EuroSAT dataset...")
-
-try:
-    from torchvision.datasets import EuroSAT
-
-    # Download to 'data' folder
-    dataset = EuroSAT(root="data", download=True)
-    print(f"Downloaded {len(dataset)} images")
-    print(f"Classes: {dataset.classes}")
-
-    # Find where torchvision actually put the class folders
-    # It typically downloads to: data/eurosat/2750/ or data/eurosat-rgb/
-    eurosat_dir = None
-    for root, dirs, files in os.walk("data"):
-        # Look for the folder containing all 10 EuroSAT class folders
-        if "Forest" in dirs and "River" in dirs and "Highway" in dirs:
-            eurosat_dir = root
-            print(f"Found dataset at: {eurosat_dir}")
-            break
-
-    if eurosat_dir is None:
-        # Check if EuroSAT images live directly inside dataset._data_dir
-        if hasattr(dataset, '_data_dir'):
-            candidate = str(dataset._data_dir)
-            if os.path.exists(candidate):
-                for root, dirs, files in os.walk(candidate):
-                    if "Forest" in dirs:
-                        eurosat_dir = root
-                        print(f"Found dataset at: {eurosat_dir}")
-                        break
+from packed_dataset import SHARD_SIZE, pack_dataset, verify_shards
 
-    target = os.path.join("data", "EuroSAT")
+parser = argparse.ArgumentParser(description="Download EuroSAT and optionally pack it into memory-mapped shards")
+parser.add_argument("--pack", action="store_true", help="also write packed shards after downloading")
+parser.add_argument("--pack-only", action="store_true", help="skip the download and pack data/EuroSAT")
+parser.add_argument("--packed-dir", default=os.path.join("data", "EuroSAT_packed"))
+parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="images per shard")
+args = parser.parse_args()
 
-    if eurosat_dir and os.path.normpath(eurosat_dir) != os.path.normpath(target):
-        if os.path.exists(target):
-            shutil.rmtree(target)
-        print(f"Copying {eurosat_dir} -> {target}")
-        shutil.copytree(eurosat_dir, target)
-        print("Dataset organized!")
-    elif eurosat_dir:
-        print("Dataset already at correct location.")
-    else:
-        print("WARNING: Could not find class folders automatically.")
-        print("Checking standard torchvision locations...")
-
-        # Try common torchvision paths
-        candidates = [
-            os.path.join("data", "eurosat", "2750"),
-            os.path.join("data", "eurosat"),
-            os.path.join("data", "EuroSAT", "2750"),
-        ]
-        for c in candidates:
-            if os.path.exists(c) and os.path.isdir(c):
-                subdirs = [d for d in os.listdir(c) if os.path.isdir(os.path.join(c, d))]
-                if "Forest" in subdirs:
-                    eurosat_dir = c
-                    if os.path.normpath(c) != os.path.normpath(target):
-                        shutil.copytree(c, target)
-                    print(f"Found at {c}")
-                    break
+if not args.pack_only:
+    print("Downloading EuroSAT dataset...")
+
+    try:
+        from torchvision.datasets import EuroSAT
+
+        # Download to 'data' folder
+        dataset = EuroSAT(root="data", download=True)
+        print(f"Downloaded {len(dataset)} images")
+        print(f"Classes: {dataset.classes}")
+
+        # Find where torchvision actually put the class folders
+        # It typically downloads to: data/eurosat/2750/ or data/eurosat-rgb/
+        eurosat_dir = None
+        for root, dirs, files in os.walk("data"):
+            # Look for the folder containing all 10 EuroSAT class folders
+            if "Forest" in dirs and "River" in dirs and "Highway" in dirs:
+                eurosat_dir = root
+                print(f"Found dataset at: {eurosat_dir}")
+                break
 
         if eurosat_dir is None:
-            print("Auto-locate failed. Please manually move the class folders to data/EuroSAT/")
+            # Check if EuroSAT images live directly inside dataset._data_dir
+            if hasattr(dataset, '_data_dir'):
+                candidate = str(dataset._data_dir)
+                if os.path.exists(candidate):
+                    for root, dirs, files in os.walk(candidate):
+                        if "Forest" in dirs:
+                            eurosat_dir = root
+                            print(f"Found dataset at: {eurosat_dir}")
+                            break
+
+        target = os.path.join("data", "EuroSAT")
 
-except Exception as e:
-    print(f"Error: {e}")
-    print()
-    print("Manual download:")
-    print("1. Go to: https://github.com/phelber/eurosat")
-    print("2. Download the RGB dataset ZIP")
-    print("3. Extract to: geo-vision-training/data/EuroSAT/")
+        if eurosat_dir and os.path.normpath(eurosat_dir) != os.path.normpath(target):
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            print(f"Copying {eurosat_dir} -> {target}")
+            shutil.copytree(eurosat_dir, target)
+            print("Dataset organized!")
+        elif eurosat_dir:
+            print("Dataset already at correct location.")
+        else:
+            print("WARNING: Could not find class folders automatically.")
+            print("Checking standard torchvision locations...")
+
+            # Try common torchvision paths
+            candidates = [
+                os.path.join("data", "eurosat", "2750"),
+                os.path.join("data", "eurosat"),
+                os.path.join("data", "EuroSAT", "2750"),
+            ]
+            for c in candidates:
+                if os.path.exists(c) and os.path.isdir(c):
+                    subdirs = [d for d in os.listdir(c) if os.path.isdir(os.path.join(c, d))]
+                    if "Forest" in subdirs:
+                        eurosat_dir = c
+                        if os.path.normpath(c) != os.path.normpath(target):
+                            shutil.copytree(c, target)
+                        print(f"Found at {c}")
+                        break
+
+            if eurosat_dir is None:
+                print("Auto-locate failed. Please manually move the class folders to data/EuroSAT/")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        print()
+        print("Manual download:")
+        print("1. Go to: https://github.com/phelber/eurosat")
+        print("2. Download the RGB dataset ZIP")
+        print("3. Extract to: geo-vision-training/data/EuroSAT/")
 
 # Verify
 target = os.path.join("data", "EuroSAT")
@@ -94,3 +111,17 @@ if os.path.exists(target):
         print("WARNING: data/EuroSAT exists but has no class subdirectories")
 else:
     print(f"\n❌ {target} not found. See manual download instructions above.")
+
+# Optional: packed shards
+if (args.pack or args.pack_only) and os.path.exists(target):
+    print(f"\nPacking {target} -> {args.packed_dir} ({args.shard_size} images/shard)...")
+    start_time = time.time()
+    index = pack_dataset(target, args.packed_dir, args.shard_size)
+    corrupt = verify_shards(args.packed_dir, index)
+    size_mb = sum(os.path.getsize(os.path.join(args.packed_dir, s["file"])) for s in index["shards"]) / 1e6
+    print(f"Packed {index['count']} images into {len(index['shards'])} shards "
+          f"({size_mb:.0f} MB) in {time.time() - start_time:.0f}s")
+    if corrupt:
+        print(f"WARNING: checksum mismatch after packing: {corrupt}")
+    else:
+        print("✅ Shard checksums verified")
@@ -0,0 +1,221 @@
+"""
+Packed EuroSAT — memory-mapped uint8 shards instead of one JPEG per sample.
+
+Pack:       python download_eurosat.py --pack   (or --pack-only for an existing data/EuroSAT)
+Benchmark:  python packed_dataset.py            (images/sec vs ImageFolder)
+
+Layout of the packed directory:
+  shard-00000.npy ...  (n, H, W, 3) uint8 images, SHARD_SIZE per shard
+  index.json           classes, image shape, per-shard offset/count/BLAKE2b
+                       checksum and the source path + label of every sample
+
+PackedEuroSAT opens the shards as copy-on-write memory maps and serves each
+sample as a (3, H, W) uint8 tensor view of the mapped pages — no decode and
+no copy until the transform runs. Shards are opened lazily in each process,
+so DataLoader workers share the page cache instead of pickled arrays.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+try:
+    import torch
+    from torch.utils.data import Dataset
+    HAS_TORCH = True
+except ImportError:  # packing only needs NumPy + Pillow
+    Dataset = object
+    HAS_TORCH = False
+
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+SHARD_SIZE = 4096
+IMAGE_SIZE = 64  # EuroSAT's native chip size
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif")
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pack_dataset(data_dir: str, packed_dir: str, shard_size: int = SHARD_SIZE,
+                 image_size: int = IMAGE_SIZE) -> dict:
+    """Convert an ImageFolder tree (class subdirectories) into packed shards; returns the index."""
+    classes = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    samples = []
+    for label, name in enumerate(classes):
+        for filename in sorted(os.listdir(os.path.join(data_dir, name))):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((f"{name}/{filename}", label))
+    if not samples:
+        raise ValueError(f"No images found under {data_dir}")
+
+    os.makedirs(packed_dir, exist_ok=True)
+    shape = (image_size, image_size, 3)
+    shards = []
+    for offset in range(0, len(samples), shard_size):
+        chunk = samples[offset:offset + shard_size]
+        filename = f"shard-{len(shards):05d}.npy"
+        partial = os.path.join(packed_dir, filename + ".partial")
+        out = np.lib.format.open_memmap(partial, mode="w+", dtype=np.uint8, shape=(len(chunk), *shape))
+        for i, (rel_path, _) in enumerate(chunk):
+            with Image.open(os.path.join(data_dir, rel_path)) as img:
+                img = img.convert("RGB")
+                if img.size != (image_size, image_size):
+                    img = img.resize((image_size, image_size), Image.BILINEAR)
+                out[i] = np.asarray(img)
+        out.flush()
+        del out
+        os.replace(partial, os.path.join(packed_dir, filename))
+        shards.append({
+            "file": filename,
+            "offset": offset,
+            "count": len(chunk),
+            "blake2b": file_checksum(os.path.join(packed_dir, filename)),
+        })
+        print(f"  Packed {offset + len(chunk)}/{len(samples)} -> {filename}")
+
+    index = {
+        "version": FORMAT_VERSION,
+        "source": data_dir,
+        "classes": classes,
+        "image_shape": list(shape),
+        "count": len(samples),
+        "shards": shards,
+        "samples": samples,
+    }
+    # The index is written last, so a packed directory with an index is complete
+    with open(os.path.join(packed_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+    return index
+
+
+def read_index(packed_dir: str) -> dict:
+    with open(os.path.join(packed_dir, INDEX_FILE)) as f:
+        index = json.load(f)
+    if index.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Packed format version {index.get('version')}, expected {FORMAT_VERSION}")
+    return index
+
+
+def verify_shards(packed_dir: str, index: dict) -> list[str]:
+    """Files whose checksum does not match the index (empty when all are intact)."""
+    return [
+        shard["file"] for shard in index["shards"]
+        if not os.path.exists(os.path.join(packed_dir, shard["file"]))
+        or file_checksum(os.path.join(packed_dir, shard["file"])) != shard["blake2b"]
+    ]
+
+
+class PackedEuroSAT(Dataset):
+    """ImageFolder-compatible dataset over packed shards (classes, targets, samples)."""
+
+    def __init__(self, packed_dir: str, transform=None, verify: bool = False):
+        index = read_index(packed_dir)
+        if verify:
+            corrupt = verify_shards(packed_dir, index)
+            if corrupt:
+                raise ValueError(f"Checksum mismatch in {packed_dir}: {corrupt}")
+        self.packed_dir = packed_dir
+        self.transform = transform
+        self.classes = index["classes"]
+        self.samples = [(os.path.join(index["source"], path), label) for path, label in index["samples"]]
+        self.targets = [label for _, label in index["samples"]]
+        self.shard_files = [shard["file"] for shard in index["shards"]]
+        self.offsets = np.array([shard["offset"] for shard in index["shards"]])
+        self._shards = None
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def __getstate__(self) -> dict:
+        # Workers reopen the maps rather than receive pickled copies of them
+        return {**self.__dict__, "_shards": None}
+
+    def _open(self) -> list:
+        if self._shards is None:
+            self._shards = [np.load(os.path.join(self.packed_dir, f), mmap_mode="c") for f in self.shard_files]
+        return self._shards
+
+    def __getitem__(self, i: int):
+        s = int(np.searchsorted(self.offsets, i, side="right")) - 1
+        image = torch.from_numpy(self._open()[s][i - self.offsets[s]]).permute(2, 0, 1)
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, self.targets[i]
+
+
+def tensor_transform(img_size: int):
+    """uint8 (3, H, W) tensor → normalized float model input (PIL-free counterpart of train.py's transform)."""
+    from torchvision import transforms
+
+    return transforms.Compose([
+        transforms.Resize((img_size, img_size), antialias=True),
+        transforms.ConvertImageDtype(torch.float32),
+        transforms.Normalize(mean=MEAN, std=STD),
+    ])
+
+
+# ---------------------------------------------------------------------------
+# Benchmark: DataLoader throughput, ImageFolder vs packed
+# ---------------------------------------------------------------------------
+
+def _throughput(dataset, batch_size: int, workers: int, batches: int) -> float:
+    from torch.utils.data import DataLoader
+
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=workers,
+                        generator=torch.Generator().manual_seed(0))
+    it = iter(loader)
+    next(it)  # worker start-up is not throughput
+    count = 0
+    start = time.perf_counter()
+    for _, (images, _) in zip(range(batches), it):
+        count += len(images)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    from torchvision import datasets, transforms
+
+    parser = argparse.ArgumentParser(description="Compare ImageFolder and packed-shard loading throughput")
+    parser.add_argument("--data-dir", default="data/EuroSAT")
+    parser.add_argument("--packed-dir", default="data/EuroSAT_packed")
+    parser.add_argument("--img-size", type=int, default=224)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batches", type=int, default=100)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    packed = PackedEuroSAT(args.packed_dir, transform=tensor_transform(args.img_size), verify=True)
+    print(f"Packed: {len(packed)} images, checksums verified in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    folder = datasets.ImageFolder(args.data_dir, transform=transforms.Compose([
+        transforms.Resize((args.img_size, args.img_size)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=MEAN, std=STD),
+    ]))
+    print(f"ImageFolder: {len(folder)} images, scanned in {time.perf_counter() - start:.1f}s")
+
+    print(f"\nBatch {args.batch_size}, {args.workers} workers, {args.batches} batches:")
+    results = {}
+    for name, dataset in (("ImageFolder", folder), ("Packed", packed)):
+        results[name] = _throughput(dataset, args.batch_size, args.workers, args.batches)
+        print(f"  {name:<12} {results[name]:8.0f} images/s")
+    print(f"  Speed-up: {results['Packed'] / results['ImageFolder']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,171 +2,358 @@
 GeoVision CNN Training — EuroSAT Dataset
 Transfer Learning with ResNet50
 
-Train:   python train.py
+Train:   python train.py [--batch-size 32] [--workers 2] [--persistent-workers]
+                         [--prefetch-factor 2] [--channels-last] [--bf16] [--compile]
 Result:  landuse_model.pt (10-class land-use classifier)
 
 Classes: AnnualCrop, Forest, HerbaceousVegetation, Highway,
          Industrial, Pasture, PermanentCrop, Residential, River, SeaLake
+
+The backbone is frozen, so its output for an image never changes:
+  1. Feature extraction — ResNet50 runs once per image and fixed
+     augmentation view (VIEWS: flips and a 90° rotation) and the 2048-d
+     pooled features go to a memory-mapped float16 cache in FEATURE_DIR.
+     Later runs reuse the cache as long as the dataset and views match.
+     Images come from the packed shards in PACKED_DIR when present
+     (python download_eurosat.py --pack), otherwise from the JPEG tree.
+  2. Head training — the fc head trains straight from the cache, drawing
+     a random view per image each epoch; seconds per epoch on CPU.
+
+Both stages report images/sec and data-loader stall (time the loop spent
+waiting for the next batch). Extraction-only flags — they tune the one-time
+backbone pass and do nothing once the cache exists: --extract-batch-size,
+--workers, --persistent-workers, --prefetch-factor, --channels-last, --bf16
+(CPU bfloat16 autocast; CUDA always extracts in float16) and --compile.
+bf16 features are cached separately from float32 ones. Head training reads
+batches straight from the memory-mapped cache in the main process, so
+--batch-size, --epochs and --threads are what tune later runs.
 """
 
+import argparse
+import copy
+import hashlib
+import json
 import os
 import time
+
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from torchvision import datasets, transforms, models
 from torch.utils.data import DataLoader
 
+from packed_dataset import INDEX_FILE, PackedEuroSAT, tensor_transform
+
 # ---------------------------------------------------------------------------
 # Config
 # ---------------------------------------------------------------------------
 DATA_DIR = "data/EuroSAT"
+PACKED_DIR = "data/EuroSAT_packed"
 MODEL_PATH = "landuse_model.pt"
+VAL_SPLIT_PATH = "landuse_model_val.json"  # held-out images, for export_model's int8 checks
+FEATURE_DIR = "features"
+EXTRACT_BATCH_SIZE = 64
 BATCH_SIZE = 32
 EPOCHS = 10
+NUM_WORKERS = 2
+PREFETCH_FACTOR = 2
 LEARNING_RATE = 0.001
 IMG_SIZE = 224
 TRAIN_SPLIT = 0.8
+SEED = 0
+VIEWS = ("identity", "hflip", "vflip", "rot90")  # validation uses "identity"
+
+parser = argparse.ArgumentParser(description="Train the EuroSAT land-use head on cached ResNet50 features")
+parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="head training batch size")
+parser.add_argument("--extract-batch-size", type=int, default=EXTRACT_BATCH_SIZE, help="backbone batch size")
+parser.add_argument("--epochs", type=int, default=EPOCHS)
+parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="extraction DataLoader worker processes")
+parser.add_argument("--persistent-workers", action="store_true", help="extraction DataLoader persistent_workers")
+parser.add_argument("--prefetch-factor", type=int, default=PREFETCH_FACTOR, help="extraction: batches prefetched per worker")
+parser.add_argument("--channels-last", action="store_true", help="extraction: NHWC memory format for the backbone")
+parser.add_argument("--bf16", action="store_true", help="extraction: bfloat16 autocast on CPU")
+parser.add_argument("--compile", action="store_true", help="extraction: torch.compile the backbone")
+parser.add_argument("--threads", type=int, default=None, help="intra-op CPU threads (torch default if unset)")
+args = parser.parse_args()
+if args.epochs < 1:
+    parser.error("--epochs must be at least 1")
+
+if args.threads:
+    torch.set_num_threads(args.threads)
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print(f"Device: {device}")
 if torch.cuda.is_available():
     print(f"GPU: {torch.cuda.get_device_name(0)}")
+else:
+    print(f"CPU threads: {torch.get_num_threads()}")
+
+# Backbone precision: float16 on CUDA, bfloat16 on CPU with --bf16, else float32
+if device.type == "cuda":
+    autocast_dtype = torch.float16
+elif args.bf16:
+    autocast_dtype = torch.bfloat16
+else:
+    autocast_dtype = None
+precision = {torch.float16: "fp16", torch.bfloat16: "bf16", None: "fp32"}[autocast_dtype]
+
+
+def loader_options() -> dict:
+    options = {"num_workers": args.workers, "pin_memory": device.type == "cuda"}
+    if args.workers > 0:
+        options.update(persistent_workers=args.persistent_workers, prefetch_factor=args.prefetch_factor)
+    return options
+
 
 # ---------------------------------------------------------------------------
 # Data
 # ---------------------------------------------------------------------------
-print(f"\nLoading dataset from {DATA_DIR}...")
-
-train_transform = transforms.Compose([
-    transforms.Resize((IMG_SIZE, IMG_SIZE)),
-    transforms.RandomHorizontalFlip(),
-    transforms.RandomVerticalFlip(),
-    transforms.RandomRotation(15),
-    transforms.ColorJitter(brightness=0.2, contrast=0.2),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
-
-val_transform = transforms.Compose([
-    transforms.Resize((IMG_SIZE, IMG_SIZE)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
-
-# Load full dataset to get class names
-full_dataset = datasets.ImageFolder(DATA_DIR, transform=train_transform)
-classes = full_dataset.classes
+if os.path.exists(os.path.join(PACKED_DIR, INDEX_FILE)):
+    print(f"\nLoading packed dataset from {PACKED_DIR}...")
+    dataset = PackedEuroSAT(PACKED_DIR, transform=tensor_transform(IMG_SIZE))
+else:
+    print(f"\nLoading dataset from {DATA_DIR}...")
+    transform = transforms.Compose([
+        transforms.Resize((IMG_SIZE, IMG_SIZE)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+    dataset = datasets.ImageFolder(DATA_DIR, transform=transform)
+classes = dataset.classes
 num_classes = len(classes)
+labels = np.array(dataset.targets)
 print(f"Classes ({num_classes}): {classes}")
-print(f"Total images: {len(full_dataset)}")
-
-# Split
-train_size = int(TRAIN_SPLIT * len(full_dataset))
-val_size = len(full_dataset) - train_size
-train_dataset, val_dataset = torch.utils.data.random_split(full_dataset, [train_size, val_size])
-
-# Apply different transforms for validation
-val_dataset.dataset = datasets.ImageFolder(DATA_DIR, transform=val_transform)
+print(f"Total images: {len(dataset)}")
 
-train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True, num_workers=2, pin_memory=True)
-val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE, shuffle=False, num_workers=2, pin_memory=True)
-
-print(f"Train: {train_size} | Val: {val_size}")
+# Split (seeded, so cached features and the split stay consistent across runs)
+order = np.random.default_rng(SEED).permutation(len(dataset))
+train_size = int(TRAIN_SPLIT * len(dataset))
+train_idx, val_idx = order[:train_size], order[train_size:]
+print(f"Train: {len(train_idx)} | Val: {len(val_idx)}")
 
 # ---------------------------------------------------------------------------
 # Model
 # ---------------------------------------------------------------------------
 print("\nBuilding ResNet50 model...")
 model = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V2)
+feature_dim = model.fc.in_features
 
-# Freeze backbone
+# Freeze backbone; fc → identity exposes the pooled features
 for param in model.parameters():
     param.requires_grad = False
+model.fc = nn.Identity()
+model = model.to(device).eval()
+if args.channels_last:
+    model = model.to(memory_format=torch.channels_last)
+backbone = torch.compile(model) if args.compile else model
 
-# Replace classifier
-model.fc = nn.Sequential(
+# ---------------------------------------------------------------------------
+# Feature extraction (skipped when the cache matches)
+# ---------------------------------------------------------------------------
+samples_digest = hashlib.blake2b(
+    "\n".join(f"{os.path.relpath(path, DATA_DIR)}\t{label}" for path, label in dataset.samples).encode(),
+    digest_size=16,
+).hexdigest()
+cache_meta = {
+    "backbone": "resnet50/IMAGENET1K_V2",
+    "input": type(dataset).__name__,
+    "img_size": IMG_SIZE,
+    "precision": precision,
+    "views": list(VIEWS),
+    "samples": samples_digest,
+    "shape": [len(VIEWS), len(dataset), feature_dim],
+    "dtype": "float16",
+}
+features_path = os.path.join(FEATURE_DIR, "features.npy")
+meta_path = os.path.join(FEATURE_DIR, "meta.json")
+
+
+def apply_view(images: torch.Tensor, view: str) -> torch.Tensor:
+    if view == "hflip":
+        return images.flip(3)
+    if view == "vflip":
+        return images.flip(2)
+    if view == "rot90":
+        return images.rot90(1, (2, 3))
+    return images
+
+
+cached = False
+if os.path.exists(features_path) and os.path.exists(meta_path):
+    with open(meta_path) as f:
+        cached = json.load(f) == cache_meta
+
+if cached:
+    print(f"\nUsing cached features: {features_path}")
+else:
+    print(f"\nExtracting features ({len(dataset)} images x {len(VIEWS)} views, {precision})...")
+    os.makedirs(FEATURE_DIR, exist_ok=True)
+    partial_path = features_path + ".partial"
+    out = np.lib.format.open_memmap(partial_path, mode="w+", dtype=np.float16, shape=tuple(cache_meta["shape"]))
+    loader = DataLoader(dataset, batch_size=args.extract_batch_size, shuffle=False, **loader_options())
+    memory_format = torch.channels_last if args.channels_last else torch.contiguous_format
+    start_time = time.time()
+    stall = 0.0
+    done = 0
+    with torch.inference_mode(), torch.autocast(device.type, dtype=autocast_dtype, enabled=autocast_dtype is not None):
+        wait = time.perf_counter()
+        for batch_idx, (images, _) in enumerate(loader):
+            stall += time.perf_counter() - wait
+            images = images.to(device, non_blocking=True)
+            for v, view in enumerate(VIEWS):
+                inputs = apply_view(images, view).contiguous(memory_format=memory_format)
+                out[v, done:done + len(images)] = backbone(inputs).float().cpu().numpy()
+            done += len(images)
+            if (batch_idx + 1) % 50 == 0:
+                elapsed = time.time() - start_time
+                print(f"  Images {done}/{len(dataset)} | {done / elapsed:.0f} images/s "
+                      f"| Loader stall: {stall:.1f}s ({100 * stall / elapsed:.0f}%)")
+            wait = time.perf_counter()
+    out.flush()
+    del out
+    os.replace(partial_path, features_path)
+    with open(meta_path, "w") as f:
+        json.dump(cache_meta, f)
+    extract_time = time.time() - start_time
+    print(f"Feature extraction: {extract_time:.0f}s ({extract_time/60:.1f} min), "
+          f"{len(dataset) / extract_time:.0f} images/s, loader stall {stall:.0f}s -> {features_path}")
+
+features = np.load(features_path, mmap_mode="r")
+x_val = torch.from_numpy(features[0, val_idx].astype(np.float32)).to(device)
+y_val = torch.from_numpy(labels[val_idx]).to(device)
+
+
+class CachedFeatures(torch.utils.data.Dataset):
+    """Whole batches of cached features, indexed by flat (view * images + image) positions."""
+
+    def __init__(self, path: str, labels: np.ndarray):
+        self.path = path
+        self.labels = labels
+        self._features = None  # opened lazily in each worker
+
+    def __len__(self) -> int:
+        return len(VIEWS) * len(self.labels)
+
+    def __getitem__(self, flat: np.ndarray):
+        if self._features is None:
+            mapped = np.load(self.path, mmap_mode="r")
+            self._features = mapped.reshape(-1, mapped.shape[-1])
+        flat = np.sort(flat)  # sequential page access; order within a batch is irrelevant
+        inputs = torch.from_numpy(self._features[flat].astype(np.float32))
+        return inputs, torch.from_numpy(self.labels[flat % len(self.labels)])
+
+
+class ViewBatches:
+    """Batch sampler: shuffled train images, one random cached view each, redrawn every epoch."""
+
+    def __init__(self, indices: np.ndarray, batch_size: int, seed: int):
+        self.indices = indices
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return (len(self.indices) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        order = self.rng.permutation(self.indices)
+        flat = self.rng.integers(len(VIEWS), size=len(order)) * len(labels) + order
+        for b in range(0, len(flat), self.batch_size):
+            yield flat[b:b + self.batch_size]
+
+
+# A batch is one gather from the page-cached memmap: worker processes would
+# only add IPC, so head batches load in the main process
+train_loader = DataLoader(CachedFeatures(features_path, labels), sampler=ViewBatches(train_idx, args.batch_size, SEED),
+                          batch_size=None, pin_memory=device.type == "cuda")
+
+# ---------------------------------------------------------------------------
+# Head
+# ---------------------------------------------------------------------------
+head = nn.Sequential(
     nn.Dropout(0.3),
-    nn.Linear(model.fc.in_features, 512),
+    nn.Linear(feature_dim, 512),
     nn.ReLU(),
     nn.Dropout(0.2),
     nn.Linear(512, num_classes),
-)
-
-model = model.to(device)
+).to(device)
 
 criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.fc.parameters(), lr=LEARNING_RATE)
+optimizer = optim.Adam(head.parameters(), lr=LEARNING_RATE)
 scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=5, gamma=0.5)
 
 # ---------------------------------------------------------------------------
 # Training
 # ---------------------------------------------------------------------------
-print(f"\nTraining for {EPOCHS} epochs...")
+print(f"\nTraining head for {args.epochs} epochs...")
 best_acc = 0.0
+best_state = copy.deepcopy(head.state_dict())
 start_time = time.time()
 
-for epoch in range(EPOCHS):
-    # Train
-    model.train()
+for epoch in range(args.epochs):
+    # Train — one random cached view per image
+    head.train()
     running_loss = 0.0
     correct = 0
     total = 0
+    epoch_start = time.perf_counter()
+    stall = 0.0
 
-    for batch_idx, (images, labels) in enumerate(train_loader):
-        images, labels = images.to(device), labels.to(device)
+    wait = time.perf_counter()
+    for inputs, targets in train_loader:
+        stall += time.perf_counter() - wait
+        inputs, targets = inputs.to(device, non_blocking=True), targets.to(device, non_blocking=True)
 
         optimizer.zero_grad()
-        outputs = model(images)
-        loss = criterion(outputs, labels)
+        outputs = head(inputs)
+        loss = criterion(outputs, targets)
         loss.backward()
         optimizer.step()
 
         running_loss += loss.item()
         _, predicted = torch.max(outputs, 1)
-        total += labels.size(0)
-        correct += (predicted == labels).sum().item()
-
-        if (batch_idx + 1) % 50 == 0:
-            print(f"  Batch {batch_idx+1}/{len(train_loader)} | Loss: {loss.item():.4f}")
+        total += targets.size(0)
+        correct += (predicted == targets).sum().item()
+        wait = time.perf_counter()
 
+    epoch_time = time.perf_counter() - epoch_start
     train_acc = 100 * correct / total
     train_loss = running_loss / len(train_loader)
 
     # Validate
-    model.eval()
-    val_correct = 0
-    val_total = 0
-
+    head.eval()
     with torch.no_grad():
-        for images, labels in val_loader:
-            images, labels = images.to(device), labels.to(device)
-            outputs = model(images)
-            _, predicted = torch.max(outputs, 1)
-            val_total += labels.size(0)
-            val_correct += (predicted == labels).sum().item()
-
-    val_acc = 100 * val_correct / val_total
+        _, predicted = torch.max(head(x_val), 1)
+    val_acc = 100 * (predicted == y_val).sum().item() / len(val_idx)
 
     elapsed = time.time() - start_time
-    print(f"Epoch [{epoch+1}/{EPOCHS}] | Loss: {train_loss:.4f} | Train Acc: {train_acc:.1f}% | Val Acc: {val_acc:.1f}% | Time: {elapsed:.0f}s")
+    print(f"Epoch [{epoch+1}/{args.epochs}] | Loss: {train_loss:.4f} | Train Acc: {train_acc:.1f}% | Val Acc: {val_acc:.1f}% "
+          f"| {total / epoch_time:.0f} images/s | Loader stall: {stall:.2f}s ({100 * stall / epoch_time:.0f}%) | Time: {elapsed:.1f}s")
 
-    # Save best model
     if val_acc > best_acc:
         best_acc = val_acc
-        torch.save(model.state_dict(), MODEL_PATH)
-        print(f"  -> Best model saved ({val_acc:.1f}%)")
+        best_state = copy.deepcopy(head.state_dict())
 
     scheduler.step()
 
+train_time = time.time() - start_time
+
+# Save backbone + best head as one ResNet50 state_dict (what cnn_model loads)
+head.load_state_dict(best_state)
+model.fc = head
+torch.save(model.state_dict(), MODEL_PATH)
+with open(VAL_SPLIT_PATH, "w") as f:
+    json.dump({"seed": SEED, "train_split": TRAIN_SPLIT, "images": sorted(
+        "/".join(os.path.normpath(dataset.samples[i][0]).split(os.sep)[-2:]) for i in val_idx
+    )}, f)
+
 # ---------------------------------------------------------------------------
 # Done
 # ---------------------------------------------------------------------------
-total_time = time.time() - start_time
 print(f"\n{'='*50}")
 print(f"Training complete!")
 print(f"Best validation accuracy: {best_acc:.1f}%")
-print(f"Total time: {total_time:.0f}s ({total_time/60:.1f} min)")
-print(f"Model saved: {MODEL_PATH}")
+print(f"Head training time: {train_time:.1f}s")
+print(f"Model saved: {MODEL_PATH} (validation split: {VAL_SPLIT_PATH})")
 print(f"Classes: {classes}")
-print(f"\nTo integrate: copy {MODEL_PATH} to gsis-backend/models/")
+print(f"\nTo integrate: copy {MODEL_PATH} and {VAL_SPLIT_PATH} to gsis-backend/models/")
@@ -0,0 +1,170 @@
+"""
+GeoVision Pixel Classifier Training — EuroSAT Dataset
+NumPy-only multinomial logistic regression (no PyTorch)
+
+Train:   python train_pixel_classifier.py
+Result:  landuse_pixel.npz (10-class land-use classifier, a few KB)
+
+Features are colour histograms, NDVI/NDWI proxies and texture statistics,
+computed by gsis-backend's app.models.pixel_classifier.extract_features on
+images decoded exactly like uploads (decode_rgb), so training and serving
+see identical inputs.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "gsis-backend"))
+
+from app.models.cnn_model import CLASSES  # noqa: E402
+from app.models.pixel_classifier import PixelClassifier, extract_features  # noqa: E402
+from app.utils.image_utils import decode_rgb  # noqa: E402
+
+# ---------------------------------------------------------------------------
+# Config
+# ---------------------------------------------------------------------------
+DATA_DIR = "data/EuroSAT"
+MODEL_PATH = "landuse_pixel.npz"
+TRAIN_SPLIT = 0.8
+STEPS = 2000
+LEARNING_RATE = 0.05
+L2 = 1e-4
+SEED = 0
+
+# ---------------------------------------------------------------------------
+# Data → features
+# ---------------------------------------------------------------------------
+print(f"Loading dataset from {DATA_DIR}...")
+classes = sorted(d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d)))
+if classes != CLASSES:
+    sys.exit(f"Class folders {classes} do not match the backend classes {CLASSES}")
+
+paths, labels = [], []
+for label, name in enumerate(classes):
+    folder = os.path.join(DATA_DIR, name)
+    for filename in sorted(os.listdir(folder)):
+        if filename.lower().endswith((".jpg", ".jpeg", ".png", ".tif")):
+            paths.append(os.path.join(folder, filename))
+            labels.append(label)
+labels = np.array(labels)
+print(f"Classes ({len(classes)}): {classes}")
+print(f"Total images: {len(paths)}")
+
+start_time = time.time()
+features = np.empty((len(paths), len(extract_features(np.zeros((64, 64, 3), np.uint8)))), np.float32)
+for i, path in enumerate(paths):
+    with open(path, "rb") as f:
+        pixels = decode_rgb(f.read()).pixels
+    features[i] = extract_features(pixels)
+    if (i + 1) % 5000 == 0:
+        print(f"  Features {i+1}/{len(paths)}")
+print(f"Feature extraction: {time.time() - start_time:.0f}s ({features.shape[1]} features/image)")
+
+rng = np.random.default_rng(SEED)
+order = rng.permutation(len(paths))
+split = int(TRAIN_SPLIT * len(paths))
+train_idx, val_idx = order[:split], order[split:]
+print(f"Train: {len(train_idx)} | Val: {len(val_idx)}")
+
+mean = features[train_idx].mean(axis=0)
+std = features[train_idx].std(axis=0) + 1e-6
+x_train = (features[train_idx] - mean) / std
+x_val = (features[val_idx] - mean) / std
+y_train = np.eye(len(classes), dtype=np.float32)[labels[train_idx]]
+
+# ---------------------------------------------------------------------------
+# Training — full-batch softmax regression with Adam
+# ---------------------------------------------------------------------------
+print(f"\nTraining for {STEPS} steps...")
+weights = np.zeros((features.shape[1], len(classes)), np.float32)
+bias = np.zeros(len(classes), np.float32)
+m_w, v_w = np.zeros_like(weights), np.zeros_like(weights)
+m_b, v_b = np.zeros_like(bias), np.zeros_like(bias)
+beta1, beta2 = 0.9, 0.999
+
+start_time = time.time()
+for step in range(1, STEPS + 1):
+    logits = x_train @ weights + bias
+    logits -= logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=1, keepdims=True)
+
+    grad = (probs - y_train) / len(x_train)
+    grad_w = x_train.T @ grad + L2 * weights
+    grad_b = grad.sum(axis=0)
+
+    for param, g, m, v in ((weights, grad_w, m_w, v_w), (bias, grad_b, m_b, v_b)):
+        m *= beta1
+        m += (1 - beta1) * g
+        v *= beta2
+        v += (1 - beta2) * g * g
+        param -= LEARNING_RATE * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + 1e-8)
+
+    if step % 250 == 0:
+        loss = -np.log(probs[np.arange(len(probs)), labels[train_idx]] + 1e-12).mean()
+        val_acc = 100 * ((x_val @ weights + bias).argmax(axis=1) == labels[val_idx]).mean()
+        print(f"Step [{step}/{STEPS}] | Loss: {loss:.4f} | Val Acc: {val_acc:.1f}%")
+
+train_time = time.time() - start_time
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+model = PixelClassifier(classes, mean, std, weights, bias)
+val_pred = model.predict_proba(features[val_idx]).argmax(axis=1)
+val_acc = 100 * (val_pred == labels[val_idx]).mean()
+
+print("\nPer-class validation accuracy:")
+for k, name in enumerate(classes):
+    mask = labels[val_idx] == k
+    print(f"  {name:<22} {100 * (val_pred[mask] == k).mean():5.1f}%")
+
+# Hand-tuned heuristics only predict coarse classes — compare both on coarse
+# groups. Heuristic labels without a EuroSAT group (Barren Land) cannot be
+# scored, so those images are left out for both models.
+from app.services.cascade_service import LANDCOVER_GROUPS  # noqa: E402
+from app.services.classification_service import analyze_rgb_pixels  # noqa: E402
+
+sample = val_idx[:2000]
+heuristic_hits = learned_hits = compared = 0
+for i in sample:
+    with open(paths[i], "rb") as f:
+        decoded = decode_rgb(f.read())
+    heuristic = LANDCOVER_GROUPS.get(
+        analyze_rgb_pixels(decoded.pixels, use_learned=False, stats_pixels=decoded.stats_pixels)["predicted_class"]
+    )
+    if heuristic is None:
+        continue
+    truth = LANDCOVER_GROUPS[classes[labels[i]]]
+    compared += 1
+    heuristic_hits += heuristic == truth
+    learned_hits += LANDCOVER_GROUPS[classes[model.classify(decoded.pixels).argmax()]] == truth
+
+# Latency: features + prediction on one decoded upload
+pixels = decode_rgb(open(paths[val_idx[0]], "rb").read()).pixels
+runs = 500
+t = time.perf_counter()
+for _ in range(runs):
+    feats = extract_features(pixels)
+feature_us = (time.perf_counter() - t) / runs * 1e6
+t = time.perf_counter()
+for _ in range(runs):
+    model.predict_proba(feats)
+predict_us = (time.perf_counter() - t) / runs * 1e6
+
+model.save(MODEL_PATH, val_accuracy=val_acc)
+
+# ---------------------------------------------------------------------------
+# Done
+# ---------------------------------------------------------------------------
+print(f"\n{'='*50}")
+print(f"Training complete! ({train_time:.1f}s)")
+print(f"Validation accuracy (10 classes): {val_acc:.1f}%")
+print(f"Coarse-group accuracy on {compared} val images ({len(sample) - compared} ungrouped heuristic labels skipped): "
+      f"learned {100 * learned_hits / max(compared, 1):.1f}% vs heuristics {100 * heuristic_hits / max(compared, 1):.1f}%")
+print(f"Latency: features {feature_us:.0f} us + prediction {predict_us:.0f} us per image")
+print(f"Model saved: {MODEL_PATH} ({os.path.getsize(MODEL_PATH) / 1024:.1f} KB)")
+print(f"\nTo integrate: copy {MODEL_PATH} to gsis-backend/models/")
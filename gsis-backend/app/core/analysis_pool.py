@@ -0,0 +1,131 @@
+"""
+Analysis pool — Runs CPU-bound analysis off the asyncio event loop.
+
+Routes await run_analysis(fn, *args); the call executes on a bounded
+thread pool (default — NumPy, GDAL and torch release the GIL, and the
+result cache / CNN micro-batcher are shared) or a process pool
+(ANALYSIS_POOL="process", spawn context; each process keeps its own
+caches and model). At most ANALYSIS_WORKERS jobs run at once and up to
+ANALYSIS_QUEUE_LIMIT more may wait; beyond that requests are shed with
+503 so the event loop, health checks and light endpoints stay responsive.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import get_settings
+
+logger = logging.getLogger("analysis_pool")
+
+
+def _call_in_child(fn: Callable, args: tuple, kwargs: dict):
+    """Process-pool trampoline: HTTPException does not pickle, so ship its fields."""
+    try:
+        return True, fn(*args, **kwargs)
+    except HTTPException as e:
+        return False, (e.status_code, e.detail)
+
+
+class AnalysisPool:
+    """Bounded executor with admission control and simple counters."""
+
+    def __init__(self, kind: str, workers: int, queue_limit: int):
+        self.kind = kind
+        self.workers = workers
+        self.capacity = workers + queue_limit
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        if kind == "process":
+            self._executor: Executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis")
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server busy — analysis queue is full, retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_flight += 1
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        self._admit()
+        try:
+            if self.kind == "process":
+                future = self._executor.submit(_call_in_child, fn, args, kwargs)
+            else:
+                future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._release(None)
+            raise
+        # Released when the job really ends, even if the client goes away first
+        future.add_done_callback(self._release)
+
+        value = await asyncio.wrap_future(future)
+        if self.kind == "process":
+            ok, value = value
+            if not ok:
+                raise HTTPException(status_code=value[0], detail=value[1])
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[AnalysisPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_analysis_pool() -> AnalysisPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = get_settings()
+            workers = settings.ANALYSIS_WORKERS or os.cpu_count() or 1
+            _pool = AnalysisPool(settings.ANALYSIS_POOL, workers, settings.ANALYSIS_QUEUE_LIMIT)
+            logger.info(f"Analysis pool: {settings.ANALYSIS_POOL} x{workers}, queue {settings.ANALYSIS_QUEUE_LIMIT}")
+        return _pool
+
+
+async def run_analysis(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking analysis call on the shared pool and await its result."""
+    return await get_analysis_pool().run(fn, *args, **kwargs)
+
+
+def shutdown_analysis_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -4,6 +4,7 @@ GSIS Backend Configuration — Environment and app settings.
 
 import os
 from functools import lru_cache
+from typing import Literal
 from pydantic_settings import BaseSettings
 
 
@@ -32,6 +33,95 @@ class Settings(BaseSettings):
     NDWI_FLOOD_THRESHOLD: float = 0.3
     MAX_BATCH_SIZE: int = 20
     MAX_FILE_SIZE_MB: int = 50
+    ZONAL_MAX_FEATURES: int = 10000
+
+    # Raster streaming — target pixels per block window read
+    STREAM_BLOCK_PIXELS: int = 1_048_576
+    # TIFF uploads larger than this are spilled to a temp file instead of
+    # being opened from memory
+    TIFF_SPILL_THRESHOLD_MB: int = 64
+    # quality=fast previews read at most this many pixels per band
+    FAST_PREVIEW_MAX_PIXELS: int = 1_048_576
+    # Fixed bins over [-1, 1] for streamed NDVI/NDWI histograms
+    INDEX_HISTOGRAM_BINS: int = 100
+    # Treat pixels that are 0 in every band as nodata when a raster declares
+    # no nodata value or mask (Sentinel Hub zero-fills outside coverage)
+    ZERO_FILL_AS_NODATA: bool = True
+    # Threads reading/computing blocks of one scene in parallel (0 = cores
+    # divided by ANALYSIS_WORKERS, so 1 with the default all-core pool)
+    STREAM_WORKERS: int = 0
+
+    # Index raster export — int16 COGs written under this directory
+    EXPORT_DIR: str = "exports"
+    # /predict?export=true downloads are deleted this many hours after they
+    # were written (hourly sweep; 0 = keep forever). Region COGs are
+    # replaced in place and never expire.
+    EXPORT_RETENTION_HOURS: int = 24
+    # Region monitor keeps the latest NDVI/NDWI COGs of each real-data region;
+    # also mounts the /tiles map-tile endpoints, which render from them
+    REGION_EXPORT_COGS: bool = False
+    # Encoded map tiles kept in memory by /tiles (LRU, bounded by total size)
+    TILE_CACHE_MB: int = 64
+    # Region COGs written by other processes reach /tiles within this many seconds
+    TILE_SCAN_TTL_SECONDS: float = 5.0
+
+    # Prediction result cache (keyed by upload hash + options + model/app version)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MEMORY_MB: int = 64
+    # SQLite file for a persistent second tier ("" = memory only)
+    RESULT_CACHE_DB: str = ""
+    RESULT_CACHE_DISK_MAX_ENTRIES: int = 10000
+
+    # Land-use CNN runtime (artifacts from `python -m app.models.export_model`;
+    # falls back to eager when the selected one is missing)
+    CNN_BACKEND: Literal[
+        "eager", "torchscript", "onnx", "onnx_int8_dynamic", "onnx_int8_static",
+    ] = "eager"
+
+    # Load the CNN at startup instead of on the first request (always on
+    # under gunicorn.conf.py, where it happens before workers fork)
+    CNN_PRELOAD: bool = False
+
+    # CNN micro-batching — concurrent requests share one forward pass of up
+    # to CNN_MAX_BATCH_SIZE images, waiting at most CNN_MAX_WAIT_MS to fill it
+    CNN_MAX_BATCH_SIZE: int = 16
+    CNN_MAX_WAIT_MS: float = 10.0
+
+    # Sliding-window land-use maps (/predict?landuse_map=true)
+    LANDUSE_CHIP_OVERLAP: float = 0.5
+    # Stride is widened (up to the chip size, then the scene is decimated)
+    # until the scene fits in this many chips
+    LANDUSE_MAP_MAX_CHIPS: int = 4096
+    LANDUSE_MAP_BATCH_SIZE: int = 64
+    # Chips with less valid (non-nodata) data than this are left unclassified
+    LANDUSE_MIN_VALID_FRACTION: float = 0.5
+
+    # Cheap-first cascade for RGB uploads: ResNet50 runs only when the learned
+    # pixel model's top-1/top-2 probability margin is below the threshold
+    # (always without landuse_pixel.npz); every CASCADE_AUDIT_INTERVAL-th skip
+    # still runs it to measure the accuracy cost
+    CASCADE_ENABLED: bool = True
+    CASCADE_MARGIN_THRESHOLD: float = 0.25
+    CASCADE_AUDIT_INTERVAL: int = 20
+
+    # CNN scene embeddings for /similar — float16 store under EMBEDDING_DIR
+    # ("" = memory only); exact search below EMBEDDING_ANN_THRESHOLD
+    # entries, IVF-PQ (scanning EMBEDDING_NPROBE lists) above it
+    EMBEDDING_STORE_ENABLED: bool = True
+    # Also run ResNet50 on GeoTIFF uploads' RGB preview (an extra preview read
+    # and forward pass per upload) so they get an informational cnn_class and
+    # become searchable by /similar
+    EMBEDDING_GEOTIFF_UPLOADS: bool = False
+    EMBEDDING_DIR: str = "embeddings"
+    EMBEDDING_ANN_THRESHOLD: int = 50000
+    EMBEDDING_NPROBE: int = 16
+
+    # /predict and /batch-predict analysis runs off the event loop on a
+    # bounded "thread" or "process" pool; requests beyond workers +
+    # ANALYSIS_QUEUE_LIMIT get 503 (ANALYSIS_WORKERS 0 = all cores)
+    ANALYSIS_POOL: Literal["thread", "process"] = "thread"
+    ANALYSIS_WORKERS: int = 0
+    ANALYSIS_QUEUE_LIMIT: int = 32
 
     # Supabase (for future direct DB access)
     SUPABASE_URL: str = ""
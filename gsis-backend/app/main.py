@@ -4,6 +4,9 @@ GSIS Backend v5.1 — Modular Production Entry Point with Auto-Monitoring
 Run with:
     cd gsis-backend
     uvicorn app.main:app --reload
+
+Multi-worker (model loaded once, shared by forked workers):
+    gunicorn -c gunicorn.conf.py app.main:app
 """
 
 import logging
@@ -16,7 +19,8 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from app.core.config import get_settings
-from app.routers import predict, batch, dashboard, history, alerts, admin, regions
+from app.core.analysis_pool import shutdown_analysis_pool
+from app.routers import predict, batch, dashboard, history, alerts, admin, regions, zonal, exports, tiles, similar
 
 # Scheduler
 try:
@@ -38,8 +42,13 @@ scheduler = None
 async def lifespan(app: FastAPI):
     global scheduler
     # Startup
+    if settings.CNN_PRELOAD:
+        from app.services.cnn_service import preload_model
+        preload_model()
+
     if HAS_SCHEDULER:
         from app.services.region_monitor_service import run_full_monitoring_cycle
+        from app.services.export_service import sweep_expired_exports
         scheduler = BackgroundScheduler()
         scheduler.add_job(
             run_full_monitoring_cycle,
@@ -48,6 +57,13 @@ async def lifespan(app: FastAPI):
             id="region_monitor",
             name="Global Region Monitoring (24h)",
         )
+        scheduler.add_job(
+            sweep_expired_exports,
+            "interval",
+            hours=1,
+            id="export_sweep",
+            name="Expired export cleanup (1h)",
+        )
         scheduler.start()
         logger.info("🛰 Scheduler started — monitoring every 24 hours")
 
@@ -65,6 +81,7 @@ async def lifespan(app: FastAPI):
     if scheduler:
         scheduler.shutdown()
         logger.info("Scheduler stopped")
+    shutdown_analysis_pool()
 
 
 # ---------------------------------------------------------------------------
@@ -107,6 +124,12 @@ app.include_router(history.router, prefix="/history")
 app.include_router(alerts.router, prefix="/alerts")
 app.include_router(admin.router, prefix="/admin")
 app.include_router(regions.router, prefix="/regions")
+app.include_router(zonal.router, prefix="/zonal-stats")
+app.include_router(exports.router, prefix="/exports")
+if settings.REGION_EXPORT_COGS:
+    # Tiles render from the region COGs, which only exist with this on
+    app.include_router(tiles.router, prefix="/tiles")
+app.include_router(similar.router, prefix="/similar")
 
 
 # ---------------------------------------------------------------------------
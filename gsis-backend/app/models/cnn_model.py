@@ -8,7 +8,7 @@ EuroSAT 10 Classes:
 Supports:
 - GPU inference (CUDA) when available
 - CPU fallback
-- Custom trained weights loading (landuse_model.pt)
+- Custom trained weights loading (landuse_model.pt, memory-mapped)
 """
 
 import os
@@ -91,8 +91,10 @@ def load_trained_model(model_path: str) -> Optional["nn.Module"]:
     model = build_model(pretrained=False)
 
     try:
-        state_dict = torch.load(model_path, map_location=device, weights_only=True)
-        model.load_state_dict(state_dict)
+        # mmap + assign: parameters stay backed by the file's page cache, so
+        # every worker process serving the same .pt shares one copy on CPU
+        state_dict = torch.load(model_path, map_location=device, weights_only=True, mmap=True)
+        model.load_state_dict(state_dict, assign=True)
         model.to(device)
         model.eval()
         logger.info(f"Loaded trained EuroSAT model from {model_path}")
@@ -102,6 +104,18 @@ def load_trained_model(model_path: str) -> Optional["nn.Module"]:
         return None
 
 
+def custom_weights_path() -> str:
+    """Location of the trained EuroSAT weights (models/landuse_model.pt)."""
+    model_dir = os.path.join(os.path.dirname(__file__), "..", "..", "models")
+    return os.path.join(model_dir, "landuse_model.pt")
+
+
+def validation_split_path() -> str:
+    """Validation images train.py held out for landuse_model.pt (models/landuse_model_val.json)."""
+    model_dir = os.path.join(os.path.dirname(__file__), "..", "..", "models")
+    return os.path.join(model_dir, "landuse_model_val.json")
+
+
 def get_model() -> Optional["nn.Module"]:
     """
     Get the CNN model for inference.
@@ -113,16 +127,24 @@ def get_model() -> Optional["nn.Module"]:
         return None
 
     # Check for custom trained weights
-    model_dir = os.path.join(os.path.dirname(__file__), "..", "..", "models")
-    custom_path = os.path.join(model_dir, "landuse_model.pt")
+    custom_path = custom_weights_path()
 
     if os.path.exists(custom_path):
         model = load_trained_model(custom_path)
         if model:
             return model
 
-    # Fall back to pretrained backbone (won't give meaningful classifications
-    # until trained on EuroSAT, but allows the pipeline to run)
+    return load_pretrained_backbone()
+
+
+def load_pretrained_backbone() -> Optional["nn.Module"]:
+    """
+    Pretrained ResNet50 backbone with an untrained head (won't give meaningful
+    classifications until trained on EuroSAT, but allows the pipeline to run).
+    """
+    if not HAS_TORCH:
+        return None
+
     device = get_device()
     model = build_model(pretrained=True)
     if model:
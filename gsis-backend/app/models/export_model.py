@@ -0,0 +1,217 @@
+"""
+Export Model — Build TorchScript / ONNX / int8 artifacts of landuse_model.pt.
+
+Run from gsis-backend:
+  python -m app.models.export_model
+  python -m app.models.export_model --backends onnx onnx_int8_static
+
+Writes the files listed in inference_backends.BACKEND_ARTIFACTS next to the
+trained weights. Static int8 quantization is calibrated on EuroSAT images
+(QDQ format, per-channel weights). Every artifact is then checked against
+the eager model on a disjoint sample of EuroSAT images: top-1 agreement and
+images/sec are printed, and the export fails when agreement drops below
+--min-agreement. Both samples come only from the validation images train.py
+held out (models/landuse_model_val.json), never from training images.
+
+Requires torch, onnx and onnxruntime.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from app.models.cnn_model import HAS_TORCH, custom_weights_path, load_trained_model, validation_split_path
+from app.models.inference_backends import (
+    BACKEND_ARTIFACTS,
+    HAS_ONNXRUNTIME,
+    artifact_path,
+    load_backend,
+    normalize_batch,
+)
+from app.utils.image_utils import MODEL_INPUT_SIZE, decode_rgb
+
+if HAS_TORCH:
+    import torch
+
+if HAS_ONNXRUNTIME:
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+DEFAULT_DATA_DIR = os.path.join("..", "geo-vision-training", "data", "EuroSAT")
+ONNX_OPSET = 17
+
+
+def sample_images(data_dir: str, count: int, offset: int = 0) -> np.ndarray:
+    """
+    Deterministic sample of EuroSAT validation images as (N, 224, 224, 3) uint8.
+
+    Only the images train.py held out for the deployed weights are used.
+    They are shuffled with a fixed seed; calibration and agreement checks
+    take disjoint slices via `offset`.
+    """
+    split_path = validation_split_path()
+    if not os.path.exists(split_path):
+        raise SystemExit(f"Validation split not found at {split_path} "
+                         "(copy landuse_model_val.json from geo-vision-training next to the weights)")
+    with open(split_path) as f:
+        paths = [os.path.join(data_dir, *image.split("/")) for image in json.load(f)["images"]]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        raise SystemExit(f"{len(missing)} validation images missing under {data_dir} (run download_eurosat.py)")
+    if offset + count > len(paths):
+        raise SystemExit(f"Only {len(paths)} validation images; asked for {offset + count}")
+    random.Random(0).shuffle(paths)
+    chosen = paths[offset:offset + count]
+    images = []
+    for path in chosen:
+        with open(path, "rb") as f:
+            images.append(decode_rgb(f.read()).pixels)
+    return np.stack(images)
+
+
+if HAS_ONNXRUNTIME:
+    class EuroSATCalibrationReader(CalibrationDataReader):
+        """Feeds normalized calibration batches to quantize_static."""
+
+        def __init__(self, images: np.ndarray, input_name: str, batch_size: int = 16):
+            self._batches = iter(
+                {input_name: normalize_batch(images[i:i + batch_size])}
+                for i in range(0, len(images), batch_size)
+            )
+
+        def get_next(self):
+            return next(self._batches, None)
+
+
+# ---------------------------------------------------------------------------
+# Exports
+# ---------------------------------------------------------------------------
+
+def export_torchscript(model, path: str) -> None:
+    example = torch.zeros(1, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE)
+    with torch.inference_mode():
+        traced = torch.jit.freeze(torch.jit.trace(model, example))
+    traced.save(path)
+
+
+def export_onnx(model, path: str) -> None:
+    example = torch.zeros(1, 3, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE)
+    torch.onnx.export(
+        model,
+        example,
+        path,
+        input_names=["input"],
+        output_names=["logits", "features"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}, "features": {0: "batch"}},
+        opset_version=ONNX_OPSET,
+    )
+
+
+def export_int8_dynamic(fp32_path: str, path: str) -> None:
+    quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+
+
+def export_int8_static(fp32_path: str, path: str, calibration: np.ndarray) -> None:
+    quantize_static(
+        fp32_path,
+        path,
+        EuroSATCalibrationReader(calibration, "input"),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Accuracy / throughput check
+# ---------------------------------------------------------------------------
+
+def run_backend(name: str, images: np.ndarray, batch_size: int) -> tuple[np.ndarray, float]:
+    """Top-1 predictions of a backend over `images` and its images/sec."""
+    backend = load_backend(name)
+    if backend is None or backend.name != name:
+        raise SystemExit(f"Backend {name} did not load")
+    backend.logits(images[:batch_size])  # warm-up
+
+    predicted = []
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        predicted.append(backend.logits(images[i:i + batch_size]).argmax(axis=1))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(predicted), len(images) / elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export landuse_model.pt to faster inference backends")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKEND_ARTIFACTS), default=list(BACKEND_ARTIFACTS))
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="EuroSAT class folders")
+    parser.add_argument("--calibration-images", type=int, default=256)
+    parser.add_argument("--check-images", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--min-agreement", type=float, default=0.98,
+                        help="minimum top-1 agreement with eager")
+    args = parser.parse_args()
+
+    if not HAS_TORCH:
+        raise SystemExit("torch is required to export the model")
+    if any(b.startswith("onnx") for b in args.backends) and not HAS_ONNXRUNTIME:
+        raise SystemExit("onnx and onnxruntime are required for ONNX backends")
+
+    weights = custom_weights_path()
+    model = load_trained_model(weights) if os.path.exists(weights) else None
+    if model is None:
+        raise SystemExit(f"Trained weights not found at {weights} (run geo-vision-training/train.py)")
+    # Exported graphs return (logits, pooled features) like the eager backend
+    from app.models.inference_backends import LogitsAndFeatures
+    model = LogitsAndFeatures(model.cpu()).eval()
+
+    needs_fp32_onnx = any(b.startswith("onnx") for b in args.backends)
+    calibration = None
+    if "onnx_int8_static" in args.backends:
+        calibration = sample_images(args.data_dir, args.calibration_images)
+
+    if "torchscript" in args.backends:
+        export_torchscript(model, artifact_path("torchscript"))
+    if needs_fp32_onnx:
+        export_onnx(model, artifact_path("onnx"))
+    if "onnx_int8_dynamic" in args.backends:
+        export_int8_dynamic(artifact_path("onnx"), artifact_path("onnx_int8_dynamic"))
+    if "onnx_int8_static" in args.backends:
+        export_int8_static(artifact_path("onnx"), artifact_path("onnx_int8_static"), calibration)
+    for name in args.backends:
+        size_mb = os.path.getsize(artifact_path(name)) / 1024 / 1024
+        print(f"Wrote {artifact_path(name)} ({size_mb:.1f} MB)")
+
+    # Check images come after the calibration slice so the two never overlap
+    images = sample_images(args.data_dir, args.check_images, offset=args.calibration_images)
+    reference, eager_rate = run_backend("eager", images, args.batch_size)
+
+    print(f"\n{'backend':<20}{'top-1 agreement':>16}{'images/sec':>12}")
+    print(f"{'eager':<20}{'—':>16}{eager_rate:>12.1f}")
+    failed = []
+    for name in args.backends:
+        predicted, rate = run_backend(name, images, args.batch_size)
+        agreement = float((predicted == reference).mean())
+        print(f"{name:<20}{agreement:>16.2%}{rate:>12.1f}")
+        if agreement < args.min_agreement:
+            failed.append(name)
+
+    if failed:
+        print(f"\nAgreement below {args.min_agreement:.0%} for: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Inference backends — Interchangeable CPU/GPU runtimes for the land-use model.
+
+  eager              PyTorch nn.Module, fp32          landuse_model.pt
+  torchscript        traced + frozen TorchScript       landuse_model.ts
+  onnx               ONNX Runtime, fp32                landuse_model.onnx
+  onnx_int8_dynamic  ONNX Runtime, int8 weights,       landuse_model.int8_dynamic.onnx
+                     activations quantized at runtime
+  onnx_int8_static   ONNX Runtime, int8 QDQ calibrated landuse_model.int8_static.onnx
+                     on EuroSAT images
+
+Selected with Settings.CNN_BACKEND. Every backend takes (N, 224, 224, 3)
+uint8 pixels and returns (N, classes) float32 logits together with the
+(N, 2048) pooled ResNet50 features feeding the classifier head (used as
+scene embeddings, see embedding_service). Non-eager artifacts
+are built from landuse_model.pt by `python -m app.models.export_model`,
+which also checks their top-1 agreement with eager; a missing artifact or
+runtime falls back to eager with a warning.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Optional, Protocol
+
+import numpy as np
+
+from app.models.cnn_model import HAS_TORCH, custom_weights_path, load_pretrained_backbone, load_trained_model
+
+if HAS_TORCH:
+    import torch
+    import torch.nn as nn
+
+try:
+    import onnxruntime as ort
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    HAS_ONNXRUNTIME = False
+
+logger = logging.getLogger("inference_backends")
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+BACKEND_ARTIFACTS = {
+    "torchscript": "landuse_model.ts",
+    "onnx": "landuse_model.onnx",
+    "onnx_int8_dynamic": "landuse_model.int8_dynamic.onnx",
+    "onnx_int8_static": "landuse_model.int8_static.onnx",
+}
+BACKENDS = ("eager", *BACKEND_ARTIFACTS)
+
+
+def artifact_path(backend: str) -> str:
+    """Path of a backend's model file (next to landuse_model.pt)."""
+    if backend == "eager":
+        return custom_weights_path()
+    return os.path.join(os.path.dirname(custom_weights_path()), BACKEND_ARTIFACTS[backend])
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Preprocessing (ImageNet normalization)
+# ---------------------------------------------------------------------------
+
+def to_input_tensor(pixels: np.ndarray, device) -> "torch.Tensor":
+    """
+    (N, 3, H, W) normalized float tensor from (H, W, 3) or (N, H, W, 3) uint8.
+
+    torch.from_numpy shares the array's memory and permute() is a view, so
+    the only copy is the uint8 → float conversion (channels-last layout,
+    which the convolutions accept as is). Equivalent to ToTensor+Normalize.
+    """
+    if pixels.ndim == 3:
+        pixels = pixels[np.newaxis]
+    x = torch.from_numpy(pixels).permute(0, 3, 1, 2)
+    x = x.to(device=device, dtype=torch.float32).div_(255.0)
+    mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1)
+    return x.sub_(mean).div_(std)
+
+
+def normalize_batch(pixels: np.ndarray) -> np.ndarray:
+    """Contiguous (N, 3, H, W) float32 ImageNet-normalized array (ONNX input)."""
+    if pixels.ndim == 3:
+        pixels = pixels[np.newaxis]
+    x = np.empty((pixels.shape[0], 3) + pixels.shape[1:3], dtype=np.float32)
+    for c in range(3):
+        np.multiply(pixels[..., c], 1 / (255.0 * IMAGENET_STD[c]), out=x[:, c], casting="unsafe")
+        x[:, c] -= IMAGENET_MEAN[c] / IMAGENET_STD[c]
+    return x
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class InferenceBackend(Protocol):
+    name: str
+    device: str
+    version: str
+
+    def forward(self, pixels: np.ndarray) -> tuple[np.ndarray, Optional[np.ndarray]]: ...
+
+    def logits(self, pixels: np.ndarray) -> np.ndarray: ...
+
+
+if HAS_TORCH:
+    class LogitsAndFeatures(nn.Module):
+        """ResNet50 returning (logits, pooled features); the graph that gets exported."""
+
+        def __init__(self, model: "nn.Module"):
+            super().__init__()
+            self.model = model
+
+        def forward(self, x):
+            m = self.model
+            x = m.maxpool(m.relu(m.bn1(m.conv1(x))))
+            x = m.layer4(m.layer3(m.layer2(m.layer1(x))))
+            features = torch.flatten(m.avgpool(x), 1)
+            return m.fc(features), features
+
+
+class TorchBackend:
+    """Eager or TorchScript module (artifacts exported before features were added return logits only)."""
+
+    def __init__(self, module, name: str, version: str):
+        self.module = module
+        self.name = name
+        self.version = version
+        param = next(module.parameters(), None)
+        self._device = param.device if param is not None else torch.device("cpu")
+        self.device = str(self._device)
+
+    def forward(self, pixels: np.ndarray) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        with torch.inference_mode():
+            out = self.module(to_input_tensor(pixels, self._device))
+            logits, features = out if isinstance(out, tuple) else (out, None)
+            return (logits.float().cpu().numpy(),
+                    features.float().cpu().numpy() if features is not None else None)
+
+    def logits(self, pixels: np.ndarray) -> np.ndarray:
+        return self.forward(pixels)[0]
+
+
+class OnnxBackend:
+    """ONNX Runtime session (CPU execution provider)."""
+
+    device = "cpu"
+
+    def __init__(self, path: str, name: str):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.outputs = ["logits"] + [o.name for o in self.session.get_outputs() if o.name == "features"]
+        self.name = name
+        self.version = f"{name}-{file_digest(path)}"
+
+    def forward(self, pixels: np.ndarray) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        out = self.session.run(self.outputs, {self.input_name: normalize_batch(pixels)})
+        return out[0], (out[1] if len(out) > 1 else None)
+
+    def logits(self, pixels: np.ndarray) -> np.ndarray:
+        return self.session.run(["logits"], {self.input_name: normalize_batch(pixels)})[0]
+
+
+def _load_eager() -> Optional[TorchBackend]:
+    if not HAS_TORCH:
+        return None
+    path = custom_weights_path()
+    model = load_trained_model(path) if os.path.exists(path) else None
+    if model is not None:
+        version = f"eager-{file_digest(path)}"
+    else:
+        # Missing or unloadable weights: report the backbone, not the .pt digest
+        model = load_pretrained_backbone()
+        version = "eager-resnet50-imagenet"
+    if model is None:
+        return None
+    return TorchBackend(LogitsAndFeatures(model), "eager", version)
+
+
+def load_backend(name: str) -> Optional[InferenceBackend]:
+    """Load the named backend, falling back to eager when it cannot be used."""
+    if name == "eager":
+        return _load_eager()
+
+    path = artifact_path(name)
+    runtime_ok = HAS_TORCH if name == "torchscript" else HAS_ONNXRUNTIME
+    if not runtime_ok or not os.path.exists(path):
+        logger.warning(
+            f"CNN backend '{name}' unavailable ({'missing ' + path if runtime_ok else 'runtime not installed'})"
+            " — falling back to eager. Build it with: python -m app.models.export_model"
+        )
+        return _load_eager()
+
+    try:
+        if name == "torchscript":
+            module = torch.jit.load(path, map_location="cpu")
+            module.eval()
+            backend = TorchBackend(module, name, f"{name}-{file_digest(path)}")
+        else:
+            backend = OnnxBackend(path, name)
+    except Exception as e:
+        logger.warning(f"Could not load CNN backend '{name}': {e} — falling back to eager")
+        return _load_eager()
+
+    logger.info(f"CNN backend: {name} ({path})")
+    return backend
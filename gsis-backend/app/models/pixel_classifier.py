@@ -0,0 +1,159 @@
+"""
+Pixel Classifier — NumPy-only learned land-use model (no PyTorch needed).
+
+Multinomial logistic regression over 81 colour / index / texture
+statistics of the decoded image (taken at EuroSAT's 64x64 resolution),
+trained on EuroSAT by geo-vision-training/train_pixel_classifier.py and
+loaded from models/landuse_pixel.npz. Replaces the hand-tuned pixel scores
+in analyze_rgb_pixels when present; classifying an image costs one feature
+pass (~1 ms) plus a (81 x 10) matrix product.
+
+The feature definition lives only here — the training script imports it —
+so training and serving features cannot drift apart.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger("pixel_classifier")
+
+FEATURE_VERSION = 1
+FEATURE_SIZE = 64  # EuroSAT's native chip size
+HISTOGRAM_BINS = 16
+PERCENTILES = (0.1, 0.5, 0.9)
+_EPS = 1e-6
+
+
+def pixel_classifier_path() -> str:
+    """Location of the trained pixel model (models/landuse_pixel.npz)."""
+    model_dir = os.path.join(os.path.dirname(__file__), "..", "..", "models")
+    return os.path.join(model_dir, "landuse_pixel.npz")
+
+
+def extract_features(pixels: np.ndarray) -> np.ndarray:
+    """
+    Feature vector of a (H, W, 3) uint8 RGB image, computed at 64x64:
+      per-channel 16-bin histograms, mean/std/10-50-90 percentiles,
+      chromaticity mean/std, NDVI/NDWI proxy mean/std/cover fractions,
+      brightness, gradient and Laplacian texture statistics.
+    """
+    if pixels.shape[:2] != (FEATURE_SIZE, FEATURE_SIZE):
+        pixels = np.asarray(Image.fromarray(pixels).resize((FEATURE_SIZE, FEATURE_SIZE), Image.BILINEAR))
+    rgb = pixels.reshape(-1, 3)
+    features = []
+
+    # Colour distribution (percentiles from the cumulative 256-bin histogram)
+    percentiles = []
+    for c in range(3):
+        cumulative = np.cumsum(np.bincount(rgb[:, c], minlength=256)) / len(rgb)
+        features.append(cumulative[15::16] - np.concatenate(([0.0], cumulative[15:-1:16])))
+        percentiles.append(np.searchsorted(cumulative, PERCENTILES))
+    arr = pixels.astype(np.float32)
+    flat = arr.reshape(-1, 3)
+    features.append(flat.mean(axis=0) / 255)
+    features.append(flat.std(axis=0) / 255)
+    features.append(np.array(percentiles, dtype=np.float32).T.ravel() / 255)
+
+    total = flat.sum(axis=1, keepdims=True) + _EPS
+    chroma = flat / total
+    features.append(chroma.mean(axis=0))
+    features.append(chroma.std(axis=0))
+
+    # Spectral index proxies (Green-Red, Green-Blue normalized differences)
+    r, g, b = arr[..., 0], arr[..., 1], arr[..., 2]
+    ndvi = (g - r) / (g + r + _EPS)
+    ndwi = (g - b) / (g + b + _EPS)
+    features.append(np.array([
+        ndvi.mean(), ndvi.std(), (ndvi > 0.05).mean(),
+        ndwi.mean(), ndwi.std(), (ndwi > 0.0).mean(),
+    ], dtype=np.float32))
+
+    # Texture on the grey image
+    gray = arr.mean(axis=2) / 255
+    dy, dx = np.diff(gray, axis=0), np.diff(gray, axis=1)
+    gradient = np.hypot(dy[:, :-1], dx[:-1, :])
+    p90 = int(0.9 * gradient.size)
+    laplacian = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]
+                 - 4 * gray[1:-1, 1:-1])
+    features.append(np.array([
+        gray.mean(), gray.std(),
+        gradient.mean(), gradient.std(), np.partition(gradient.ravel(), p90)[p90],
+        np.abs(laplacian).mean(),
+    ], dtype=np.float32))
+
+    return np.concatenate(features).astype(np.float32)
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    e = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+class PixelClassifier:
+    """Standardized features → linear softmax."""
+
+    def __init__(self, classes: list[str], mean: np.ndarray, std: np.ndarray,
+                 weights: np.ndarray, bias: np.ndarray, version: str = "unsaved"):
+        self.classes = classes
+        self.mean = mean.astype(np.float32)
+        self.std = std.astype(np.float32)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.version = version
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """(..., classes) probabilities for (..., n_features) feature rows."""
+        return softmax(((features - self.mean) / self.std) @ self.weights + self.bias)
+
+    def classify(self, pixels: np.ndarray) -> np.ndarray:
+        return self.predict_proba(extract_features(pixels))
+
+    def save(self, path: str, **metrics) -> None:
+        np.savez(
+            path, classes=np.array(self.classes), mean=self.mean, std=self.std,
+            weights=self.weights, bias=self.bias, feature_version=FEATURE_VERSION,
+            **{f"metric_{k}": v for k, v in metrics.items()},
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "PixelClassifier":
+        with np.load(path) as data:
+            if int(data["feature_version"]) != FEATURE_VERSION:
+                raise ValueError(f"feature version {int(data['feature_version'])}, expected {FEATURE_VERSION}")
+            with open(path, "rb") as f:
+                version = "pixel-" + hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+            return cls([str(c) for c in data["classes"]], data["mean"], data["std"],
+                       data["weights"], data["bias"], version)
+
+
+_classifier: Optional[PixelClassifier] = None
+_classifier_loaded = False
+_classifier_lock = threading.Lock()
+
+
+def get_pixel_classifier() -> Optional[PixelClassifier]:
+    """
+    Lazy-load the trained pixel model (None when models/landuse_pixel.npz is
+    absent). Concurrent first callers (analysis pool threads) wait for the one
+    load instead of seeing no model.
+    """
+    global _classifier, _classifier_loaded
+    if _classifier_loaded:
+        return _classifier
+    with _classifier_lock:
+        if not _classifier_loaded:
+            path = pixel_classifier_path()
+            if os.path.exists(path):
+                try:
+                    _classifier = PixelClassifier.load(path)
+                    logger.info(f"Loaded pixel classifier from {path}")
+                except Exception as e:
+                    logger.warning(f"Could not load pixel classifier: {e}. Using pixel heuristics.")
+            _classifier_loaded = True  # only once the load has returned
+    return _classifier
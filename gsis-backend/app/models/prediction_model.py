@@ -13,6 +13,8 @@ class ProcessingMetadata(BaseModel):
     image_dimensions: str
     file_type: str
     model_version: str
+    analysis_engines: Optional[list[str]] = None
+    cache: Optional[dict] = None
 
 
 class VegetationStress(BaseModel):
@@ -49,6 +51,22 @@ class PredictionResponse(BaseModel):
     texture: Optional[float] = None
     band_count: Optional[int] = None
     image_dimensions: Optional[str] = None
+    ndvi_percentiles: Optional[dict[str, float]] = None
+    ndwi_percentiles: Optional[dict[str, float]] = None
+    ndvi_histogram: Optional[dict] = None
+    ndwi_histogram: Optional[dict] = None
+    valid_pixel_fraction: Optional[float] = None
+    land_cover_composition: Optional[dict[str, float]] = None
+    quality: Optional[str] = None
+    decimation_factor: Optional[int] = None
+    ndvi_mean_error_bound: Optional[float] = None
+    ndwi_mean_error_bound: Optional[float] = None
+    sampled_pixels: Optional[int] = None
+    indices: Optional[dict[str, dict]] = None
+    unavailable_indices: Optional[list[str]] = None
+    exports: Optional[dict[str, str]] = None
+    landuse_map: Optional[dict] = None
+    embedding_id: Optional[int] = None
     processing_metadata: Optional[ProcessingMetadata] = None
     alerts_triggered: Optional[list[dict]] = None
 
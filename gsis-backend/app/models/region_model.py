@@ -21,6 +21,12 @@ class RegionResponse(RegionBase):
     average_ndwi: Optional[float] = None
     risk_level: str = "Unknown"
     ndvi_history: Optional[list[dict]] = None
+    valid_pixel_fraction: Optional[float] = None
+    ndvi_percentiles: Optional[dict[str, float]] = None
+    ndwi_percentiles: Optional[dict[str, float]] = None
+    ndvi_histogram: Optional[dict] = None
+    ndwi_histogram: Optional[dict] = None
+    exports: Optional[dict[str, str]] = None
 
 
 class RegionListResponse(BaseModel):
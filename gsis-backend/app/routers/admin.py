@@ -11,6 +11,8 @@ from slowapi.util import get_remote_address
 
 from app.core.security import require_role, CurrentUser
 from app.core.config import get_settings
+from app.core.analysis_pool import get_analysis_pool
+from app.services.cascade_service import cascade_stats
 from app.utils.raster_utils import is_rasterio_available
 
 try:
@@ -38,6 +40,40 @@ async def list_users(request: Request, user: CurrentUser = Depends(require_role(
     }
 
 
+def _process_memory(proc: "psutil.Process") -> dict:
+    """RSS plus USS (private) and PSS (fair share of shared pages) in MB."""
+    mb = 1024 * 1024
+    try:
+        info = proc.memory_full_info()
+    except (psutil.AccessDenied, psutil.NoSuchProcess):
+        return {"pid": proc.pid}
+    memory = {"pid": proc.pid, "rss_mb": round(info.rss / mb, 1), "uss_mb": round(info.uss / mb, 1)}
+    if hasattr(info, "pss"):
+        memory["pss_mb"] = round(info.pss / mb, 1)
+    return memory
+
+
+def _worker_memory() -> dict:
+    """
+    Memory of this worker and of its sibling workers (same command line,
+    same parent — gunicorn or `uvicorn --workers`). With shared model
+    weights USS stays small while RSS counts the shared pages in full.
+    """
+    current = psutil.Process()
+    siblings = [current]
+    parent = current.parent()
+    if parent is not None:
+        try:
+            cmdline = current.cmdline()
+            siblings = [p for p in parent.children() if p.pid == current.pid or p.cmdline() == cmdline]
+        except (psutil.AccessDenied, psutil.NoSuchProcess):
+            pass
+    return {
+        "current": _process_memory(current),
+        "workers": [_process_memory(p) for p in sorted(siblings, key=lambda p: p.pid)],
+    }
+
+
 @router.get("/system-health")
 @limiter.limit("60/minute")
 async def system_health(request: Request):
@@ -59,5 +95,11 @@ async def system_health(request: Request):
         health["cpu_percent"] = psutil.cpu_percent(interval=0.1)
         health["memory_percent"] = psutil.virtual_memory().percent
         health["disk_percent"] = psutil.disk_usage("/").percent
+        health["worker_memory"] = _worker_memory()
+
+    from app.services.cnn_service import batching_metrics
+    health["cnn_batching"] = batching_metrics()
+    health["analysis_pool"] = get_analysis_pool().stats()
+    health["cnn_cascade"] = cascade_stats.metrics()
 
     return health
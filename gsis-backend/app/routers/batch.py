@@ -2,35 +2,53 @@
 Batch Router — Multi-image batch processing.
 """
 
-from typing import List
-from fastapi import APIRouter, UploadFile, File, Request, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Request, HTTPException, Query
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
+from app.core.analysis_pool import run_analysis
 from app.services.classification_service import process_single_image
 from app.services.alert_service import check_and_create_alerts
-from app.utils.validators import validate_batch_size
+from app.utils.validators import validate_batch_size, parse_index_list
 
 limiter = Limiter(key_func=get_remote_address)
 router = APIRouter(tags=["Batch"])
 
 
+def _analyze_batch(uploads: list[tuple[Optional[str], bytes]], index_names: Optional[list[str]]) -> list[dict]:
+    """Analyze a batch's files in order; a file that fails becomes an error entry."""
+    results = []
+    for filename, contents in uploads:
+        try:
+            result = process_single_image(contents, filename or "image.jpg", index_names)
+            result["filename"] = filename
+            results.append(result)
+        except HTTPException as e:
+            results.append({"filename": filename, "error": e.detail})
+    return results
+
+
 @router.post("/")
 @limiter.limit("10/minute")
-async def batch_predict(request: Request, files: List[UploadFile] = File(...)):
-    """Process up to 20 images and return per-file results."""
+async def batch_predict(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    indices: Optional[str] = Query(None, description="Extra spectral indices for GeoTIFFs, e.g. evi,savi,nbr"),
+):
+    """
+    Process up to 20 images and return per-file results. The whole batch is
+    one analysis-pool job, so it holds a single slot and is either admitted
+    or rejected (503) as a unit; files are analyzed one at a time in it.
+    """
     validate_batch_size(len(files))
+    index_names = parse_index_list(indices)
 
-    results = []
-    for f in files:
-        contents = await f.read()
-        try:
-            result = process_single_image(contents, f.filename or "image.jpg")
+    uploads = [(f.filename, await f.read()) for f in files]
+    results = await run_analysis(_analyze_batch, uploads, index_names)
+    for result in results:
+        if "error" not in result:
             check_and_create_alerts(result)
-            result["filename"] = f.filename
-            results.append(result)
-        except HTTPException as e:
-            results.append({"filename": f.filename, "error": e.detail})
 
     return {
         "results": results,
@@ -0,0 +1,53 @@
+"""
+Exports Router — Download exported index rasters (Cloud-Optimized GeoTIFFs).
+
+Per-request exports stay available for EXPORT_RETENTION_HOURS (24 h by
+default) after they were written; region COGs always hold the latest cycle.
+"""
+
+import os
+
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import FileResponse
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from app.services.export_service import EXPORT_ID_PATTERN, region_slug
+from app.services.index_service import INDEX_REGISTRY
+from app.core.config import get_settings
+
+limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(tags=["Exports"])
+
+COG_MEDIA_TYPE = "image/tiff; application=geotiff; profile=cloud-optimized"
+
+
+def _cog_response(directory: str, index_name: str) -> FileResponse:
+    if index_name not in INDEX_REGISTRY:
+        raise HTTPException(status_code=404, detail=f"Unknown index '{index_name}'")
+    path = os.path.join(directory, f"{index_name}.tif")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Export not found")
+    return FileResponse(path, media_type=COG_MEDIA_TYPE, filename=f"{index_name}.tif")
+
+
+@router.get("/regions/{region_name}/{index_name}.tif")
+@limiter.limit("60/minute")
+async def download_region_export(request: Request, region_name: str, index_name: str):
+    """Latest index COG of a monitored region (REGION_EXPORT_COGS)."""
+    slug = region_slug(region_name)
+    if not slug:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return _cog_response(os.path.join(get_settings().EXPORT_DIR, "regions", slug), index_name)
+
+
+@router.get("/{export_id}/{index_name}.tif")
+@limiter.limit("60/minute")
+async def download_export(request: Request, export_id: str, index_name: str):
+    """
+    Index COG written by /predict?export=true (supports HTTP range
+    requests); 404 once the export has expired (EXPORT_RETENTION_HOURS).
+    """
+    if not EXPORT_ID_PATTERN.match(export_id):
+        raise HTTPException(status_code=404, detail="Export not found")
+    return _cog_response(os.path.join(get_settings().EXPORT_DIR, export_id), index_name)
@@ -2,13 +2,16 @@
 Predict Router — Single image classification.
 """
 
-from fastapi import APIRouter, UploadFile, File, Request
+from typing import Literal, Optional
+
+from fastapi import APIRouter, UploadFile, File, Request, Query
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
+from app.core.analysis_pool import run_analysis
 from app.services.classification_service import process_single_image
 from app.services.alert_service import check_and_create_alerts
-from app.utils.validators import validate_upload_file
+from app.utils.validators import validate_upload_file, parse_index_list
 
 limiter = Limiter(key_func=get_remote_address)
 router = APIRouter(tags=["Prediction"])
@@ -16,17 +19,36 @@ router = APIRouter(tags=["Prediction"])
 
 @router.post("/")
 @limiter.limit("30/minute")
-async def predict(request: Request, file: UploadFile = File(...)):
+async def predict(
+    request: Request,
+    file: UploadFile = File(...),
+    indices: Optional[str] = Query(None, description="Extra spectral indices for GeoTIFFs, e.g. evi,savi,nbr"),
+    quality: Literal["fast", "full"] = Query("full", description="fast = overview/decimated GeoTIFF preview"),
+    export: bool = Query(False, description="Also write the GeoTIFF index rasters as int16 COGs"),
+    landuse_map: bool = Query(False, description="Sliding-window CNN land-use map of a GeoTIFF"),
+    chip_size: Literal[64, 224] = Query(64, description="Land-use map chip size in pixels"),
+):
     """
     Analyze a single image:
-    - .tif/.tiff → Real NDVI/NDWI with rasterio
+    - .tif/.tiff → Real NDVI/NDWI with rasterio (+ requested extra indices;
+                   quality=fast reads overviews for approximate stats;
+                   export=true returns /exports download paths of the
+                   index rasters as Cloud-Optimized GeoTIFFs, kept for
+                   EXPORT_RETENTION_HOURS;
+                   landuse_map=true classifies overlapping chip_size
+                   chips with the CNN into a class map + area fractions)
     - .jpg/.png  → Deterministic RGB pixel analysis
 
-    Returns classification, indices, and any triggered alerts.
+    Returns classification, indices, and any triggered alerts. Analysis
+    runs on the bounded analysis pool (503 when it is saturated).
     """
     validate_upload_file(file)
+    index_names = parse_index_list(indices)
     contents = await file.read()
-    result = process_single_image(contents, file.filename or "image.jpg")
+    result = await run_analysis(
+        process_single_image, contents, file.filename or "image.jpg", index_names, quality, export,
+        landuse_map, chip_size,
+    )
 
     # Check thresholds and auto-create alerts
     alerts_triggered = check_and_create_alerts(result)
@@ -0,0 +1,41 @@
+"""
+Similar Router — Find past analyses that look like an image.
+"""
+
+from fastapi import APIRouter, UploadFile, File, Request, Query
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from app.core.analysis_pool import run_analysis
+from app.services.embedding_service import find_similar, find_similar_to_entry
+from app.utils.validators import validate_upload_file
+
+limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(tags=["Similar Scenes"])
+
+
+@router.post("/")
+@limiter.limit("30/minute")
+async def similar_to_upload(
+    request: Request,
+    file: UploadFile = File(...),
+    k: int = Query(10, ge=1, le=100, description="Number of similar scenes to return"),
+):
+    """
+    Top-k stored uploads / region scenes most similar to an image (cosine
+    similarity of CNN embeddings). The query image itself is not stored.
+    """
+    validate_upload_file(file)
+    contents = await file.read()
+    return await run_analysis(find_similar, contents, file.filename or "image.jpg", k)
+
+
+@router.get("/{entry_id}")
+@limiter.limit("60/minute")
+async def similar_to_entry(
+    request: Request,
+    entry_id: int,
+    k: int = Query(10, ge=1, le=100, description="Number of similar scenes to return"),
+):
+    """Top-k stored scenes most similar to a stored one (embedding_id of a prediction)."""
+    return await run_analysis(find_similar_to_entry, entry_id, k)
@@ -0,0 +1,31 @@
+"""
+Tiles Router — XYZ map tiles of region NDVI/NDWI layers.
+
+Mounted only when REGION_EXPORT_COGS is on (the tiles render from the
+region COGs it writes).
+"""
+
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import Response
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from app.services.tile_service import get_tile
+
+limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(tags=["Tiles"])
+
+
+@router.get("/{layer}/{z}/{x}/{y}.png")
+@limiter.limit("1200/minute")
+def tile(request: Request, layer: str, z: int, x: int, y: int):
+    """
+    Colormapped PNG tile (Web Mercator XYZ) of the latest region rasters.
+    Transparent where no monitored region has data. Sync handler: cache
+    misses render in FastAPI's threadpool, off the event loop.
+    """
+    try:
+        png = get_tile(layer, z, x, y)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": "public, max-age=300"})
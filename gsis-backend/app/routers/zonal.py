@@ -0,0 +1,38 @@
+"""
+Zonal Router — Per-polygon index statistics over an uploaded GeoTIFF.
+"""
+
+from fastapi import APIRouter, UploadFile, File, Request, HTTPException
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from app.core.analysis_pool import run_analysis
+from app.services.zonal_service import process_zonal_request
+from app.utils.validators import validate_upload_file, is_tiff
+
+limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(tags=["Zonal Statistics"])
+
+
+@router.post("/")
+@limiter.limit("10/minute")
+async def zonal_stats(
+    request: Request,
+    file: UploadFile = File(..., description="Multi-band GeoTIFF"),
+    zones: UploadFile = File(..., description="GeoJSON FeatureCollection of Polygon/MultiPolygon zones"),
+):
+    """
+    Compute NDVI/NDWI mean, std and pixel count for every polygon in a
+    GeoJSON FeatureCollection (WGS84 unless a legacy "crs" member is given).
+
+    Zones share one label raster, so a pixel covered by overlapping
+    polygons counts only toward the later feature in the collection.
+    Runs on the bounded analysis pool (503 when it is saturated).
+    """
+    validate_upload_file(file)
+    if not is_tiff(file.filename or ""):
+        raise HTTPException(status_code=400, detail="Zonal statistics require a GeoTIFF (.tif/.tiff)")
+
+    tiff_bytes = await file.read()
+    geojson_bytes = await zones.read()
+    return await run_analysis(process_zonal_request, tiff_bytes, geojson_bytes)
@@ -0,0 +1,125 @@
+"""
+Cascade Service — Cheap-first classification of RGB uploads.
+
+The pixel model runs first. ResNet50 only runs when the pixel model's
+margin (top-1 minus top-2 probability) is below CASCADE_MARGIN_THRESHOLD;
+confident pixel results are returned as they are. The threshold is tuned
+for the learned pixel model ("rgb-learned"): the hand-tuned fallback
+scores are six near-uniform shares whose margin almost never reaches it,
+so without models/landuse_pixel.npz the CNN always runs.
+
+Every CASCADE_AUDIT_INTERVAL-th skipped request still queues the CNN on the
+micro-batcher without waiting for it (the response is returned first and
+the CNN answer is not used) to measure how often skipping changed the
+outcome. Audited requests count as skipped — their response did not wait
+for the CNN — and cnn_runs counts every forward pass, audits included. Outcomes are compared on coarse land-cover
+groups, since the pixel model and the EuroSAT CNN use different labels;
+labels without a EuroSAT counterpart are left out of the audit.
+Taking the CNN pipeline as reference, the accuracy delta estimate is
+    -skip_fraction x audited disagreement rate
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import get_settings
+from app.models.pixel_classifier import get_pixel_classifier
+
+# Pixel-model and EuroSAT labels → shared coarse groups ("Barren Land" has no
+# EuroSAT counterpart, so it is not grouped)
+LANDCOVER_GROUPS = {
+    "Forest": "vegetation",
+    "HerbaceousVegetation": "vegetation",
+    "Agriculture": "cropland",
+    "AnnualCrop": "cropland",
+    "PermanentCrop": "cropland",
+    "Pasture": "cropland",
+    "Urban Area": "built-up",
+    "Highway": "built-up",
+    "Industrial": "built-up",
+    "Residential": "built-up",
+    "Water Body": "water",
+    "Wetland": "water",
+    "River": "water",
+    "SeaLake": "water",
+}
+
+# Only this first stage is calibrated for CASCADE_MARGIN_THRESHOLD
+CASCADE_FIRST_STAGE = "rgb-learned"
+
+
+def first_stage_margin(result: dict) -> float:
+    """Top-1 minus top-2 probability (0-1) of a pixel-model result."""
+    values = sorted((p["value"] for p in result["probabilities"]), reverse=True)
+    if len(values) < 2:
+        return 1.0
+    return round((values[0] - values[1]) / 100, 4)
+
+
+@dataclass
+class CascadeDecision:
+    margin: float
+    run_cnn: bool  # CNN result is awaited and used for the response
+    audit: bool  # CNN runs off the response path only to measure the skip
+
+
+class CascadeStats:
+    """Skip and audit counters of the cascade."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.skipped = 0
+        self.cnn_runs = 0
+        self.audited = 0
+        self.audit_agreements = 0
+
+    def decide(self, result: dict) -> CascadeDecision:
+        settings = get_settings()
+        margin = first_stage_margin(result)
+        if not settings.CASCADE_ENABLED or result.get("analysis_model") != CASCADE_FIRST_STAGE:
+            return CascadeDecision(margin, run_cnn=True, audit=False)
+        with self._lock:
+            self.requests += 1
+            if margin < settings.CASCADE_MARGIN_THRESHOLD:
+                self.cnn_runs += 1
+                return CascadeDecision(margin, run_cnn=True, audit=False)
+            self.skipped += 1
+            interval = settings.CASCADE_AUDIT_INTERVAL
+            audit = interval > 0 and self.skipped % interval == 0
+            self.cnn_runs += audit
+        return CascadeDecision(margin, run_cnn=False, audit=audit)
+
+    def record_audit(self, pixel_class: str, reference_class: str) -> None:
+        """Compare the skipped answer with what the full pipeline would have returned."""
+        if pixel_class not in LANDCOVER_GROUPS:
+            return
+        agree = LANDCOVER_GROUPS.get(pixel_class) == LANDCOVER_GROUPS.get(reference_class)
+        with self._lock:
+            self.audited += 1
+            self.audit_agreements += agree
+
+    def metrics(self) -> dict:
+        settings = get_settings()
+        with self._lock:
+            skip_fraction = self.skipped / self.requests if self.requests else 0.0
+            agreement: Optional[float] = (
+                self.audit_agreements / self.audited if self.audited else None
+            )
+            return {
+                "enabled": settings.CASCADE_ENABLED and get_pixel_classifier() is not None,
+                "margin_threshold": settings.CASCADE_MARGIN_THRESHOLD,
+                "requests": self.requests,
+                "cnn_skipped": self.skipped,
+                "skip_fraction": round(skip_fraction, 4),
+                "cnn_runs": self.cnn_runs,
+                "audited": self.audited,
+                "audit_agreement": round(agreement, 4) if agreement is not None else None,
+                "estimated_accuracy_delta": (
+                    round(-skip_fraction * (1 - agreement), 4) if agreement is not None else None
+                ),
+            }
+
+
+cascade_stats = CascadeStats()
@@ -5,20 +5,31 @@ Handles both GeoTIFF (real satellite) and RGB (JPG/PNG) images.
 Calls NDVI, NDWI, flood, and stress services.
 """
 
-import io
-import os
+import shutil
 import time
-import tempfile
+from typing import Optional
 
 import numpy as np
 from PIL import Image
 
 from app.services.ndvi_service import (
-    calculate_ndvi, calculate_ndvi_rgb, classify_ndvi,
-    compute_ndvi_stats, build_ndvi_probabilities,
+    calculate_ndvi_rgb, classify_ndvi, build_ndvi_probabilities,
+    classify_ndvi_pixels, compute_class_fractions, NDVI_CLASS_NAMES,
+)
+from app.services.ndwi_service import calculate_ndwi_rgb
+from app.services.index_service import IndexWorkspace, split_available, finite_values
+from app.services.raster_stream_service import (
+    BlockVisitor, stream_index_stats, choose_decimation, DEFAULT_INDICES,
 )
-from app.services.ndwi_service import calculate_ndwi, calculate_ndwi_rgb
 from app.services.flood_service import assess_flood_risk, compute_vegetation_stress
+from app.services.export_service import IndexRasterExporter, new_export_dir, export_url
+from app.services.result_cache_service import get_result_cache, result_cache_key
+from app.services.landuse_map_service import map_dataset, scene_rgb
+from app.services.embedding_service import content_key, record_embedding
+from app.services.cascade_service import cascade_stats
+from app.utils.raster_utils import resolve_band_indexes, open_geotiff_bytes
+from app.utils.image_utils import PREPROCESS_VERSION, decode_rgb, resize_rgb
+from app.models.pixel_classifier import get_pixel_classifier
 from app.core.config import get_settings
 
 try:
@@ -28,42 +39,91 @@ except ImportError:
     HAS_RASTERIO = False
 
 
-def analyze_geotiff(file_path: str) -> dict:
-    """Process a multi-band GeoTIFF and return full analysis."""
+class LandCoverComposition(BlockVisitor):
+    """Per-pixel NDVI class counts accumulated block by block (BlockVisitor)."""
+
+    def __init__(self):
+        self.counts = np.zeros(len(NDVI_CLASS_NAMES), dtype=np.int64)
+
+    def visit(self, transform, values: dict[str, np.ndarray], ws: IndexWorkspace) -> None:
+        ndvi = finite_values(values["ndvi"], ws)
+        if ndvi.size:
+            self.counts += np.bincount(classify_ndvi_pixels(ndvi), minlength=len(NDVI_CLASS_NAMES))
+
+    def fork(self) -> "LandCoverComposition":
+        return LandCoverComposition()
+
+    def merge(self, other: "LandCoverComposition") -> None:
+        self.counts += other.counts
+
+
+def analyze_geotiff(
+    file_path: str,
+    indices: Optional[list[str]] = None,
+    quality: str = "full",
+    export_dir: Optional[str] = None,
+) -> dict:
+    """Process a multi-band GeoTIFF file and return full analysis."""
     with rasterio.open(file_path) as src:
-        band_count = src.count
-        width, height = src.width, src.height
-
-        nir, red, green, blue = None, None, None, None
-
-        if band_count >= 8:
-            # Sentinel-2: B2=Blue, B3=Green, B4=Red, B8=NIR
-            red = src.read(4).astype(np.float64)
-            nir = src.read(8).astype(np.float64)
-            green = src.read(3).astype(np.float64)
-            blue = src.read(2).astype(np.float64)
-        elif band_count >= 4:
-            # Landsat: B1=Blue, B2=Green, B3=Red, B4=NIR
-            red = src.read(3).astype(np.float64)
-            nir = src.read(4).astype(np.float64)
-            green = src.read(2).astype(np.float64)
-            blue = src.read(1).astype(np.float64)
-        elif band_count >= 3:
-            # RGB GeoTIFF — use Green as NIR proxy
-            red = src.read(1).astype(np.float64)
-            green = src.read(2).astype(np.float64)
-            blue = src.read(3).astype(np.float64)
-            nir = green
+        return analyze_dataset(src, indices, quality, export_dir)
+
+
+def analyze_dataset(
+    src,
+    indices: Optional[list[str]] = None,
+    quality: str = "full",
+    export_dir: Optional[str] = None,
+) -> dict:
+    """
+    Analyze an open rasterio dataset (file-backed or in-memory).
+
+    Bands are streamed block by block (see raster_stream_service), so memory
+    stays bounded by the block size even for full Sentinel-2 scenes.
+    Nodata / masked pixels are excluded and reported via
+    valid_pixel_fraction. Every valid pixel is also classified with the
+    NDVI thresholds and reduced to land_cover_composition (% per class).
+    NDVI/NDWI are always computed; any extra registered `indices` are
+    evaluated in the same pass and returned under "indices".
+
+    quality="fast" reads a decimated view (internal overviews when present)
+    capped at FAST_PREVIEW_MAX_PIXELS and reports the decimation factor and
+    an estimated error bound on the NDVI/NDWI means.
+
+    With `export_dir`, every computed index raster is also written there as
+    an int16 COG during the same pass (see export_service) and the paths are
+    returned under "exports". Exports follow the analysis grid, so
+    quality="fast" exports the decimated preview.
+    """
+    band_count = src.count
+    width, height = src.width, src.height
+
+    band_indexes = resolve_band_indexes(band_count)
+    if band_indexes is None:
+        raise ValueError(f"At least 3 bands required, got {band_count}")
+
+    requested = list(dict.fromkeys(indices or []))
+    available, unavailable = split_available(requested, band_indexes)
+    extra = tuple(n for n in available if n not in DEFAULT_INDICES)
+
+    decimation = choose_decimation(src) if quality == "fast" else 1
+    computed = DEFAULT_INDICES + extra
+    composition = LandCoverComposition()
+    if export_dir:
+        with IndexRasterExporter(src, computed, export_dir, decimation) as exporter:
+            stream = stream_index_stats(
+                src, band_indexes, computed, decimation, visitors=(composition, exporter),
+            )
+    else:
+        stream = stream_index_stats(src, band_indexes, computed, decimation, visitors=(composition,))
+    stats = stream.stats
 
     # NDVI
-    ndvi = calculate_ndvi(nir, red)
-    ndvi_stats = compute_ndvi_stats(ndvi)
+    ndvi_stats = stats["ndvi"].summary("ndvi")
     predicted_class, vegetation_status = classify_ndvi(ndvi_stats["ndvi_mean"])
     probabilities = build_ndvi_probabilities(ndvi_stats["ndvi_mean"])
 
     # NDWI
-    ndwi = calculate_ndwi(green, nir)
-    ndwi_mean = round(float(np.nanmean(ndwi)), 4)
+    ndwi_mean = stats["ndwi"].summary("ndwi")["ndwi_mean"]
 
     # Flood + stress
     flood_risk = assess_flood_risk(ndwi_mean)
@@ -71,7 +131,7 @@ def analyze_geotiff(file_path: str) -> dict:
 
     confidence = min(round(abs(ndvi_stats["ndvi_mean"]) + 0.4, 2), 0.99)
 
-    return {
+    result = {
         "predicted_class": predicted_class,
         "confidence": confidence,
         **ndvi_stats,
@@ -83,13 +143,44 @@ def analyze_geotiff(file_path: str) -> dict:
         "probabilities": probabilities,
         "band_count": band_count,
         "image_dimensions": f"{width}x{height}",
+        "valid_pixel_fraction": stream.valid_pixel_fraction,
+        "land_cover_composition": compute_class_fractions(composition.counts),
+        **stream.distribution("ndvi"),
+        **stream.distribution("ndwi"),
+        "quality": quality,
+        "decimation_factor": decimation,
     }
+    if quality == "fast":
+        result["ndvi_mean_error_bound"] = round(stats["ndvi"].mean_error_bound(), 4)
+        result["ndwi_mean_error_bound"] = round(stats["ndwi"].mean_error_bound(), 4)
+        result["sampled_pixels"] = stats["ndvi"].count
+    if requested:
+        result["indices"] = {name: stats[name].summary() for name in available}
+        if unavailable:
+            result["unavailable_indices"] = unavailable
+    if export_dir:
+        result["exports"] = exporter.paths
+    return result
 
 
 def analyze_rgb_image(image: Image.Image) -> dict:
     """Deterministic pixel-based analysis for standard RGB images."""
-    image = image.convert("RGB")
-    arr = np.array(image.resize((224, 224)), dtype=np.float64)
+    return analyze_rgb_pixels(resize_rgb(image), stats_pixels=resize_rgb(image, resample=Image.BICUBIC))
+
+
+def analyze_rgb_pixels(
+    pixels: np.ndarray, use_learned: bool = True, stats_pixels: Optional[np.ndarray] = None,
+) -> dict:
+    """
+    Pixel-based analysis of a decoded 224x224x3 uint8 array (see decode_rgb).
+
+    Statistics and hand-tuned scores come from stats_pixels (the bicubic
+    DecodedImage.stats_pixels) when given, else from pixels. Land use comes
+    from the trained NumPy pixel classifier on pixels when
+    models/landuse_pixel.npz exists (and use_learned is set), otherwise
+    from the hand-tuned scores.
+    """
+    arr = (pixels if stats_pixels is None else stats_pixels).astype(np.float64)
 
     avg_r = float(np.mean(arr[:, :, 0]))
     avg_g = float(np.mean(arr[:, :, 1]))
@@ -123,6 +214,15 @@ def analyze_rgb_image(image: Image.Image) -> dict:
     }
     ts = sum(scores.values()) or 1.0
     probs = {k: round((v / ts) * 100, 1) for k, v in scores.items()}
+    analysis_model = "rgb-pixel"
+
+    # Trained EuroSAT pixel model replaces the hand-tuned scores when present
+    classifier = get_pixel_classifier() if use_learned else None
+    if classifier is not None:
+        learned = classifier.classify(pixels)
+        probs = {name: round(float(p) * 100, 1) for name, p in zip(classifier.classes, learned)}
+        analysis_model = "rgb-learned"
+
     predicted = max(probs, key=probs.get)
     conf = round(probs[predicted] / 100, 2)
 
@@ -139,7 +239,7 @@ def analyze_rgb_image(image: Image.Image) -> dict:
         "flood_risk": flood_risk,
         "vegetation_status": veg_status,
         "vegetation_stress": veg_stress,
-        "analysis_model": "rgb-pixel",
+        "analysis_model": analysis_model,
         "probabilities": sorted([{"name": k, "value": v} for k, v in probs.items()], key=lambda x: -x["value"]),
         "dominant_rgb": {"red": round(avg_r, 1), "green": round(avg_g, 1), "blue": round(avg_b, 1)},
         "brightness": round(brightness, 1),
@@ -147,56 +247,157 @@ def analyze_rgb_image(image: Image.Image) -> dict:
     }
 
 
-def process_single_image(contents: bytes, filename: str) -> dict:
+# CNN overrides pixel classification only when confident enough
+CNN_OVERRIDE_THRESHOLD = 0.50
+
+
+def _audit_skip(pixels: np.ndarray, pixel_class: str) -> None:
+    """
+    Queue the CNN for a request the cascade skipped and, once it finishes,
+    record whether the full pipeline would have answered differently. The
+    request does not wait for it.
+    """
+    from app.services.cnn_service import submit_from_array
+
+    future = submit_from_array(pixels)
+    if future is None:
+        return
+
+    def record(done) -> None:
+        if done.exception() is not None:
+            return
+        cnn_result = done.result()
+        confident = cnn_result["cnn_confidence"] >= CNN_OVERRIDE_THRESHOLD
+        cascade_stats.record_audit(pixel_class, cnn_result["cnn_class"] if confident else pixel_class)
+
+    future.add_done_callback(record)
+
+
+def _scene_thumbnail(src) -> Optional[np.ndarray]:
+    """
+    RGB thumbnail of a GeoTIFF for the CNN, or None when unavailable or not
+    wanted (EMBEDDING_GEOTIFF_UPLOADS off: the TIFF CNN result only feeds
+    /similar and never overrides the NDVI analysis).
+    """
+    from app.services.cnn_service import is_cnn_available
+    settings = get_settings()
+    if not (settings.EMBEDDING_GEOTIFF_UPLOADS and settings.EMBEDDING_STORE_ENABLED) or not is_cnn_available():
+        return None
+    try:
+        return scene_rgb(src)
+    except ValueError:
+        return None
+
+
+def process_single_image(
+    contents: bytes,
+    filename: str,
+    indices: Optional[list[str]] = None,
+    quality: str = "full",
+    export: bool = False,
+    landuse_map: bool = False,
+    chip_size: int = 64,
+) -> dict:
     """
     Process a single image file:
-    1. TIFF → rasterio NDVI/NDWI analysis
-    2. RGB  → pixel-based analysis + CNN deep learning classification
+    1. TIFF → rasterio NDVI/NDWI analysis (+ optional extra spectral indices,
+              quality="fast" for a decimated preview, export=True to write
+              the index rasters as COGs served under /exports,
+              landuse_map=True for a sliding-window CNN class map of
+              chip_size chips, see landuse_map_service)
+    2. RGB  → decoded once to 224x224 → pixel-based analysis, then CNN deep
+              learning classification on the same array when the pixel
+              model's margin is below CASCADE_MARGIN_THRESHOLD (learned
+              pixel model only; the CNN always runs after the heuristics)
     Returns full analysis dict with processing metadata.
+
+    CNN embeddings of analyzed uploads (GeoTIFFs only with
+    EMBEDDING_GEOTIFF_UPLOADS) are kept for /similar searches
+    (embedding_id in the result).
+
+    Results are served from the content-addressed result cache when the
+    same bytes were analyzed with the same options, model, preprocessing
+    and app version (exports are never cached); processing_metadata.cache
+    reports the lookup and the cache's hit / miss / eviction counters.
     """
     from fastapi import HTTPException
 
     start = time.time()
     settings = get_settings()
     is_tiff = filename.lower().endswith((".tif", ".tiff"))
+    cnn_pixels = None
+
+    cache = None if export else get_result_cache()
+    if cache is not None:
+        from app.services.cnn_service import model_version
+        pixel_model = get_pixel_classifier()
+        cache_key = result_cache_key(
+            contents, is_tiff, indices or [], quality, model_version(), settings.APP_VERSION,
+            not is_tiff and PREPROCESS_VERSION,
+            landuse_map and is_tiff and chip_size,
+            settings.CASCADE_ENABLED and settings.CASCADE_MARGIN_THRESHOLD,
+            is_tiff and settings.EMBEDDING_GEOTIFF_UPLOADS and settings.EMBEDDING_STORE_ENABLED,
+            pixel_model.version if pixel_model else None,
+        )
+        cached, tier = cache.get(cache_key)
+        if cached is not None:
+            metadata = cached["processing_metadata"]
+            metadata["processing_time_seconds"] = round(time.time() - start, 3)
+            metadata["cache"] = {"status": "hit", "tier": tier, **cache.stats()}
+            return cached
 
     if is_tiff:
         if not HAS_RASTERIO:
             raise HTTPException(status_code=400, detail="rasterio not installed. Run: pip install rasterio")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".tif") as tmp:
-            tmp.write(contents)
-            tmp_path = tmp.name
+        if landuse_map:
+            from app.services.cnn_service import is_cnn_available
+            if not is_cnn_available():
+                raise HTTPException(status_code=503, detail="CNN model not available for land-use mapping")
+        export_id, export_dir = new_export_dir() if export else (None, None)
         try:
-            result = analyze_geotiff(tmp_path)
+            with open_geotiff_bytes(contents) as src:
+                result = analyze_dataset(src, indices, quality, export_dir)
+                if landuse_map:
+                    result["landuse_map"] = map_dataset(src, chip_size)
+                cnn_pixels = _scene_thumbnail(src)
         except Exception as e:
+            if export_dir:
+                shutil.rmtree(export_dir, ignore_errors=True)
             raise HTTPException(status_code=400, detail=f"Error reading GeoTIFF: {e}")
-        finally:
-            os.unlink(tmp_path)
+        if export_id:
+            result["exports"] = {name: export_url(export_id, name) for name in result["exports"]}
     else:
         try:
-            image = Image.open(io.BytesIO(contents))
-            result = analyze_rgb_image(image)
-            result["image_dimensions"] = f"{image.width}x{image.height}"
+            decoded = decode_rgb(contents)
+            result = analyze_rgb_pixels(decoded.pixels, stats_pixels=decoded.stats_pixels)
+            result["image_dimensions"] = f"{decoded.width}x{decoded.height}"
+            cnn_pixels = decoded.pixels
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid image file")
 
     # -------------------------------------------------------------------
-    # CNN Deep Learning Classification (for RGB images)
+    # CNN Deep Learning Classification
+    # RGB: cascade — only when the pixel model is unsure (see cascade_service)
+    # TIFF: informational, on the scene's RGB thumbnail (EMBEDDING_GEOTIFF_UPLOADS)
     # -------------------------------------------------------------------
     analysis_engines = [result.get("analysis_model", "unknown")]
+    cascade = None
 
     try:
-        from app.services.cnn_service import predict_from_bytes, is_cnn_available
-        if is_cnn_available():
-            cnn_result = predict_from_bytes(contents)
+        from app.services.cnn_service import predict_from_array, is_cnn_available
+        if cnn_pixels is not None and is_cnn_available():
+            cascade = None if is_tiff else cascade_stats.decide(result)
+            if cascade is not None and cascade.audit:
+                _audit_skip(cnn_pixels, result["predicted_class"])
+            cnn_result = predict_from_array(cnn_pixels) if cascade is None or cascade.run_cnn else None
             if cnn_result:
+                embedding = cnn_result.pop("embedding", None)
                 result["cnn_class"] = cnn_result["cnn_class"]
                 result["cnn_confidence"] = cnn_result["cnn_confidence"]
                 result["cnn_probabilities"] = cnn_result["cnn_probabilities"]
                 result["cnn_device"] = cnn_result["device"]
 
                 # CNN overrides pixel classification only when confident enough
-                CNN_OVERRIDE_THRESHOLD = 0.50
                 if not is_tiff and cnn_result["cnn_confidence"] >= CNN_OVERRIDE_THRESHOLD:
                     result["predicted_class"] = cnn_result["cnn_class"]
                     result["confidence"] = cnn_result["cnn_confidence"]
@@ -204,6 +405,13 @@ def process_single_image(contents: bytes, filename: str) -> dict:
                     result["probabilities"] = cnn_result["cnn_probabilities"]
 
                 analysis_engines.append("cnn-resnet50")
+
+                entry_id = record_embedding(
+                    content_key(contents), embedding, kind="upload", name=filename,
+                    predicted_class=result["predicted_class"], cnn_class=cnn_result["cnn_class"],
+                )
+                if entry_id is not None:
+                    result["embedding_id"] = entry_id
     except Exception:
         pass  # CNN not available, continue with pixel/NDVI results
 
@@ -217,5 +425,14 @@ def process_single_image(contents: bytes, filename: str) -> dict:
         "model_version": settings.APP_VERSION,
         "analysis_engines": analysis_engines,
     }
+    if cascade is not None:
+        result["processing_metadata"]["cascade"] = {
+            "first_stage_margin": cascade.margin,
+            "cnn_skipped": not cascade.run_cnn,
+            "audited": cascade.audit,
+        }
+    if cache is not None:
+        cache.put(cache_key, result)
+        result["processing_metadata"]["cache"] = {"status": "miss", **cache.stats()}
     return result
 
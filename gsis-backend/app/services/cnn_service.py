@@ -2,73 +2,169 @@
 CNN Service — Deep learning land-use classification.
 
 Provides CNN-based image classification using ResNet50 transfer learning.
-Falls back to pixel-based analysis when PyTorch is not available.
+Falls back to pixel-based analysis when no inference runtime is available.
 
 Pipeline:
-  Image → Preprocess (224x224, normalize) → ResNet50 → Softmax → Class + Confidence
+  Bytes → decode_rgb (224x224 uint8, shared with pixel analysis)
+        → micro-batch queue (MicroBatcher)
+        → inference backend (CNN_BACKEND: eager / TorchScript / ONNX Runtime
+          fp32 or int8, see models/inference_backends) → Softmax → Class + Confidence
 """
 
-import io
 import logging
-from typing import Optional
+import threading
+from concurrent.futures import Future
+from typing import Optional, Sequence
 
+import numpy as np
 from PIL import Image
 
-from app.models.cnn_model import CLASSES, HAS_TORCH
-
-if HAS_TORCH:
-    import torch
-    import torch.nn.functional as F
-    from torchvision import transforms
+from app.models.cnn_model import CLASSES
+from app.models.inference_backends import load_backend
+from app.utils.image_utils import MODEL_INPUT_SIZE, decode_rgb, resize_rgb
+from app.utils.batch_scheduler import MicroBatcher
+from app.core.config import get_settings
 
 logger = logging.getLogger("cnn_service")
 
-# ---------------------------------------------------------------------------
-# Image preprocessing (ImageNet normalization)
-# ---------------------------------------------------------------------------
-
-if HAS_TORCH:
-    preprocess = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225],
-        ),
-    ])
-
 # ---------------------------------------------------------------------------
 # Model singleton
 # ---------------------------------------------------------------------------
 
 _model = None
 _model_loaded = False
+_model_lock = threading.Lock()
 
 
 def _get_model():
-    """Lazy-load the CNN model."""
+    """
+    Lazy-load the configured inference backend. Concurrent first callers
+    (analysis pool threads) wait for the one load instead of seeing no model.
+    """
     global _model, _model_loaded
     if _model_loaded:
         return _model
-    _model_loaded = True
-
-    from app.models.cnn_model import get_model
-    _model = get_model()
-    if _model:
-        logger.info(f"CNN model ready — {len(CLASSES)} classes: {CLASSES}")
-    else:
-        logger.warning("CNN model not available — using pixel-based fallback")
+    with _model_lock:
+        if not _model_loaded:
+            _model = load_backend(get_settings().CNN_BACKEND)
+            _model_loaded = True  # only once the load has returned; a raising load is retried
+            if _model:
+                logger.info(f"CNN model ready [{_model.name}] — {len(CLASSES)} classes: {CLASSES}")
+            else:
+                logger.warning("CNN model not available — using pixel-based fallback")
     return _model
 
 
+def preload_model() -> bool:
+    """
+    Load and warm up the model in the current process ahead of the first request.
+
+    Called in the gunicorn master before workers fork (see gunicorn.conf.py) so
+    the weights and the warmed-up module are shared copy-on-write. The warm-up
+    pass runs single-threaded: a forked child cannot reuse an OpenMP pool the
+    parent already started. ONNX Runtime sessions are not fork-safe, so ONNX
+    backends are left for each worker to load.
+    """
+    if get_settings().CNN_BACKEND.startswith("onnx"):
+        logger.info("ONNX Runtime backend — model loads in each worker")
+        return False
+    model = _get_model()
+    if model is None:
+        return False
+
+    import torch
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        _run_batch([np.zeros((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3), dtype=np.uint8)])
+    finally:
+        torch.set_num_threads(threads)
+    logger.info(f"CNN model preloaded [{model.name}]")
+    return True
+
+
+def model_version() -> str:
+    """
+    Identifier of the model predictions come from: backend name plus a
+    content hash of its weights file (or the ImageNet backbone), "none"
+    when no backend is available.
+    """
+    model = _get_model()
+    return model.version if model is not None else "none"
+
+
 def is_cnn_available() -> bool:
     """Check if CNN inference is available."""
-    return HAS_TORCH and _get_model() is not None
+    return _get_model() is not None
 
 
 def predict_landuse(image: Image.Image) -> Optional[dict]:
+    """Run CNN inference on a PIL image (see predict_from_array)."""
+    return predict_from_array(resize_rgb(image))
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _format_prediction(probabilities: np.ndarray, features: Optional[np.ndarray], model) -> dict:
+    """Result dict for one row of softmax probabilities (+ its pooled features)."""
+    predicted_idx = int(np.argmax(probabilities))
+    prob_list = sorted(
+        [{"name": CLASSES[i], "value": round(float(probabilities[i]) * 100, 1)}
+         for i in range(len(CLASSES))],
+        key=lambda x: -x["value"],
+    )
+    return {
+        "cnn_class": CLASSES[predicted_idx],
+        "cnn_confidence": round(float(probabilities[predicted_idx]), 4),
+        "cnn_probabilities": prob_list,
+        "model_type": "resnet50",
+        "backend": model.name,
+        "device": model.device,
+        "embedding": features,
+    }
+
+
+def _run_batch(pixels_batch: Sequence[np.ndarray]) -> list[dict]:
+    """One batched forward pass over stacked 224x224x3 uint8 arrays."""
+    model = _get_model()
+    logits, features = model.forward(np.stack(pixels_batch))
+    probabilities = _softmax(logits.astype(np.float64))
+    if features is None:
+        features = [None] * len(probabilities)
+    return [_format_prediction(row, feats, model) for row, feats in zip(probabilities, features)]
+
+
+_batcher: Optional[MicroBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def _get_batcher() -> MicroBatcher:
+    """Shared scheduler batching concurrent requests (CNN_MAX_BATCH_SIZE / CNN_MAX_WAIT_MS)."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            settings = get_settings()
+            _batcher = MicroBatcher(
+                _run_batch, settings.CNN_MAX_BATCH_SIZE, settings.CNN_MAX_WAIT_MS, name="cnn-batcher",
+            )
+        return _batcher
+
+
+def batching_metrics() -> Optional[dict]:
+    """Batch-size and queue-wait metrics, or None before the first inference."""
+    return _batcher.metrics() if _batcher is not None else None
+
+
+def predict_from_array(pixels: np.ndarray) -> Optional[dict]:
     """
-    Run CNN inference on an image.
+    Run CNN inference on a decoded 224x224x3 uint8 array (see decode_rgb).
+
+    Concurrent calls are micro-batched: the request waits at most
+    CNN_MAX_WAIT_MS for others to share one forward pass of up to
+    CNN_MAX_BATCH_SIZE images, and gets back only its own prediction.
 
     Returns:
         {
@@ -76,57 +172,52 @@ def predict_landuse(image: Image.Image) -> Optional[dict]:
             "cnn_confidence": 0.87,
             "cnn_probabilities": [{"name": "Forest", "value": 87.2}, ...],
             "model_type": "resnet50",
-            "device": "cuda" / "cpu"
+            "backend": "eager" / "onnx_int8_static" / ...,
+            "device": "cuda" / "cpu",
+            "embedding": (2048,) float32 pooled ResNet50 features, or None
         }
     Or None if CNN is not available.
     """
-    model = _get_model()
-    if model is None:
+    if _get_model() is None:
         return None
 
     try:
-        # Preprocess
-        image = image.convert("RGB")
-        input_tensor = preprocess(image).unsqueeze(0)
-
-        # Move to same device as model
-        device = next(model.parameters()).device
-        input_tensor = input_tensor.to(device)
-
-        # Inference
-        with torch.no_grad():
-            outputs = model(input_tensor)
-            probabilities = F.softmax(outputs, dim=1)[0]
-
-        # Extract results
-        confidence, predicted_idx = torch.max(probabilities, 0)
-        predicted_class = CLASSES[predicted_idx.item()]
-
-        # Build probability list
-        prob_list = sorted(
-            [{"name": CLASSES[i], "value": round(probabilities[i].item() * 100, 1)}
-             for i in range(len(CLASSES))],
-            key=lambda x: -x["value"],
-        )
-
-        return {
-            "cnn_class": predicted_class,
-            "cnn_confidence": round(confidence.item(), 4),
-            "cnn_probabilities": prob_list,
-            "model_type": "resnet50",
-            "device": str(device),
-        }
-
+        return _get_batcher()(pixels)
     except Exception as e:
         logger.error(f"CNN inference failed: {e}")
         return None
 
 
+def submit_from_array(pixels: np.ndarray) -> Optional[Future]:
+    """
+    Queue a prediction on the micro-batcher without waiting for it: the
+    Future resolves to the predict_from_array result. None if CNN is not
+    available.
+    """
+    if _get_model() is None:
+        return None
+    return _get_batcher().submit(pixels)
+
+
+def predict_probabilities(pixels: np.ndarray) -> Optional[np.ndarray]:
+    """
+    (N, classes) softmax probabilities for a stacked (N, 224, 224, 3) uint8
+    batch, or None if CNN is not available.
+
+    For bulk callers that already batch (e.g. land-use mapping): the batch
+    goes straight to the backend instead of through the micro-batcher.
+    """
+    model = _get_model()
+    if model is None:
+        return None
+    return _softmax(model.logits(pixels).astype(np.float64))
+
+
 def predict_from_bytes(image_bytes: bytes) -> Optional[dict]:
     """Run CNN inference from raw image bytes."""
     try:
-        image = Image.open(io.BytesIO(image_bytes))
-        return predict_landuse(image)
+        pixels = decode_rgb(image_bytes).pixels
     except Exception as e:
         logger.error(f"Failed to open image for CNN: {e}")
         return None
+    return predict_from_array(pixels)
@@ -0,0 +1,492 @@
+"""
+Embedding Service — "Find similar scenes" over CNN scene embeddings.
+
+Every CNN pass also yields the 2048-d pooled ResNet50 features. Uploads
+and region scenes store them, L2-normalized, as float16 rows of an
+append-only store (4 KB per scene), and similarity is their cosine.
+
+Search:
+  brute force  exact, chunked float32 matrix-vector products; used while
+               the store has fewer than EMBEDDING_ANN_THRESHOLD entries
+  IVF-PQ       approximate: a k-means coarse quantizer (inverted lists)
+               plus product-quantized residuals (64 sub-vectors x 8 bits)
+               in NumPy. EMBEDDING_NPROBE lists are scanned with lookup
+               tables, then the best candidates are re-ranked exactly.
+               Trained in the background once the threshold is passed and
+               retrained whenever the store doubles.
+
+Storage (EMBEDDING_DIR/<model version>/, so embeddings of different models
+never mix):
+  vectors.f16    raw (N, 2048) float16 rows
+  entries.jsonl  one metadata line per row
+  store.lock     flock taken around every append and resync
+
+All workers share the files: an entry's id is its row in the files, assigned
+under the lock after catching up with rows other processes appended, so ids
+are the same in every process.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import get_settings
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:  # Windows: single-process use only
+    HAS_FCNTL = False
+
+logger = logging.getLogger("embeddings")
+
+EMBEDDING_DIM = 2048
+PQ_SUBVECTORS = 64
+PQ_CODEWORDS = 256
+TRAIN_SAMPLE = 10000
+KMEANS_ITERATIONS = 10
+RERANK_FACTOR = 10
+SEARCH_CHUNK = 8192
+
+
+def content_key(contents: bytes) -> str:
+    """Store key of an upload (BLAKE2b of its bytes)."""
+    return hashlib.blake2b(contents, digest_size=16).hexdigest()
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ---------------------------------------------------------------------------
+# IVF-PQ index
+# ---------------------------------------------------------------------------
+
+def kmeans(x: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means on float32 rows; empty clusters are re-seeded."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=len(x) < k)].copy()
+    for _ in range(iterations):
+        assign = nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), size=int(empty.sum()))]
+    return centroids
+
+
+def nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (L2) for every row of x, in chunks."""
+    c_norms = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(x), dtype=np.int32)
+    for i in range(0, len(x), SEARCH_CHUNK):
+        chunk = x[i:i + SEARCH_CHUNK]
+        out[i:i + SEARCH_CHUNK] = (c_norms - 2 * chunk @ centroids.T).argmin(axis=1)
+    return out
+
+
+class IVFPQIndex:
+    """Inverted-file index with product-quantized residuals (inner-product search)."""
+
+    def __init__(self, n_lists: int, n_probe: int, n_subvectors: int = PQ_SUBVECTORS):
+        self.n_lists = n_lists
+        self.n_probe = min(n_probe, n_lists)
+        self.m = n_subvectors
+        self.coarse: Optional[np.ndarray] = None       # (n_lists, dim)
+        self.codebooks: Optional[np.ndarray] = None    # (m, 256, dim / m)
+        self.lists = np.empty(0, dtype=np.int32)       # list of every indexed row
+        self.codes = np.empty((0, n_subvectors), dtype=np.uint8)
+        # Inverted lists: the rows of list l are list_rows[l][:list_sizes[l]]
+        # (arrays grow by doubling, so appends stay amortized O(1))
+        self.list_rows = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self.list_sizes = np.zeros(n_lists, dtype=np.int64)
+        self.trained_on = 0
+
+    def train(self, sample: np.ndarray) -> None:
+        self.coarse = kmeans(sample, self.n_lists)
+        residuals = sample - self.coarse[nearest(sample, self.coarse)]
+        sub = residuals.reshape(len(sample), self.m, -1)
+        self.codebooks = np.stack([
+            kmeans(np.ascontiguousarray(sub[:, s]), PQ_CODEWORDS, seed=s) for s in range(self.m)
+        ])
+        self.trained_on = len(sample)
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Encode float32 rows (appended in store order)."""
+        lists = nearest(vectors, self.coarse)
+        sub = (vectors - self.coarse[lists]).reshape(len(vectors), self.m, -1)
+        codes = np.stack([nearest(np.ascontiguousarray(sub[:, s]), self.codebooks[s])
+                          for s in range(self.m)], axis=1).astype(np.uint8)
+        self._append_to_lists(lists, start=len(self.lists))
+        self.lists = np.concatenate([self.lists, lists])
+        self.codes = np.concatenate([self.codes, codes])
+
+    def _append_to_lists(self, lists: np.ndarray, start: int) -> None:
+        """File rows start, start + 1, ... under their lists (one argsort per batch)."""
+        order = np.argsort(lists, kind="stable")
+        counts = np.bincount(lists, minlength=self.n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        rows = start + order
+        for l in np.flatnonzero(counts):
+            segment = rows[offsets[l]:offsets[l + 1]]
+            size = self.list_sizes[l]
+            if size + len(segment) > len(self.list_rows[l]):
+                grown = np.empty(max(16, 2 * (size + len(segment))), dtype=np.int64)
+                grown[:size] = self.list_rows[l][:size]
+                self.list_rows[l] = grown
+            self.list_rows[l][size:size + len(segment)] = segment
+            self.list_sizes[l] += len(segment)
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def search(self, query: np.ndarray, n: int) -> np.ndarray:
+        """Rows of the n best approximate inner products with `query`."""
+        list_scores = self.coarse @ query
+        probe = np.argpartition(-list_scores, self.n_probe - 1)[:self.n_probe]
+        candidates = np.concatenate([self.list_rows[l][:self.list_sizes[l]] for l in probe])
+        if len(candidates) == 0:
+            return candidates
+
+        # q·x ≈ q·coarse[list] + Σ_s q_s·codebook_s[code_s]
+        tables = np.einsum("skd,sd->sk", self.codebooks, query.reshape(self.m, -1))
+        scores = list_scores[self.lists[candidates]]
+        codes = self.codes[candidates]
+        for s in range(self.m):
+            scores += tables[s, codes[:, s]]
+        if len(candidates) > n:
+            top = np.argpartition(-scores, n - 1)[:n]
+            candidates = candidates[top]
+        return candidates
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class EmbeddingStore:
+    """Append-only float16 embedding array with metadata and top-k search."""
+
+    def __init__(self, directory: Optional[str], ann_threshold: int, n_probe: int):
+        self.directory = directory
+        self.ann_threshold = ann_threshold
+        self.n_probe = n_probe
+        self._buffer = np.empty((0, EMBEDDING_DIM), dtype=np.float16)  # grows by doubling
+        self.entries: list[dict] = []
+        self.keys: dict[str, int] = {}
+        self.index: Optional[IVFPQIndex] = None
+        self._building = False
+        self._building_lock = threading.Lock()  # check-and-set of _building
+        self._entries_bytes = 0  # entries.jsonl bytes already read
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """(N, dim) float16 view; rows are never rewritten, so views stay valid snapshots."""
+        return self._buffer[:len(self.entries)]
+
+    def _paths(self) -> tuple[str, str]:
+        return (os.path.join(self.directory, "vectors.f16"),
+                os.path.join(self.directory, "entries.jsonl"))
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive cross-process lock on the store files (no-op for in-memory stores)."""
+        if not self.directory or not HAS_FCNTL:
+            yield
+            return
+        with open(os.path.join(self.directory, "store.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self) -> None:
+        with self._lock, self._file_lock():
+            self._sync()
+        logger.info(f"Embedding store: {len(self.entries)} entries from {self.directory}")
+        self._maybe_build_index()
+
+    def _sync(self) -> None:
+        """
+        Catch up with rows appended by other processes. Call with both locks
+        held: no append is in flight then, so a row missing from one of the
+        files is a crashed write and both files are cut back to the last
+        complete row to keep later appends aligned.
+        """
+        vectors_path, entries_path = self._paths()
+        if not os.path.exists(entries_path):
+            return
+        with open(entries_path, "rb") as f:
+            f.seek(self._entries_bytes)
+            tail = f.read()
+        new_entries, ends, pos = [], [], 0
+        for line in tail.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            pos += len(line)
+            if line.strip():
+                new_entries.append(json.loads(line))
+                ends.append(pos)
+
+        row_bytes = EMBEDDING_DIM * 2
+        have = len(self.entries)
+        rows = os.path.getsize(vectors_path) // row_bytes if os.path.exists(vectors_path) else 0
+        keep = max(0, min(len(new_entries), rows - have))
+        entries_end = self._entries_bytes + (ends[keep - 1] if keep else 0)
+        if entries_end < self._entries_bytes + len(tail):
+            os.truncate(entries_path, entries_end)
+        if os.path.exists(vectors_path) and os.path.getsize(vectors_path) > (have + keep) * row_bytes:
+            os.truncate(vectors_path, (have + keep) * row_bytes)
+        self._entries_bytes = entries_end
+        if keep:
+            with open(vectors_path, "rb") as f:
+                f.seek(have * row_bytes)
+                block = np.frombuffer(f.read(keep * row_bytes), dtype=np.float16)
+            self._append_rows(block.reshape(keep, EMBEDDING_DIM), new_entries[:keep])
+
+    def _append_rows(self, vectors: np.ndarray, entries: list[dict]) -> None:
+        """Add rows to the in-memory buffer, key map and index (call with self._lock held)."""
+        start, end = len(self.entries), len(self.entries) + len(entries)
+        if end > len(self._buffer):
+            grown = np.empty((max(1024, 2 * end), EMBEDDING_DIM), dtype=np.float16)
+            grown[:start] = self._buffer[:start]
+            self._buffer = grown
+        self._buffer[start:end] = vectors
+        for row, entry in enumerate(entries, start):
+            entry["id"] = row  # the row is the id (files written before locking could disagree)
+            self.keys[entry["key"]] = row
+        self.entries.extend(entries)
+        if self.index is not None:
+            self.index.add(vectors.astype(np.float32))
+
+    def refresh(self) -> None:
+        """Pick up rows other workers have stored since the last call."""
+        if self.directory:
+            with self._lock, self._file_lock():
+                self._sync()
+            self._maybe_build_index()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, key: str, embedding: np.ndarray, **metadata) -> int:
+        """Store one embedding (skipped when `key` is already present); returns its id."""
+        vector = normalize(embedding).astype(np.float16)
+        with self._lock, self._file_lock():
+            if self.directory:
+                self._sync()
+            if key in self.keys:
+                return self.keys[key]
+            entry_id = len(self.entries)
+            entry = {"id": entry_id, "key": key,
+                     "created_at": datetime.now(timezone.utc).isoformat(), **metadata}
+            if self.directory:
+                vectors_path, entries_path = self._paths()
+                line = (json.dumps(entry) + "\n").encode()
+                with open(vectors_path, "ab") as f:
+                    f.write(vector.tobytes())
+                with open(entries_path, "ab") as f:
+                    f.write(line)
+                self._entries_bytes += len(line)
+            self._append_rows(vector[np.newaxis], [entry])
+            self._maybe_build_index()
+            return entry_id
+
+    def vector(self, entry_id: int) -> np.ndarray:
+        return self.vectors[entry_id].astype(np.float32)
+
+    # -- index maintenance ---------------------------------------------------
+
+    def _maybe_build_index(self) -> None:
+        n = len(self.entries)
+        if n < self.ann_threshold:
+            return
+        if self.index is not None and n < 2 * self.index.trained_on:
+            return
+        with self._building_lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build_index, name="embedding-index", daemon=True).start()
+
+    def _build_index(self) -> None:
+        start = time.time()
+        try:
+            with self._lock:
+                vectors = self.vectors
+            n = len(vectors)
+            rng = np.random.default_rng(0)
+            sample = vectors[np.sort(rng.choice(n, size=min(n, TRAIN_SAMPLE), replace=False))]
+            index = IVFPQIndex(n_lists=max(1, int(4 * np.sqrt(n))), n_probe=self.n_probe)
+            index.train(sample.astype(np.float32))
+            for i in range(0, n, SEARCH_CHUNK):
+                index.add(vectors[i:i + SEARCH_CHUNK].astype(np.float32))
+            with self._lock:
+                # Rows added while training
+                if len(self.vectors) > n:
+                    index.add(self.vectors[n:].astype(np.float32))
+                self.index = index
+            logger.info(f"Embedding IVF-PQ index: {len(index)} vectors, {index.n_lists} lists "
+                        f"in {time.time() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"Embedding index build failed: {e}")
+        finally:
+            with self._building_lock:
+                self._building = False
+
+    # -- search --------------------------------------------------------------
+
+    def _brute_force(self, vectors: np.ndarray, query: np.ndarray, n: int) -> np.ndarray:
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for i in range(0, len(vectors), SEARCH_CHUNK):
+            scores[i:i + SEARCH_CHUNK] = vectors[i:i + SEARCH_CHUNK].astype(np.float32) @ query
+        if len(scores) <= n:
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, n - 1)[:n]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, embedding: np.ndarray, k: int = 10, exclude_key: Optional[str] = None) -> dict:
+        """Top-k most similar stored entries (cosine similarity)."""
+        query = normalize(embedding)
+        self.refresh()
+        n = k + (1 if exclude_key else 0)
+        with self._lock:
+            vectors, entries, index = self.vectors, list(self.entries), self.index
+            candidates = None
+            if index is not None and len(index) == len(vectors):
+                candidates = index.search(query, n * RERANK_FACTOR)
+
+        if candidates is not None:
+            method = "ivf_pq"
+            exact = vectors[candidates].astype(np.float32) @ query
+            order = candidates[np.argsort(-exact)]
+        else:
+            method = "brute_force"
+            order = self._brute_force(vectors, query, n)
+
+        results = []
+        for i in order:
+            entry = entries[i]
+            if entry["key"] == exclude_key:
+                continue
+            similarity = float(vectors[i].astype(np.float32) @ query)
+            results.append({**entry, "similarity": round(similarity, 4)})
+            if len(results) == k:
+                break
+        return {"method": method, "store_size": len(entries), "results": results}
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": int(self.vectors.nbytes),
+            "index": "ivf_pq" if self.index is not None else "brute_force",
+            "indexed": len(self.index) if self.index is not None else 0,
+        }
+
+
+_stores: dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """Store for the current model's embeddings, or None when disabled / no CNN."""
+    from app.services.cnn_service import model_version
+
+    settings = get_settings()
+    if not settings.EMBEDDING_STORE_ENABLED:
+        return None
+    version = model_version()
+    if version == "none":
+        return None
+    with _stores_lock:
+        if version not in _stores:
+            directory = os.path.join(settings.EMBEDDING_DIR, version) if settings.EMBEDDING_DIR else None
+            _stores[version] = EmbeddingStore(
+                directory, settings.EMBEDDING_ANN_THRESHOLD, settings.EMBEDDING_NPROBE,
+            )
+        return _stores[version]
+
+
+def record_embedding(key: str, embedding: Optional[np.ndarray], **metadata) -> Optional[int]:
+    """Add an analysis' embedding to the store; never fails the analysis itself."""
+    if embedding is None:
+        return None
+    try:
+        store = get_embedding_store()
+        return store.add(key, embedding, **metadata) if store is not None else None
+    except Exception as e:
+        logger.warning(f"Could not store embedding: {e}")
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+def _require_store() -> EmbeddingStore:
+    from fastapi import HTTPException
+
+    store = get_embedding_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Similar-scene search needs the CNN model and EMBEDDING_STORE_ENABLED")
+    return store
+
+
+def find_similar(contents: bytes, filename: str, k: int = 10) -> dict:
+    """
+    Embed an image (RGB upload, or a GeoTIFF's stretched RGB thumbnail) and
+    return the k most similar stored analyses. The query is not stored.
+    """
+    from fastapi import HTTPException
+    from app.services.cnn_service import predict_from_array
+    from app.services.landuse_map_service import scene_rgb
+    from app.utils.image_utils import decode_rgb
+    from app.utils.raster_utils import open_geotiff_bytes
+
+    store = _require_store()
+    try:
+        if filename.lower().endswith((".tif", ".tiff")):
+            with open_geotiff_bytes(contents) as src:
+                pixels = scene_rgb(src)
+        else:
+            pixels = decode_rgb(contents).pixels
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image file: {e}")
+
+    cnn_result = predict_from_array(pixels)
+    if cnn_result is None or cnn_result.get("embedding") is None:
+        raise HTTPException(status_code=503, detail="CNN inference failed")
+    return {
+        "query": {"filename": filename, "cnn_class": cnn_result["cnn_class"]},
+        **store.search(cnn_result["embedding"], k, exclude_key=content_key(contents)),
+    }
+
+
+def find_similar_to_entry(entry_id: int, k: int = 10) -> dict:
+    """The k most similar stored analyses to a stored one."""
+    from fastapi import HTTPException
+
+    store = _require_store()
+    store.refresh()
+    if not 0 <= entry_id < len(store):
+        raise HTTPException(status_code=404, detail=f"No stored scene with id {entry_id}")
+    entry = store.entries[entry_id]
+    return {"query": entry, **store.search(store.vector(entry_id), k, exclude_key=entry["key"])}
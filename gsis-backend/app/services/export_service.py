@@ -0,0 +1,270 @@
+"""
+Export Service — Streamed Cloud-Optimized GeoTIFF export of index rasters.
+
+Index blocks are quantized to int16 (value x 10000; band scale 1e-4,
+nodata -32768) and written as they are computed, by a BlockVisitor riding
+the same streaming pass as the statistics — an export never recomputes
+the indices and never holds a full index raster in memory.
+
+The staging GeoTIFF uses the pass's own window layout as its block layout,
+so every write fills whole blocks that are compressed exactly once. Staging
+and partial files carry a per-exporter pid/uuid suffix, so concurrent exports
+into the same directory (region COGs from several workers) never share or
+delete each other's files; the finished COG replaces the old one atomically.
+
+Pipeline:
+  Streaming pass: block → quantize (int16) → staging GTiff block write
+  Finish: internal overviews (average) → COG driver copy (512px tiles,
+          DEFLATE) → atomic rename into place
+"""
+
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Iterable
+
+import numpy as np
+
+from app.services.index_service import IndexWorkspace
+from app.services.raster_stream_service import BlockVisitor, read_grid, window_shape
+from app.core.config import get_settings
+
+try:
+    import rasterio
+    import rasterio.shutil
+    from rasterio.enums import Resampling
+    from rasterio.windows import Window
+    HAS_RASTERIO = True
+except ImportError:
+    HAS_RASTERIO = False
+
+EXPORT_SCALE = 10000
+EXPORT_NODATA = -32768
+COG_BLOCKSIZE = 512
+EXPORT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Region COGs replaced by this process, per index (tile_service cache key)
+_region_layer_generations: dict[str, int] = {}
+_region_layer_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Paths
+# ---------------------------------------------------------------------------
+
+def new_export_dir() -> tuple[str, str]:
+    """Create a fresh per-request export directory; returns (export_id, path)."""
+    export_id = uuid.uuid4().hex
+    path = os.path.join(get_settings().EXPORT_DIR, export_id)
+    os.makedirs(path, exist_ok=True)
+    return export_id, path
+
+
+def sweep_expired_exports() -> int:
+    """
+    Delete per-request export directories older than EXPORT_RETENTION_HOURS,
+    and staging / partial files left behind by crashed region exports.
+    Returns the number of paths removed.
+    """
+    settings = get_settings()
+    if settings.EXPORT_RETENTION_HOURS <= 0 or not os.path.isdir(settings.EXPORT_DIR):
+        return 0
+    cutoff = time.time() - settings.EXPORT_RETENTION_HOURS * 3600
+    removed = 0
+    for entry in os.scandir(settings.EXPORT_DIR):
+        if entry.is_dir() and EXPORT_ID_PATTERN.match(entry.name) and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    regions_dir = os.path.join(settings.EXPORT_DIR, "regions")
+    if os.path.isdir(regions_dir):
+        for region in os.scandir(regions_dir):
+            if not region.is_dir():
+                continue
+            for entry in os.scandir(region.path):
+                if (entry.name.endswith((".staging.tif", ".tif.part"))
+                        and entry.stat().st_mtime < cutoff):
+                    os.unlink(entry.path)
+                    removed += 1
+    return removed
+
+
+def export_url(export_id: str, index_name: str) -> str:
+    """Download path of an exported index COG (see routers/exports.py)."""
+    return f"/exports/{export_id}/{index_name}.tif"
+
+
+def region_slug(region_name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", region_name.lower()).strip("-")
+
+
+def region_export_dir(region_name: str) -> str:
+    """Directory holding the latest index COGs of a monitored region."""
+    path = os.path.join(get_settings().EXPORT_DIR, "regions", region_slug(region_name))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def region_export_url(region_name: str, index_name: str) -> str:
+    return f"/exports/regions/{region_slug(region_name)}/{index_name}.tif"
+
+
+def region_layer_generation(index_name: str) -> int:
+    """How many times this process has replaced a region COG of `index_name`."""
+    with _region_layer_lock:
+        return _region_layer_generations.get(index_name, 0)
+
+
+def _bump_region_layer(index_name: str) -> None:
+    with _region_layer_lock:
+        _region_layer_generations[index_name] = _region_layer_generations.get(index_name, 0) + 1
+
+
+def overview_factors(width: int, height: int, blocksize: int = COG_BLOCKSIZE) -> list[int]:
+    """Power-of-two decimations until the coarsest level fits in one tile."""
+    factors = []
+    size = max(width, height)
+    while size > blocksize:
+        factors.append(2 ** (len(factors) + 1))
+        size = math.ceil(size / 2)
+    return factors
+
+
+# ---------------------------------------------------------------------------
+# Streaming writer
+# ---------------------------------------------------------------------------
+
+class IndexRasterExporter(BlockVisitor):
+    """
+    Writes each block's index arrays into one int16 GeoTIFF per index.
+
+    Parallel passes share the one writer (fork() returns self); writes are
+    serialized by a lock since GDAL dataset handles are not thread-safe.
+    Use as a context manager: COGs are finalized on a clean exit and all
+    partial output is removed on error.
+    """
+
+    def __init__(self, src, indices: Iterable[str], out_dir: str, decimation: int = 1):
+        self.indices = tuple(indices)
+        self.out_dir = out_dir
+        self.transform, (self.height, self.width) = read_grid(src, decimation)
+        self.paths: dict[str, str] = {}
+        self._token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._datasets = {}
+
+        profile = {
+            "driver": "GTiff",
+            "dtype": "int16",
+            "count": 1,
+            "width": self.width,
+            "height": self.height,
+            "crs": src.crs,
+            "transform": self.transform,
+            "nodata": EXPORT_NODATA,
+            "compress": "deflate",
+            "zlevel": 1,
+            "predictor": 2,
+            "BIGTIFF": "IF_SAFER",
+            **self._staging_layout(src, decimation),
+        }
+        for name in self.indices:
+            dst = rasterio.open(self._staging_path(name), "w", **profile)
+            dst.scales = (1 / EXPORT_SCALE,)
+            dst.offsets = (0.0,)
+            dst.set_band_description(1, name)
+            self._datasets[name] = dst
+
+    def _staging_layout(self, src, decimation: int) -> dict:
+        """Block layout matching the windows the streaming pass will write."""
+        if decimation > 1:
+            return {"tiled": True, "blockxsize": COG_BLOCKSIZE, "blockysize": COG_BLOCKSIZE}
+        rows, cols = window_shape(src)
+        if cols >= self.width:
+            return {"tiled": False, "blockysize": rows}
+        if rows % 16 == 0 and cols % 16 == 0:
+            return {"tiled": True, "blockxsize": cols, "blockysize": rows}
+        return {"tiled": True, "blockxsize": COG_BLOCKSIZE, "blockysize": COG_BLOCKSIZE}
+
+    def _staging_path(self, name: str) -> str:
+        return os.path.join(self.out_dir, f".{name}.{self._token}.staging.tif")
+
+    def _partial_path(self, name: str) -> str:
+        return os.path.join(self.out_dir, f".{name}.{self._token}.tif.part")
+
+    def visit(self, transform, values: dict[str, np.ndarray], ws: IndexWorkspace) -> None:
+        shape = next(iter(values.values())).shape
+        col, row = ~self.transform * (transform.c, transform.f)
+        window = Window(round(col), round(row), shape[1], shape[0])
+
+        scaled = ws.get("export_scaled", shape)
+        invalid = ws.get("export_invalid", shape, np.bool_)
+        quantized = ws.get("export_int16", shape, np.int16)
+        for name in self.indices:
+            np.isfinite(values[name], out=invalid)
+            np.logical_not(invalid, out=invalid)
+            np.multiply(values[name], EXPORT_SCALE, out=scaled)
+            np.rint(scaled, out=scaled)
+            np.clip(scaled, -32767, 32767, out=scaled)
+            np.copyto(scaled, EXPORT_NODATA, where=invalid)
+            quantized[...] = scaled
+            with self._lock:
+                self._datasets[name].write(quantized, 1, window=window)
+
+    def fork(self) -> "IndexRasterExporter":
+        return self
+
+    def merge(self, other: "IndexRasterExporter") -> None:
+        pass
+
+    def finish(self) -> dict[str, str]:
+        """Build overviews, lay each raster out as a COG; returns {index: path}."""
+        factors = overview_factors(self.width, self.height)
+        regions_dir = os.path.abspath(os.path.join(get_settings().EXPORT_DIR, "regions"))
+        is_region = os.path.dirname(os.path.abspath(self.out_dir)) == regions_dir
+        for name in self.indices:
+            dst = self._datasets.pop(name)
+            if factors:
+                dst.build_overviews(factors, Resampling.average)
+            dst.close()
+
+            staging = self._staging_path(name)
+            final = os.path.join(self.out_dir, f"{name}.tif")
+            partial = self._partial_path(name)
+            rasterio.shutil.copy(
+                staging, partial, driver="COG",
+                COMPRESS="DEFLATE", PREDICTOR="YES", BLOCKSIZE=COG_BLOCKSIZE,
+                OVERVIEWS="FORCE_USE_EXISTING", BIGTIFF="IF_SAFER",
+            )
+            os.replace(partial, final)
+            os.unlink(staging)
+            if is_region:
+                _bump_region_layer(name)
+            self.paths[name] = final
+        return self.paths
+
+    def abort(self) -> None:
+        """Close and delete any staging / partial output."""
+        for dst in self._datasets.values():
+            dst.close()
+        self._datasets.clear()
+        for name in self.indices:
+            for path in (self._staging_path(name), self._partial_path(name)):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def __enter__(self) -> "IndexRasterExporter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+            return
+        try:
+            self.finish()
+        except Exception:
+            self.abort()
+            raise
@@ -0,0 +1,298 @@
+"""
+Index Service — Fused float32 spectral-index kernels and index registry.
+
+All kernels run in float32 and write into caller-supplied `out=` buffers,
+so a block pass allocates nothing once its workspace is warm:
+
+  normalized_difference(a, b) = (a - b) / (a + b + 1e-10)
+
+Spectral indices are declared once in INDEX_REGISTRY and evaluated
+together per block through a BlockContext, which memoizes shared
+intermediates (band sums / differences) so e.g. NDVI, SAVI and EVI
+compute NIR - Red only once.
+
+Registered indices:
+  ndvi   (NIR - Red) / (NIR + Red)
+  ndwi   (Green - NIR) / (Green + NIR)
+  evi    2.5 (NIR - Red) / (NIR + 6 Red - 7.5 Blue + 1)
+  savi   1.5 (NIR - Red) / (NIR + Red + 0.5)
+  nbr    (NIR - SWIR2) / (NIR + SWIR2)
+  ndbi   (SWIR1 - NIR) / (SWIR1 + NIR)
+  mndwi  (Green - SWIR1) / (Green + SWIR1)
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+import numpy as np
+
+EPSILON = np.float32(1e-10)
+# EVI is undefined where |denominator| < this fraction of reflectance 1.0
+EVI_DENOMINATOR_EPSILON = 1e-3
+
+
+# ---------------------------------------------------------------------------
+# Reusable buffers
+# ---------------------------------------------------------------------------
+
+class IndexWorkspace:
+    """
+    Named, grow-only scratch buffers reused across blocks and requests.
+
+    get() returns a view of the requested shape over a flat backing buffer,
+    so smaller edge blocks reuse the same memory as full blocks.
+    """
+
+    def __init__(self):
+        self._buffers: dict[tuple[str, str], np.ndarray] = {}
+
+    def get(self, name: str, shape: tuple[int, ...], dtype=np.float32) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        key = (name, dtype.str)
+        buf = self._buffers.get(key)
+        if buf is None or buf.size < size:
+            buf = np.empty(size, dtype=dtype)
+            self._buffers[key] = buf
+        return buf[:size].reshape(shape)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self._buffers.values())
+
+
+_local = threading.local()
+
+
+def get_workspace() -> IndexWorkspace:
+    """Return this thread's workspace (created on first use)."""
+    ws = getattr(_local, "workspace", None)
+    if ws is None:
+        ws = _local.workspace = IndexWorkspace()
+    return ws
+
+
+# ---------------------------------------------------------------------------
+# Kernels
+# ---------------------------------------------------------------------------
+
+def normalized_difference(
+    a: np.ndarray,
+    b: np.ndarray,
+    out: np.ndarray | None = None,
+    scratch: np.ndarray | None = None,
+) -> np.ndarray:
+    """Compute (a - b) / (a + b + eps) in float32 into `out`."""
+    if out is None:
+        out = np.empty(a.shape, dtype=np.float32)
+    if scratch is None:
+        scratch = np.empty(a.shape, dtype=np.float32)
+    np.add(a, b, out=scratch, casting="same_kind")
+    scratch += EPSILON
+    np.subtract(a, b, out=out, casting="same_kind")
+    np.divide(out, scratch, out=out)
+    return out
+
+
+def finite_values(values: np.ndarray, workspace: IndexWorkspace | None = None) -> np.ndarray:
+    """Return the finite values of a block as a flat array (a view when all are finite)."""
+    ws = workspace or get_workspace()
+    values = values.reshape(-1)
+    finite = np.isfinite(values, out=ws.get("finite", values.shape, np.bool_))
+    if not finite.all():
+        values = values[finite]
+    return values
+
+
+def block_moments(
+    values: np.ndarray,
+    workspace: IndexWorkspace | None = None,
+    assume_finite: bool = False,
+) -> tuple[int, float, float, float, float]:
+    """
+    Return (count, mean, m2, min, max) of the finite values in a block.
+
+    Sums accumulate in float64 without materializing float64 copies;
+    the centered squares reuse a float32 workspace buffer.
+    """
+    ws = workspace or get_workspace()
+    values = values.reshape(-1) if assume_finite else finite_values(values, ws)
+    n = values.size
+    if n == 0:
+        return 0, 0.0, 0.0, 0.0, 0.0
+
+    mean = float(values.mean(dtype=np.float64))
+    centered = ws.get("centered", values.shape)
+    np.subtract(values, mean, out=centered, casting="same_kind")
+    np.square(centered, out=centered)
+    m2 = float(centered.sum(dtype=np.float64))
+    return n, mean, m2, float(values.min()), float(values.max())
+
+
+# ---------------------------------------------------------------------------
+# Per-block evaluation context
+# ---------------------------------------------------------------------------
+
+class BlockContext:
+    """
+    Band arrays for one block plus memoized shared intermediates.
+
+    `scale` is the DN value of reflectance 1.0; constant terms in EVI/SAVI
+    are multiplied by it so bands never need converting to reflectance.
+    """
+
+    def __init__(self, bands: dict[str, np.ndarray], workspace: IndexWorkspace, scale: float = 1.0):
+        self.bands = bands
+        self.ws = workspace
+        self.scale = scale
+        self.shape = next(iter(bands.values())).shape
+        self._cache: dict[tuple[str, str, str], np.ndarray] = {}
+
+    def band(self, role: str) -> np.ndarray:
+        return self.bands[role]
+
+    def padded_sum(self, a: str, b: str) -> np.ndarray:
+        """a + b + eps (shared denominator of normalized differences)."""
+        a, b = sorted((a, b))
+        key = ("sum", a, b)
+        if key not in self._cache:
+            out = self.ws.get(f"sum:{a}:{b}", self.shape)
+            np.add(self.bands[a], self.bands[b], out=out)
+            out += EPSILON
+            self._cache[key] = out
+        return self._cache[key]
+
+    def diff(self, a: str, b: str) -> np.ndarray:
+        """a - b."""
+        key = ("diff", a, b)
+        if key not in self._cache:
+            out = self.ws.get(f"diff:{a}:{b}", self.shape)
+            np.subtract(self.bands[a], self.bands[b], out=out)
+            self._cache[key] = out
+        return self._cache[key]
+
+    def normalized_difference(self, a: str, b: str, out: np.ndarray) -> np.ndarray:
+        return np.divide(self.diff(a, b), self.padded_sum(a, b), out=out)
+
+    def scratch(self) -> np.ndarray:
+        return self.ws.get("scratch", self.shape)
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class SpectralIndex:
+    name: str
+    bands: tuple[str, ...]
+    description: str
+    compute: Callable[[BlockContext, np.ndarray], np.ndarray]
+
+
+INDEX_REGISTRY: dict[str, SpectralIndex] = {}
+
+
+def register_index(name: str, bands: tuple[str, ...], description: str):
+    """Decorator registering `fn(ctx, out) -> out` as a spectral index."""
+    def decorator(fn):
+        INDEX_REGISTRY[name] = SpectralIndex(name, bands, description, fn)
+        return fn
+    return decorator
+
+
+@register_index("ndvi", ("nir", "red"), "Normalized Difference Vegetation Index")
+def _ndvi(ctx: BlockContext, out: np.ndarray) -> np.ndarray:
+    return ctx.normalized_difference("nir", "red", out)
+
+
+@register_index("ndwi", ("green", "nir"), "Normalized Difference Water Index")
+def _ndwi(ctx: BlockContext, out: np.ndarray) -> np.ndarray:
+    return ctx.normalized_difference("green", "nir", out)
+
+
+@register_index("evi", ("nir", "red", "blue"), "Enhanced Vegetation Index")
+def _evi(ctx: BlockContext, out: np.ndarray) -> np.ndarray:
+    scratch = ctx.scratch()
+    np.multiply(ctx.band("red"), 6.0, out=out)
+    out += ctx.band("nir")
+    np.multiply(ctx.band("blue"), 7.5, out=scratch)
+    out -= scratch
+    out += ctx.scale
+    # The denominator can reach zero on dark / shadowed pixels: those are
+    # undefined (NaN, dropped by the reducers), not clipped to ±1
+    undefined = ctx.ws.get("evi_undefined", ctx.shape, np.bool_)
+    np.less(np.abs(out, out=scratch), EVI_DENOMINATOR_EPSILON * ctx.scale, out=undefined)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(ctx.diff("nir", "red"), out, out=out)
+    out *= 2.5
+    out[undefined] = np.nan
+    return out
+
+
+@register_index("savi", ("nir", "red"), "Soil Adjusted Vegetation Index (L=0.5)")
+def _savi(ctx: BlockContext, out: np.ndarray) -> np.ndarray:
+    np.add(ctx.padded_sum("nir", "red"), 0.5 * ctx.scale, out=out)
+    np.divide(ctx.diff("nir", "red"), out, out=out)
+    out *= 1.5
+    return out
+
+
+@register_index("nbr", ("nir", "swir2"), "Normalized Burn Ratio")
+def _nbr(ctx: BlockContext, out: np.ndarray) -> np.ndarray:
+    return ctx.normalized_difference("nir", "swir2", out)
+
+
+@register_index("ndbi", ("swir1", "nir"), "Normalized Difference Built-up Index")
+def _ndbi(ctx: BlockContext, out: np.ndarray) -> np.ndarray:
+    return ctx.normalized_difference("swir1", "nir", out)
+
+
+@register_index("mndwi", ("green", "swir1"), "Modified Normalized Difference Water Index")
+def _mndwi(ctx: BlockContext, out: np.ndarray) -> np.ndarray:
+    return ctx.normalized_difference("green", "swir1", out)
+
+
+def split_available(index_names: Iterable[str], band_roles: Iterable[str]) -> tuple[list[str], list[str]]:
+    """Split indices into (computable, unavailable) for the given band roles."""
+    roles = set(band_roles)
+    available, unavailable = [], []
+    for name in index_names:
+        (available if set(INDEX_REGISTRY[name].bands) <= roles else unavailable).append(name)
+    return available, unavailable
+
+
+def required_bands(index_names: Iterable[str]) -> set[str]:
+    """Union of band roles needed by the given indices."""
+    return {band for name in index_names for band in INDEX_REGISTRY[name].bands}
+
+
+def compute_indices(
+    index_names: Iterable[str],
+    bands: dict[str, np.ndarray],
+    workspace: IndexWorkspace | None = None,
+    scale: float = 1.0,
+) -> dict[str, np.ndarray]:
+    """
+    Evaluate several indices over one block in a single pass.
+
+    Returns {name: float32 array}; arrays are workspace views that are
+    overwritten by the next call on the same workspace.
+    """
+    ws = workspace or get_workspace()
+    ctx = BlockContext(bands, ws, scale)
+    return {
+        name: INDEX_REGISTRY[name].compute(ctx, ws.get(f"index:{name}", ctx.shape))
+        for name in index_names
+    }
+
+
+def reflectance_scale(dtype) -> float:
+    """DN value corresponding to reflectance 1.0 for a raster dtype."""
+    dtype = np.dtype(dtype)
+    if dtype == np.uint8:
+        return 255.0
+    if np.issubdtype(dtype, np.integer):
+        return 10000.0
+    return 1.0
@@ -0,0 +1,250 @@
+"""
+Land-use Map Service — Sliding-window CNN classification of large GeoTIFFs.
+
+The scene is cut into overlapping square chips (64 px — EuroSAT's native
+chip size — or 224 px), each resized to the model input and classified by
+the land-use CNN in large batches. Every chip becomes one cell of a class
+map centred on the chip, and the cells give per-class area fractions.
+
+Chips are read one chip-row strip at a time (RGB bands only, nodata-aware,
+see raster_stream_service), so memory is bounded by a strip plus one batch
+and the scene is never decoded into a full RGB array. Scenes too large for
+LANDUSE_MAP_MAX_CHIPS non-overlapping chips are read decimated.
+
+Pipeline:
+  decimated preview → per-band 2–98 % stretch → uint8
+  strip window read → chips (valid ≥ LANDUSE_MIN_VALID_FRACTION)
+                    → 224x224 → CNN batch → class map + fractions
+"""
+
+import math
+import time
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from app.models.cnn_model import CLASSES
+from app.services.index_service import get_workspace
+from app.services.raster_stream_service import NodataPolicy, read_block, choose_decimation, read_grid
+from app.utils.image_utils import MODEL_INPUT_SIZE
+from app.utils.raster_utils import resolve_band_indexes
+from app.core.config import get_settings
+
+try:
+    from rasterio.windows import Window
+    from affine import Affine
+    HAS_RASTERIO = True
+except ImportError:
+    HAS_RASTERIO = False
+
+CHIP_SIZES = (64, 224)
+NO_DATA_CLASS = -1
+STRETCH_PERCENTILES = (2, 98)
+
+
+def chip_offsets(length: int, chip_size: int, stride: int) -> list[int]:
+    """Chip start offsets along one axis; the last chip is snapped to the edge."""
+    if length < chip_size:
+        return []
+    offsets = list(range(0, length - chip_size + 1, stride))
+    if offsets[-1] != length - chip_size:
+        offsets.append(length - chip_size)
+    return offsets
+
+
+def chip_grid(src, chip_size: int) -> tuple[int, int]:
+    """
+    (decimation, stride) of the chip grid. The stride gives
+    LANDUSE_CHIP_OVERLAP between neighbours and is widened when the scene
+    would otherwise need more than LANDUSE_MAP_MAX_CHIPS chips, but never
+    past chip_size (chips keep tiling the scene); beyond that the scene is
+    decimated, so each chip covers decimation x chip_size source pixels.
+    """
+    settings = get_settings()
+    stride = max(1, round(chip_size * (1 - settings.LANDUSE_CHIP_OVERLAP)))
+    decimation = 1
+
+    def chips() -> int:
+        height, width = math.ceil(src.height / decimation), math.ceil(src.width / decimation)
+        return len(chip_offsets(height, chip_size, stride)) * len(chip_offsets(width, chip_size, stride))
+
+    while chips() > settings.LANDUSE_MAP_MAX_CHIPS:
+        if stride < chip_size:
+            stride = min(chip_size, max(stride + 1, int(stride * 1.25)))
+        else:
+            decimation += 1
+    return decimation, stride
+
+
+def coverage_fraction(classified: np.ndarray, row_offsets: list[int], col_offsets: list[int],
+                      chip_size: int, shape: tuple[int, int]) -> float:
+    """Fraction of a (rows, cols) grid inside at least one classified chip."""
+    ys = np.unique(np.r_[row_offsets, np.add(row_offsets, chip_size)])
+    xs = np.unique(np.r_[col_offsets, np.add(col_offsets, chip_size)])
+    covered = np.zeros((len(ys) - 1, len(xs) - 1), dtype=np.bool_)
+    for i, j in zip(*np.nonzero(classified)):
+        r0, r1 = np.searchsorted(ys, (row_offsets[i], row_offsets[i] + chip_size))
+        c0, c1 = np.searchsorted(xs, (col_offsets[j], col_offsets[j] + chip_size))
+        covered[r0:r1, c0:c1] = True
+    area = np.outer(np.diff(ys), np.diff(xs))
+    return float(area[covered].sum()) / (shape[0] * shape[1])
+
+
+def _preview(src, read_order: list[int], policy: NodataPolicy) -> np.ndarray:
+    """Decimated (3, h, w) RGB read of the whole scene, NaN where invalid."""
+    _, shape = read_grid(src, choose_decimation(src))
+    preview, valid_count = read_block(src, read_order, None, shape, get_workspace(), policy)
+    if preview is None or valid_count == 0:
+        raise ValueError("Scene has no valid pixels")
+    return preview
+
+
+def rgb_stretch(src, read_order: list[int], policy: NodataPolicy,
+                preview: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Per-band (low, high) values mapped to 0 and 255.
+
+    8-bit rasters are used as is; anything else is stretched between the
+    2nd and 98th percentiles of a decimated preview of the valid pixels.
+    """
+    if all(src.dtypes[i - 1] == "uint8" for i in read_order):
+        return np.zeros(3, np.float32), np.full(3, 255, np.float32)
+
+    if preview is None:
+        preview = _preview(src, read_order, policy)
+    valid = preview[:, ~np.isnan(preview[0])]
+    low, high = np.percentile(valid, STRETCH_PERCENTILES, axis=1).astype(np.float32)
+    return low, np.maximum(high, low + 1)
+
+
+def _rgb_read_order(src) -> list[int]:
+    band_indexes = resolve_band_indexes(src.count)
+    if band_indexes is None:
+        raise ValueError(f"At least 3 bands required, got {src.count}")
+    return [band_indexes["red"], band_indexes["green"], band_indexes["blue"]]
+
+
+def scene_rgb(src, size: int = MODEL_INPUT_SIZE) -> np.ndarray:
+    """
+    Whole scene as a stretched (size, size, 3) uint8 RGB thumbnail — the
+    GeoTIFF counterpart of decode_rgb, read from a decimated preview.
+    """
+    read_order = _rgb_read_order(src)
+    policy = NodataPolicy(src, read_order)
+    preview = _preview(src, read_order, policy)
+    low, high = rgb_stretch(src, read_order, policy, preview)
+    image = Image.fromarray(_to_uint8(preview, low, high))
+    return np.asarray(image.resize((size, size), Image.BILINEAR))
+
+
+def _to_uint8(strip: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """(3, H, W) float strip → (H, W, 3) uint8 (NaN → 0)."""
+    scaled = (strip - low[:, None, None]) * (255 / (high - low))[:, None, None]
+    np.nan_to_num(scaled, copy=False)
+    np.clip(scaled, 0, 255, out=scaled)
+    return np.ascontiguousarray(scaled.astype(np.uint8).transpose(1, 2, 0))
+
+
+def _to_model_input(chip: np.ndarray) -> np.ndarray:
+    if chip.shape[0] == MODEL_INPUT_SIZE:
+        return chip
+    return np.asarray(Image.fromarray(chip).resize((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE), Image.BILINEAR))
+
+
+def map_dataset(src, chip_size: int = 64) -> dict:
+    """
+    Classify an open dataset chip by chip with the land-use CNN.
+
+    Returns the class map (rows x cols of indexes into "classes", -1 where a
+    chip has too little valid data), its geotransform (each cell is the
+    stride x stride square at its chip's centre), class area fractions (%),
+    mean confidence per class and the fraction of the scene covered by
+    classified chips.
+
+    Raises ValueError for unsupported chip sizes, scenes smaller than one
+    chip or without RGB bands, and RuntimeError when no CNN is available.
+    """
+    from app.services.cnn_service import predict_probabilities
+
+    if chip_size not in CHIP_SIZES:
+        raise ValueError(f"chip_size must be one of {CHIP_SIZES}")
+
+    settings = get_settings()
+    start = time.time()
+    read_order = _rgb_read_order(src)
+    policy = NodataPolicy(src, read_order)
+    decimation, stride = chip_grid(src, chip_size)
+    grid_transform, (height, width) = read_grid(src, decimation)
+    row_scale = src.height / height  # source rows per grid row
+    row_offsets = chip_offsets(height, chip_size, stride)
+    col_offsets = chip_offsets(width, chip_size, stride)
+    if not row_offsets or not col_offsets:
+        raise ValueError(f"Scene {src.width}x{src.height} is smaller than one {chip_size}px chip")
+
+    low, high = rgb_stretch(src, read_order, policy)
+    ws = get_workspace()
+    class_map = np.full((len(row_offsets), len(col_offsets)), NO_DATA_CLASS, dtype=np.int16)
+    confidence = np.zeros(class_map.shape, dtype=np.float32)
+    min_valid = settings.LANDUSE_MIN_VALID_FRACTION * chip_size * chip_size
+    batch: list[np.ndarray] = []
+    cells: list[tuple[int, int]] = []
+
+    def flush() -> None:
+        probabilities = predict_probabilities(np.stack(batch))
+        if probabilities is None:
+            raise RuntimeError("CNN model not available")
+        rows, cols = zip(*cells)
+        class_map[rows, cols] = probabilities.argmax(axis=1)
+        confidence[rows, cols] = probabilities.max(axis=1)
+        batch.clear()
+        cells.clear()
+
+    for i, row in enumerate(row_offsets):
+        window = Window(0, row * row_scale, src.width, chip_size * row_scale)
+        strip, valid_count = read_block(src, read_order, window, (chip_size, width), ws, policy)
+        if strip is None or valid_count < min_valid:
+            continue
+        valid_cols = np.cumsum(~np.isnan(strip[0]), axis=1).sum(axis=0)
+        pixels = _to_uint8(strip, low, high)
+        for j, col in enumerate(col_offsets):
+            left = valid_cols[col - 1] if col else 0
+            if valid_cols[col + chip_size - 1] - left < min_valid:
+                continue
+            batch.append(_to_model_input(pixels[:, col:col + chip_size]))
+            cells.append((i, j))
+            if len(batch) >= settings.LANDUSE_MAP_BATCH_SIZE:
+                flush()
+    if batch:
+        flush()
+
+    classified = class_map != NO_DATA_CLASS
+    chips = int(classified.sum())
+    counts = np.bincount(class_map[classified], minlength=len(CLASSES))
+    class_fractions, class_confidence = {}, {}
+    for k, name in enumerate(CLASSES):
+        if counts[k]:
+            class_fractions[name] = round(float(counts[k]) / chips * 100, 2)
+            class_confidence[name] = round(float(confidence[class_map == k].mean()), 4)
+
+    offset = (chip_size - stride) / 2
+    grid_transform = grid_transform * Affine.translation(offset, offset) * Affine.scale(stride)
+    elapsed = time.time() - start
+    return {
+        "classes": CLASSES,
+        "chip_size": chip_size,
+        "stride": stride,
+        "decimation": decimation,
+        "rows": len(row_offsets),
+        "cols": len(col_offsets),
+        "class_map": class_map.tolist(),
+        "transform": list(grid_transform)[:6],
+        "crs": str(src.crs) if src.crs else None,
+        "class_fractions": dict(sorted(class_fractions.items(), key=lambda kv: -kv[1])),
+        "class_confidence": class_confidence,
+        "chips_classified": chips,
+        "chips_skipped": class_map.size - chips,
+        "coverage_fraction": round(coverage_fraction(classified, row_offsets, col_offsets, chip_size,
+                                                     (height, width)), 4),
+        "chips_per_second": round(chips / elapsed, 1) if elapsed else None,
+    }
@@ -9,13 +9,21 @@ Range: -1 to +1
         < 0      → Water
 """
 
+import math
+
 import numpy as np
 
+from app.services.index_service import normalized_difference, block_moments
+
 
-def calculate_ndvi(nir: np.ndarray, red: np.ndarray) -> np.ndarray:
-    """Compute per-pixel NDVI from NIR and Red bands."""
-    denominator = nir + red + 1e-10
-    return (nir - red) / denominator
+def calculate_ndvi(
+    nir: np.ndarray,
+    red: np.ndarray,
+    out: np.ndarray | None = None,
+    scratch: np.ndarray | None = None,
+) -> np.ndarray:
+    """Compute per-pixel float32 NDVI from NIR and Red bands (optionally into `out`)."""
+    return normalized_difference(nir, red, out=out, scratch=scratch)
 
 
 def calculate_ndvi_rgb(green: np.ndarray, red: np.ndarray) -> np.ndarray:
@@ -25,31 +33,60 @@ def calculate_ndvi_rgb(green: np.ndarray, red: np.ndarray) -> np.ndarray:
     return np.where(valid, (green - red) / denominator, 0.0)
 
 
+# (lower bound, class, vegetation status), highest first; a value belongs to
+# the first row whose lower bound it strictly exceeds.
+NDVI_CLASSES = [
+    (0.6, "Dense Forest", "Thriving dense vegetation"),
+    (0.4, "Forest", "Healthy vegetation cover"),
+    (0.3, "Vegetation / Crops", "Moderate vegetation — likely agricultural"),
+    (0.2, "Sparse Vegetation", "Sparse or stressed vegetation"),
+    (0.05, "Bare Soil", "Minimal vegetation — bare ground"),
+    (-0.05, "Barren Land", "No significant vegetation"),
+    (-np.inf, "Water / Non-Vegetation", "Water body or non-vegetated surface"),
+]
+
+# Ascending edges / names for vectorized per-pixel lookup
+NDVI_CLASS_EDGES = np.array([lower for lower, _, _ in reversed(NDVI_CLASSES[:-1])])
+NDVI_CLASS_NAMES = [name for _, name, _ in reversed(NDVI_CLASSES)]
+
+
 def classify_ndvi(ndvi_mean: float) -> tuple[str, str]:
     """Return (predicted_class, vegetation_status) from NDVI value."""
-    if ndvi_mean > 0.6:
-        return "Dense Forest", "Thriving dense vegetation"
-    elif ndvi_mean > 0.4:
-        return "Forest", "Healthy vegetation cover"
-    elif ndvi_mean > 0.3:
-        return "Vegetation / Crops", "Moderate vegetation — likely agricultural"
-    elif ndvi_mean > 0.2:
-        return "Sparse Vegetation", "Sparse or stressed vegetation"
-    elif ndvi_mean > 0.05:
-        return "Bare Soil", "Minimal vegetation — bare ground"
-    elif ndvi_mean > -0.05:
-        return "Barren Land", "No significant vegetation"
-    else:
-        return "Water / Non-Vegetation", "Water body or non-vegetated surface"
+    for lower, name, status in NDVI_CLASSES:
+        if ndvi_mean > lower:
+            return name, status
+    return NDVI_CLASSES[-1][1], NDVI_CLASSES[-1][2]
+
+
+def classify_ndvi_pixels(ndvi: np.ndarray) -> np.ndarray:
+    """
+    Per-pixel class index into NDVI_CLASS_NAMES (same thresholds as
+    classify_ndvi). Expects finite values; NaN would land in the top class.
+    """
+    # side="left" counts edges strictly below each value, i.e. "> threshold"
+    return np.searchsorted(NDVI_CLASS_EDGES, ndvi, side="left").astype(np.uint8)
+
+
+def compute_class_fractions(class_counts: np.ndarray) -> dict[str, float]:
+    """Class pixel counts → {class name: % of classified pixels}, largest first."""
+    total = int(class_counts.sum())
+    if total == 0:
+        return {}
+    fractions = {
+        NDVI_CLASS_NAMES[i]: round(float(count) / total * 100, 1)
+        for i, count in enumerate(class_counts)
+    }
+    return dict(sorted(fractions.items(), key=lambda x: -x[1]))
 
 
 def compute_ndvi_stats(ndvi: np.ndarray) -> dict:
-    """Return mean, min, max, std of NDVI array."""
+    """Return mean, min, max, std of NDVI array (non-finite ignored, float64 accumulation)."""
+    count, mean, m2, vmin, vmax = block_moments(ndvi)
     return {
-        "ndvi_mean": round(float(np.nanmean(ndvi)), 4),
-        "ndvi_min": round(float(np.nanmin(ndvi)), 4),
-        "ndvi_max": round(float(np.nanmax(ndvi)), 4),
-        "ndvi_std": round(float(np.nanstd(ndvi)), 4),
+        "ndvi_mean": round(mean, 4),
+        "ndvi_min": round(vmin, 4),
+        "ndvi_max": round(vmax, 4),
+        "ndvi_std": round(math.sqrt(m2 / count) if count else 0.0, 4),
     }
 
 
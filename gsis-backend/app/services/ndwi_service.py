@@ -12,11 +12,17 @@ Range: -1 to +1
 
 import numpy as np
 
+from app.services.index_service import normalized_difference
 
-def calculate_ndwi(green: np.ndarray, nir: np.ndarray) -> np.ndarray:
-    """Compute per-pixel NDWI from Green and NIR bands (satellite)."""
-    denominator = green + nir + 1e-10
-    return (green - nir) / denominator
+
+def calculate_ndwi(
+    green: np.ndarray,
+    nir: np.ndarray,
+    out: np.ndarray | None = None,
+    scratch: np.ndarray | None = None,
+) -> np.ndarray:
+    """Compute per-pixel float32 NDWI from Green and NIR bands (optionally into `out`)."""
+    return normalized_difference(green, nir, out=out, scratch=scratch)
 
 
 def calculate_ndwi_rgb(green: np.ndarray, blue: np.ndarray) -> np.ndarray:
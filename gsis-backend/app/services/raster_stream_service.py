@@ -0,0 +1,582 @@
+"""
+Raster Stream Service — Bounded-memory block-windowed index computation.
+
+Walks a GeoTIFF's native block windows, evaluates the requested spectral
+indices (NDVI/NDWI by default, see index_service.INDEX_REGISTRY) per block
+in a single pass and folds the results into running accumulators
+(moments and fixed-bin histograms). Peak memory depends on the block
+size, not the scene size, so full Sentinel-2 scenes (10980x10980) can be
+analyzed without loading whole bands.
+
+Pipeline:
+  Block window → Read bands (float32) → compute_indices
+               → RunningStats / RunningHistogram.update → StreamResult
+
+Bands, indices and reduction temporaries all live in a reusable
+IndexWorkspace, so steady-state streaming does no per-block allocation.
+
+A decimation factor > 1 switches to a single reduced-resolution read
+(served from internal overviews when the factor matches one) for fast
+approximate previews.
+
+Nodata handling: pixels matching the dataset nodata value, masked by a
+per-dataset mask / alpha band, or (ZERO_FILL_AS_NODATA) zero in every band
+are excluded from all statistics. Blocks known to be empty — sparse
+GeoTIFF blocks that were never written, or blocks whose dataset mask is
+all zero — are skipped without reading band data.
+
+Extensions: callers may pass BlockVisitor objects that see every block's
+index arrays (with its geotransform) in the same pass — e.g. zonal
+statistics — instead of re-reading the raster.
+
+Parallelism: with STREAM_WORKERS > 1, windows are pulled from a shared
+queue by a thread pool. Each worker opens its own dataset handle and uses
+its own thread-local workspace (rasterio/GDAL reads and NumPy kernels
+release the GIL), and per-worker partials are merged exactly at the end.
+"""
+
+import math
+import os
+import queue
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import numpy as np
+
+from app.services.index_service import (
+    IndexWorkspace, get_workspace, block_moments, finite_values,
+    compute_indices, required_bands, reflectance_scale,
+)
+from app.core.config import get_settings
+
+try:
+    import rasterio
+    from affine import Affine
+    from rasterio.enums import MaskFlags, Resampling
+    from rasterio.errors import RasterBlockError
+    from rasterio.windows import Window
+    HAS_RASTERIO = True
+except ImportError:
+    HAS_RASTERIO = False
+
+
+# ---------------------------------------------------------------------------
+# Running accumulators
+# ---------------------------------------------------------------------------
+
+class RunningStats:
+    """
+    Streaming mean / std / min / max accumulator.
+
+    Per-block moments are merged with Chan's parallel variance update, so
+    results match a single full-array pass up to float rounding.
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(
+        self,
+        values: np.ndarray,
+        workspace: IndexWorkspace | None = None,
+        assume_finite: bool = False,
+    ) -> None:
+        """Fold a block of values into the accumulator (NaN/inf are ignored)."""
+        n, mean, m2, vmin, vmax = block_moments(values, workspace, assume_finite)
+        if n:
+            self._combine(n, mean, m2, vmin, vmax)
+
+    def merge(self, other: "RunningStats") -> None:
+        """Merge another accumulator into this one."""
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, n: int, mean: float, m2: float, vmin: float, vmax: float) -> None:
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def mean_error_bound(self, z: float = 1.96) -> float:
+        """Approximate 95% bound on |sample mean - population mean|."""
+        return z * self.std / math.sqrt(self.count) if self.count else 0.0
+
+    def summary(self, prefix: str | None = None) -> dict:
+        """
+        Return rounded mean/min/max/std. With a prefix, keys are
+        {prefix}_mean etc., matching compute_ndvi_stats.
+        """
+        stats = {
+            "mean": round(self.mean, 4) if self.count else 0.0,
+            "min": round(self.min, 4) if self.count else 0.0,
+            "max": round(self.max, 4) if self.count else 0.0,
+            "std": round(self.std, 4),
+        }
+        if prefix is None:
+            return stats
+        return {f"{prefix}_{k}": v for k, v in stats.items()}
+
+
+class RunningHistogram:
+    """
+    Fixed-bin histogram over [lo, hi] accumulated block by block.
+
+    Percentiles are read off the cumulative counts with linear
+    interpolation inside the bin, so the full raster is never sorted.
+    Values outside the range are clamped into the edge bins.
+    """
+
+    PERCENTILES = (5, 25, 50, 75, 95)
+
+    def __init__(self, bins: int | None = None, lo: float = -1.0, hi: float = 1.0):
+        self.bins = bins or get_settings().INDEX_HISTOGRAM_BINS
+        self.lo = lo
+        self.hi = hi
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+
+    def update(
+        self,
+        values: np.ndarray,
+        workspace: IndexWorkspace | None = None,
+        assume_finite: bool = False,
+    ) -> None:
+        ws = workspace or get_workspace()
+        values = values.reshape(-1) if assume_finite else finite_values(values, ws)
+        if values.size == 0:
+            return
+        scaled = ws.get("hist_scaled", values.shape)
+        np.subtract(values, self.lo, out=scaled, casting="same_kind")
+        scaled *= self.bins / (self.hi - self.lo)
+        np.clip(scaled, 0, self.bins - 1, out=scaled)
+        idx = ws.get("hist_idx", values.shape, np.intp)
+        np.floor(scaled, out=scaled)
+        idx[...] = scaled
+        self.counts += np.bincount(idx, minlength=self.bins)
+
+    def merge(self, other: "RunningHistogram") -> None:
+        """Merge another histogram with the same bins into this one."""
+        self.counts += other.counts
+
+    @property
+    def edges(self) -> np.ndarray:
+        return np.linspace(self.lo, self.hi, self.bins + 1)
+
+    def percentile(self, q: float) -> float:
+        total = int(self.counts.sum())
+        if total == 0:
+            return 0.0
+        cumulative = np.cumsum(self.counts)
+        target = q / 100 * total
+        i = int(np.searchsorted(cumulative, target, side="left"))
+        i = min(i, self.bins - 1)
+        below = cumulative[i - 1] if i > 0 else 0
+        in_bin = self.counts[i]
+        frac = (target - below) / in_bin if in_bin else 0.0
+        width = (self.hi - self.lo) / self.bins
+        return float(self.lo + (i + frac) * width)
+
+    def percentiles(self) -> dict:
+        return {f"p{q}": round(self.percentile(q), 4) for q in self.PERCENTILES}
+
+    def summary(self) -> dict:
+        return {
+            "range": [self.lo, self.hi],
+            "bins": self.bins,
+            "counts": self.counts.tolist(),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Window iteration
+# ---------------------------------------------------------------------------
+
+def iter_block_windows(src, target_pixels: int | None = None) -> Iterator["Window"]:
+    """
+    Yield read windows aligned to the dataset's native block layout.
+
+    Tiled rasters yield their native tiles. Striped rasters (blocks spanning
+    the full width, often only a few rows tall) have consecutive strips
+    coalesced up to ~target_pixels so reads stay efficient.
+    """
+    if target_pixels is None:
+        target_pixels = get_settings().STREAM_BLOCK_PIXELS
+
+    block_h, block_w = src.block_shapes[0]
+    if block_w < src.width:
+        for _, window in src.block_windows(1):
+            yield window
+        return
+
+    rows = window_shape(src, target_pixels)[0]
+    for row_off in range(0, src.height, rows):
+        yield Window(0, row_off, src.width, min(rows, src.height - row_off))
+
+
+def window_shape(src, target_pixels: int | None = None) -> tuple[int, int]:
+    """(rows, cols) of a full window yielded by iter_block_windows."""
+    if target_pixels is None:
+        target_pixels = get_settings().STREAM_BLOCK_PIXELS
+
+    block_h, block_w = src.block_shapes[0]
+    if block_w < src.width:
+        return block_h, block_w
+    strips = max(1, target_pixels // max(src.width * block_h, 1))
+    return block_h * strips, src.width
+
+
+def choose_decimation(src, max_pixels: int | None = None) -> int:
+    """
+    Pick the smallest decimation factor that brings a band under max_pixels.
+
+    Snaps up to an internal overview level when one is available, so GDAL
+    serves the read straight from the overview instead of resampling.
+    """
+    if max_pixels is None:
+        max_pixels = get_settings().FAST_PREVIEW_MAX_PIXELS
+
+    total = src.width * src.height
+    if total <= max_pixels:
+        return 1
+    needed = math.ceil(math.sqrt(total / max_pixels))
+    for factor in sorted(src.overviews(1)):
+        if factor >= needed:
+            return factor
+    return needed
+
+
+def read_grid(src, decimation: int = 1) -> tuple["Affine", tuple[int, int]]:
+    """Transform and (rows, cols) of the pixel grid a pass at `decimation` covers."""
+    if decimation <= 1:
+        return src.transform, (src.height, src.width)
+    shape = (max(1, math.ceil(src.height / decimation)),
+             max(1, math.ceil(src.width / decimation)))
+    return _block_transform(src, None, shape), shape
+
+
+def _plan_reads(src, decimation: int = 1) -> Iterator[tuple["Window | None", tuple[int, int]]]:
+    """Yield (window, (rows, cols)) reads; window None means the whole decimated raster."""
+    if decimation > 1:
+        yield None, read_grid(src, decimation)[1]
+        return
+    for window in iter_block_windows(src):
+        yield window, (int(window.height), int(window.width))
+
+
+def _block_transform(src, window, shape: tuple[int, int]):
+    """Affine transform of a read (window None = whole raster at `shape`)."""
+    if window is not None:
+        return src.window_transform(window)
+    return src.transform * Affine.scale(src.width / shape[1], src.height / shape[0])
+
+
+class NodataPolicy:
+    """How invalid pixels are identified for one dataset."""
+
+    def __init__(self, src, read_order: list[int]):
+        flags = src.mask_flag_enums[read_order[0] - 1]
+        self.dataset_mask = MaskFlags.per_dataset in flags or MaskFlags.alpha in flags
+        self.nodata = src.nodata
+        self.zero_fill = (
+            self.nodata is None
+            and not self.dataset_mask
+            and get_settings().ZERO_FILL_AS_NODATA
+        )
+        self.sparse_check = src.driver == "GTiff"
+
+    def window_is_sparse(self, src, read_order: list[int], window) -> bool:
+        """True when every GeoTIFF block under the window was never written."""
+        if not self.sparse_check or window is None:
+            return False
+        block_h, block_w = src.block_shapes[0]
+        rows = range(int(window.row_off) // block_h,
+                     math.ceil((window.row_off + window.height) / block_h))
+        cols = range(int(window.col_off) // block_w,
+                     math.ceil((window.col_off + window.width) / block_w))
+        for bidx in read_order:
+            for i in rows:
+                for j in cols:
+                    try:
+                        if src.block_size(bidx, i, j) > 0:
+                            return False
+                    except RasterBlockError:
+                        continue  # no offset — sparse (unwritten) block
+        return True
+
+
+def read_block(src, read_order, window, shape, ws: IndexWorkspace, policy: NodataPolicy):
+    """
+    Read one block with invalid pixels set to NaN.
+
+    Returns (block, valid_count); block is None when the window was skipped
+    without reading band data.
+    """
+    if policy.window_is_sparse(src, read_order, window):
+        return None, 0
+
+    invalid = ws.get("invalid", shape, np.bool_)
+    if policy.dataset_mask:
+        mask = src.dataset_mask(window=window, out_shape=shape)
+        if not mask.any():
+            return None, 0
+        np.equal(mask, 0, out=invalid)
+    else:
+        invalid[...] = False
+
+    block = src.read(read_order, window=window, out=ws.get("bands", (len(read_order),) + shape),
+                     resampling=Resampling.nearest)
+
+    tmp = ws.get("invalid_tmp", shape, np.bool_)
+    if policy.nodata is not None:
+        for band in block:
+            if math.isnan(policy.nodata):
+                np.isnan(band, out=tmp)
+            else:
+                np.equal(band, policy.nodata, out=tmp)
+            invalid |= tmp
+    elif policy.zero_fill:
+        zero = ws.get("zero_fill", shape, np.bool_)
+        zero[...] = True
+        for band in block:
+            np.equal(band, 0, out=tmp)
+            zero &= tmp
+        invalid |= zero
+
+    n_invalid = int(np.count_nonzero(invalid))
+    if n_invalid:
+        np.copyto(block, np.float32(np.nan), where=invalid[np.newaxis])
+    return block, invalid.size - n_invalid
+
+
+# ---------------------------------------------------------------------------
+# Streaming engine
+# ---------------------------------------------------------------------------
+
+DEFAULT_INDICES = ("ndvi", "ndwi")
+
+
+class BlockVisitor(ABC):
+    """
+    Hook called with every processed block of a streaming pass.
+
+    visit() receives the block's index arrays (float32, NaN where invalid;
+    workspace views valid only during the call). For parallel passes each
+    worker gets fork() and partials are folded back with merge(). All three
+    are abstract, so an incomplete visitor fails when it is created rather
+    than mid-stream on a worker thread.
+    """
+
+    @abstractmethod
+    def visit(self, transform, values: dict[str, np.ndarray], ws: IndexWorkspace) -> None:
+        ...
+
+    @abstractmethod
+    def fork(self) -> "BlockVisitor":
+        ...
+
+    @abstractmethod
+    def merge(self, other: "BlockVisitor") -> None:
+        ...
+
+
+@dataclass
+class StreamResult:
+    """Everything accumulated in one streaming pass."""
+    stats: dict[str, RunningStats] = field(default_factory=dict)
+    histograms: dict[str, RunningHistogram] = field(default_factory=dict)
+    visitors: list[BlockVisitor] = field(default_factory=list)
+    total_pixels: int = 0
+    valid_pixels: int = 0
+    skipped_blocks: int = 0
+
+    @property
+    def valid_pixel_fraction(self) -> float:
+        return round(self.valid_pixels / self.total_pixels, 4) if self.total_pixels else 0.0
+
+    def merge(self, other: "StreamResult") -> None:
+        """Fold a partial result (same indices) into this one."""
+        for name, stats in other.stats.items():
+            self.stats[name].merge(stats)
+        for name, hist in other.histograms.items():
+            self.histograms[name].merge(hist)
+        for mine, theirs in zip(self.visitors, other.visitors):
+            mine.merge(theirs)
+        self.total_pixels += other.total_pixels
+        self.valid_pixels += other.valid_pixels
+        self.skipped_blocks += other.skipped_blocks
+
+    def distribution(self, name: str) -> dict:
+        """{name}_percentiles and {name}_histogram entries for a result dict."""
+        hist = self.histograms.get(name)
+        if hist is None:
+            return {}
+        return {
+            f"{name}_percentiles": hist.percentiles(),
+            f"{name}_histogram": hist.summary(),
+        }
+
+
+class _StreamJob:
+    """Per-call configuration shared by all workers of one streaming pass."""
+
+    def __init__(self, src, band_indexes, indices, histograms, visitors=()):
+        self.band_indexes = band_indexes
+        self.visitors = tuple(visitors)
+        self.indices = indices
+        self.histograms = tuple(name for name in histograms if name in indices)
+        self.roles = required_bands(indices)
+        self.read_order = sorted({band_indexes[role] for role in self.roles})
+        self.position = {idx: i for i, idx in enumerate(self.read_order)}
+        self.scale = reflectance_scale(src.dtypes[0])
+
+    def new_result(self, fork: bool = False) -> StreamResult:
+        return StreamResult(
+            stats={name: RunningStats() for name in self.indices},
+            histograms={name: RunningHistogram() for name in self.histograms},
+            visitors=[v.fork() for v in self.visitors] if fork else list(self.visitors),
+        )
+
+    def accumulate(self, src, reads, result: StreamResult) -> None:
+        """Read and reduce each (window, shape) in `reads` into `result`."""
+        ws = get_workspace()
+        policy = NodataPolicy(src, self.read_order)
+
+        for window, shape in reads:
+            result.total_pixels += shape[0] * shape[1]
+            block, n_valid = read_block(src, self.read_order, window, shape, ws, policy)
+            if block is None:
+                result.skipped_blocks += 1
+                continue
+            result.valid_pixels += n_valid
+            if n_valid == 0:
+                continue
+
+            bands = {role: block[self.position[self.band_indexes[role]]] for role in self.roles}
+            values_by_index = compute_indices(self.indices, bands, ws, self.scale)
+
+            if result.visitors:
+                transform = _block_transform(src, window, shape)
+                for visitor in result.visitors:
+                    visitor.visit(transform, values_by_index, ws)
+
+            for name, values in values_by_index.items():
+                values = finite_values(values, ws)
+                result.stats[name].update(values, ws, assume_finite=True)
+                if name in result.histograms:
+                    result.histograms[name].update(values, ws, assume_finite=True)
+
+
+# ---------------------------------------------------------------------------
+# Thread pool
+# ---------------------------------------------------------------------------
+
+_executor: ThreadPoolExecutor | None = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def stream_worker_count() -> int:
+    """
+    Configured block-worker threads. STREAM_WORKERS 0 splits the cores
+    between analysis-pool workers, each of which may stream a scene at once
+    (1 with the default all-core analysis pool), instead of cores² threads.
+    """
+    settings = get_settings()
+    if settings.STREAM_WORKERS:
+        return settings.STREAM_WORKERS
+    cores = os.cpu_count() or 1
+    return max(1, cores // (settings.ANALYSIS_WORKERS or cores))
+
+
+def _get_executor(workers: int) -> ThreadPoolExecutor:
+    """Shared pool, so thread-local workspaces survive across requests."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="raster-stream")
+            _executor_workers = workers
+        return _executor
+
+
+def _drain(work: "queue.SimpleQueue"):
+    while True:
+        try:
+            yield work.get_nowait()
+        except queue.Empty:
+            return
+
+
+def _parallel_worker(path: str, work: "queue.SimpleQueue", job: _StreamJob) -> StreamResult:
+    """Pull windows until the queue is empty, on a private dataset handle."""
+    result = job.new_result(fork=True)
+    with rasterio.open(path) as src:
+        job.accumulate(src, _drain(work), result)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def stream_index_stats(
+    src,
+    band_indexes: dict[str, int],
+    indices: tuple[str, ...] = DEFAULT_INDICES,
+    decimation: int = 1,
+    histograms: tuple[str, ...] = DEFAULT_INDICES,
+    workers: int | None = None,
+    visitors: tuple[BlockVisitor, ...] = (),
+) -> StreamResult:
+    """
+    Compute spectral indices over an open rasterio dataset block by block.
+
+    Args:
+        src: Open rasterio dataset.
+        band_indexes: 1-based band index per role (see resolve_band_indexes).
+        indices: Registered index names; all are evaluated in one pass.
+        decimation: Read every Nth pixel (see choose_decimation); 1 = full.
+        histograms: Indices that also get a fixed-bin histogram.
+        workers: Parallel block workers (default: stream_worker_count()).
+        visitors: BlockVisitors fed every block; merged results are the
+            same objects, returned in StreamResult.visitors.
+
+    Returns:
+        StreamResult with RunningStats per index, RunningHistogram per
+        histogrammed index and valid / skipped pixel bookkeeping.
+    """
+    job = _StreamJob(src, band_indexes, indices, histograms, visitors)
+    result = job.new_result()
+
+    reads = list(_plan_reads(src, decimation))
+    workers = min(workers or stream_worker_count(), len(reads))
+
+    if workers <= 1:
+        job.accumulate(src, reads, result)
+        return result
+
+    work: queue.SimpleQueue = queue.SimpleQueue()
+    for item in reads:
+        work.put(item)
+
+    executor = _get_executor(stream_worker_count())
+    futures = [executor.submit(_parallel_worker, src.name, work, job) for _ in range(workers)]
+    for future in futures:
+        result.merge(future.result())
+    return result
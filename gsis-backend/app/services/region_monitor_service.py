@@ -8,22 +8,24 @@ Supports dual mode:
 
 Orchestrates:
 1. Fetch Sentinel tile for each region (real or simulated)
-2. If real GeoTIFF: compute NDVI/NDWI from pixel data
+2. If real GeoTIFF: compute NDVI/NDWI from pixel data (optionally keeping
+   the index rasters as COGs, REGION_EXPORT_COGS)
 3. Compute risk level
 4. Detect NDVI drops and trigger alerts
 5. Update region stats and history
+6. Store the scene's CNN embedding for /similar (real GeoTIFFs)
 """
 
 import os
 import logging
 from datetime import datetime
 
-import numpy as np
-
 from app.services.sentinel_fetch_service import sentinel_service, MonitoredRegion
-from app.services.ndvi_service import calculate_ndvi, compute_ndvi_stats
-from app.services.ndwi_service import calculate_ndwi
+from app.services.raster_stream_service import stream_index_stats, DEFAULT_INDICES
 from app.services.flood_service import assess_flood_risk
+from app.services.export_service import IndexRasterExporter, region_export_dir, region_export_url
+from app.services.landuse_map_service import scene_rgb
+from app.services.embedding_service import record_embedding
 from app.core.database import alerts_store
 from app.core.config import get_settings
 
@@ -71,43 +73,73 @@ def _create_region_alert(region_name: str, title: str, severity: str, module: st
     return alert
 
 
-def _process_real_tiff(tiff_path: str) -> dict:
-    """Compute NDVI/NDWI from a real downloaded GeoTIFF."""
+def region_band_indexes(band_count: int) -> dict[str, int] | None:
+    """
+    Band roles of a fetched region tile. The layout is fixed by our own
+    evalscript, not guessed from the band count like uploads
+    (resolve_band_indexes would read a 3-band tile as RGB with Green as
+    NIR, making NDWI identically 0).
+    """
+    if band_count >= 4:
+        # Evalscript returns: B02(Blue), B03(Green), B04(Red), B08(NIR)
+        return {"blue": 1, "green": 2, "red": 3, "nir": 4}
+    if band_count >= 2:
+        # Minimal: Red + NIR (Red doubles as Green/Blue proxy)
+        return {"nir": 2, "red": 1, "green": 1, "blue": 1}
+    return None
+
+
+def _process_real_tiff(tiff_path: str, export_dir: str | None = None) -> dict:
+    """
+    Compute NDVI/NDWI from a real downloaded GeoTIFF. With `export_dir`,
+    the NDVI/NDWI rasters are written there as COGs in the same pass.
+    """
     with rasterio.open(tiff_path) as src:
         band_count = src.count
 
-        if band_count >= 4:
-            # Evalscript returns: B02(Blue), B03(Green), B04(Red), B08(NIR)
-            blue = src.read(1).astype(np.float64)
-            green = src.read(2).astype(np.float64)
-            red = src.read(3).astype(np.float64)
-            nir = src.read(4).astype(np.float64)
-        elif band_count >= 2:
-            # Minimal: Red + NIR
-            red = src.read(1).astype(np.float64)
-            nir = src.read(2).astype(np.float64)
-            green = red  # proxy
-            blue = red
-        else:
+        band_indexes = region_band_indexes(band_count)
+        if band_indexes is None:
             # Single band — can't compute indices
             return {"ndvi": 0.0, "ndwi": 0.0, "band_count": band_count}
 
-    # NDVI = (NIR - Red) / (NIR + Red)
-    ndvi = calculate_ndvi(nir, red)
-    ndvi_stats = compute_ndvi_stats(ndvi)
+        if export_dir:
+            with IndexRasterExporter(src, DEFAULT_INDICES, export_dir) as exporter:
+                stream = stream_index_stats(src, band_indexes, visitors=(exporter,))
+        else:
+            stream = stream_index_stats(src, band_indexes)
 
-    # NDWI = (Green - NIR) / (Green + NIR)
-    ndwi = calculate_ndwi(green, nir)
-    ndwi_mean = float(np.nanmean(ndwi))
+    ndvi_stats = stream.stats["ndvi"].summary("ndvi")
 
     return {
         "ndvi": ndvi_stats["ndvi_mean"],
-        "ndwi": round(ndwi_mean, 4),
+        "ndwi": stream.stats["ndwi"].summary()["mean"],
         "ndvi_stats": ndvi_stats,
+        "valid_pixel_fraction": stream.valid_pixel_fraction,
+        "distribution": {**stream.distribution("ndvi"), **stream.distribution("ndwi")},
         "band_count": band_count,
+        "exported": bool(export_dir),
     }
 
 
+def _record_scene_embedding(region: MonitoredRegion, tiff_path: str, tile_id: str) -> None:
+    """Keep the CNN embedding of a real region scene for /similar searches."""
+    from app.services.cnn_service import is_cnn_available, predict_from_array
+
+    if not get_settings().EMBEDDING_STORE_ENABLED or not is_cnn_available():
+        return
+    try:
+        with rasterio.open(tiff_path) as src:
+            pixels = scene_rgb(src)
+        cnn_result = predict_from_array(pixels)
+        if cnn_result:
+            record_embedding(
+                f"region:{region.name}:{tile_id}", cnn_result.get("embedding"), kind="region",
+                name=region.name, predicted_class=cnn_result["cnn_class"], tile_id=tile_id,
+            )
+    except Exception as e:
+        logger.warning(f"Could not embed scene of {region.name}: {e}")
+
+
 def process_region(region: MonitoredRegion) -> dict:
     """
     Process a single region:
@@ -120,14 +152,24 @@ def process_region(region: MonitoredRegion) -> dict:
     settings = get_settings()
     tile = sentinel_service.fetch_sentinel_tile(region)
 
-    # Get NDVI/NDWI values
+    # Get NDVI/NDWI values (histograms/percentiles only from real pixels)
+    prev = region_data.get(region.name, {})
+    distribution: dict = {}
+    valid_pixel_fraction = None
+    exports = prev.get("exports")
     if tile.mode == "real" and tile.tiff_path and HAS_RASTERIO:
         # REAL: Process the actual GeoTIFF
         try:
-            indices = _process_real_tiff(tile.tiff_path)
+            export_dir = region_export_dir(region.name) if settings.REGION_EXPORT_COGS else None
+            indices = _process_real_tiff(tile.tiff_path, export_dir)
             ndvi = indices["ndvi"]
             ndwi = indices["ndwi"]
+            distribution = indices.get("distribution", {})
+            valid_pixel_fraction = indices.get("valid_pixel_fraction")
+            if indices.get("exported"):
+                exports = {name: region_export_url(region.name, name) for name in DEFAULT_INDICES}
             logger.info(f"REAL satellite data: {region.name} NDVI={ndvi:.4f} NDWI={ndwi:.4f}")
+            _record_scene_embedding(region, tile.tiff_path, tile.tile_id)
         except Exception as e:
             logger.error(f"Failed to process real TIFF for {region.name}: {e}")
             ndvi = tile.ndvi_simulated or 0.0
@@ -145,7 +187,6 @@ def process_region(region: MonitoredRegion) -> dict:
     alerts_triggered = 0
 
     # Check previous NDVI for drop detection
-    prev = region_data.get(region.name, {})
     prev_ndvi = prev.get("average_ndvi")
 
     # NDVI drop alert
@@ -205,6 +246,9 @@ def process_region(region: MonitoredRegion) -> dict:
         "tile_id": tile.tile_id,
         "cloud_cover": tile.cloud_cover,
         "data_mode": tile.mode,
+        "valid_pixel_fraction": valid_pixel_fraction,
+        "exports": exports,
+        **distribution,
     }
 
     logger.info(f"[{tile.mode.upper()}] {region.name}: NDVI={ndvi:.4f} NDWI={ndwi:.4f} Risk={risk} Alerts={alerts_triggered}")
@@ -0,0 +1,155 @@
+"""
+Result Cache Service — Content-addressed cache of prediction results.
+
+Re-uploads of the same scene skip index computation and CNN inference.
+Results are keyed by a BLAKE2b hash of the upload bytes together with
+everything else that determines the output: file kind, requested indices,
+quality, CNN model version, RGB preprocessing version and APP_VERSION (so a
+deploy, retrained model or preprocessing change never serves stale
+results).
+
+Tiers:
+  memory  ByteLRUCache of JSON-encoded results (RESULT_CACHE_MEMORY_MB)
+  disk    optional SQLite store (RESULT_CACHE_DB) that survives restarts,
+          capped at RESULT_CACHE_DISK_MAX_ENTRIES (least recently used
+          rows are evicted); disk hits are promoted to memory
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.utils.cache_utils import ByteLRUCache
+from app.core.config import get_settings
+
+logger = logging.getLogger("result_cache")
+
+
+def result_cache_key(contents: bytes, *parts) -> str:
+    """Hex key from the upload bytes plus any result-determining parameters."""
+    digest = hashlib.blake2b(contents, digest_size=16)
+    digest.update(json.dumps(parts, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class DiskResultStore:
+    """SQLite key/value tier with least-recently-used eviction."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_access)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, last_access) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN"
+                    " (SELECT key FROM results ORDER BY last_access LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional SQLite) store of result dicts."""
+
+    def __init__(self, memory_bytes: int, disk: Optional[DiskResultStore] = None):
+        self.memory = ByteLRUCache(memory_bytes)
+        self.disk = disk
+        self._lock = threading.Lock()  # guards the hit / miss counters (analysis-pool threads)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> tuple[Optional[dict], Optional[str]]:
+        """Return (fresh result dict, tier) or (None, None) on a miss."""
+        tier = "memory"
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            tier = "disk"
+            if value is not None:
+                self.memory.put(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            return None, None
+        return json.loads(value), tier
+
+    def put(self, key: str, result: dict) -> None:
+        try:
+            value = json.dumps(result).encode()
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Result not cacheable: {e}")
+            return
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": memory["evictions"] + (self.disk.evictions if self.disk else 0),
+            "memory_entries": memory["entries"],
+            "memory_bytes": memory["bytes"],
+            "disk_entries": len(self.disk) if self.disk else None,
+        }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Process-wide result cache, or None when RESULT_CACHE_ENABLED is off."""
+    global _cache
+    settings = get_settings()
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            disk = None
+            if settings.RESULT_CACHE_DB:
+                try:
+                    disk = DiskResultStore(settings.RESULT_CACHE_DB, settings.RESULT_CACHE_DISK_MAX_ENTRIES)
+                except sqlite3.Error as e:
+                    logger.warning(f"Disk result cache unavailable ({e}) — memory tier only")
+            _cache = ResultCache(settings.RESULT_CACHE_MEMORY_MB * 1024 * 1024, disk)
+        return _cache
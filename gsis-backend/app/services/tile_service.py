@@ -0,0 +1,277 @@
+"""
+Tile Service — XYZ (Web Mercator) PNG tiles of region NDVI/NDWI layers.
+
+Tiles are rendered from the latest region index COGs written by the region
+monitor (REGION_EXPORT_COGS, see export_service; the /tiles router is only
+mounted when it is on). Their internal overviews
+are the precomputed pyramid: each tile reads from the coarsest level that
+still matches its resolution and warps only the tile's own footprint, so a
+tile costs about one 256x256 read no matter the zoom level or scene size.
+
+Encoded PNGs are kept in a byte-bounded LRU cache (TILE_CACHE_MB) keyed on
+the layer's on-disk generation — the paths and mtimes of its COGs. Tile
+requests do not touch the filesystem: the COGs are re-listed only when this
+process has replaced one (export_service bumps a per-layer counter) or when
+the last listing is older than TILE_SCAN_TTL_SECONDS, which bounds how long
+a raster replaced by another process can serve stale tiles.
+
+Pipeline:
+  (layer, z, x, y) → cache hit → PNG
+                   → miss → intersecting region rasters → overview level
+                          → WarpedVRT on the tile grid → colormap → PNG
+"""
+
+import glob
+import io
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from app.services.export_service import EXPORT_NODATA, EXPORT_SCALE, region_layer_generation
+from app.services.raster_stream_service import DEFAULT_INDICES
+from app.utils.cache_utils import ByteLRUCache
+from app.core.config import get_settings
+
+try:
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.transform import from_bounds
+    from rasterio.vrt import WarpedVRT
+    from rasterio.warp import transform_bounds
+    HAS_RASTERIO = True
+except ImportError:
+    HAS_RASTERIO = False
+
+logger = logging.getLogger("tiles")
+
+TILE_SIZE = 256
+MAX_ZOOM = 22
+WEB_MERCATOR = "EPSG:3857"
+MERCATOR_HALF_WORLD = 20037508.342789244
+TILE_LAYERS = DEFAULT_INDICES
+
+# Colour ramps as (index value, RGB) stops over [-1, 1]
+COLOR_RAMPS = {
+    "ndvi": [
+        (-1.0, (48, 96, 176)),    # water
+        (0.0, (210, 180, 140)),   # bare soil
+        (0.2, (240, 230, 140)),   # sparse
+        (0.4, (120, 190, 80)),    # crops / grass
+        (1.0, (0, 100, 0)),       # dense forest
+    ],
+    "ndwi": [
+        (-1.0, (140, 90, 40)),    # dry
+        (0.0, (240, 240, 240)),
+        (0.3, (110, 170, 230)),   # flood threshold
+        (1.0, (8, 48, 140)),      # open water
+    ],
+}
+
+
+# ---------------------------------------------------------------------------
+# Tile math and colour
+# ---------------------------------------------------------------------------
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(left, bottom, right, top) of an XYZ tile in Web Mercator metres."""
+    size = 2 * MERCATOR_HALF_WORLD / (1 << z)
+    left = -MERCATOR_HALF_WORLD + x * size
+    top = MERCATOR_HALF_WORLD - y * size
+    return left, top - size, left + size, top
+
+
+def _build_lut(stops: list[tuple[float, tuple[int, int, int]]]) -> np.ndarray:
+    """256-entry RGBA lookup table over [-1, 1] interpolated between stops."""
+    values = np.linspace(-1.0, 1.0, 256)
+    positions = [v for v, _ in stops]
+    lut = np.empty((256, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.interp(values, positions, [rgb[channel] for _, rgb in stops])
+    lut[:, 3] = 255
+    return lut
+
+
+COLOR_LUTS = {layer: _build_lut(stops) for layer, stops in COLOR_RAMPS.items()}
+
+
+def colorize(quantized: np.ndarray, layer: str) -> tuple[np.ndarray, np.ndarray]:
+    """Map int16-quantized index values to RGBA; returns (rgba, valid mask)."""
+    valid = quantized != EXPORT_NODATA
+    idx = (quantized.astype(np.int32) + EXPORT_SCALE) * 255 // (2 * EXPORT_SCALE)
+    np.clip(idx, 0, 255, out=idx)
+    rgba = COLOR_LUTS[layer][idx]
+    rgba[~valid] = 0
+    return rgba, valid
+
+
+def _encode_png(rgba: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+EMPTY_TILE = _encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+# ---------------------------------------------------------------------------
+# Region raster index
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class RegionRaster:
+    path: str
+    bounds: tuple[float, float, float, float]  # Web Mercator
+    resolution: float  # Web Mercator metres per full-resolution pixel
+    overviews: tuple[int, ...]
+
+    def intersects(self, bounds: tuple[float, float, float, float]) -> bool:
+        left, bottom, right, top = bounds
+        return not (self.bounds[2] <= left or self.bounds[0] >= right
+                    or self.bounds[3] <= bottom or self.bounds[1] >= top)
+
+    def overview_level(self, tile_resolution: float) -> Optional[int]:
+        """Coarsest overview still at least as fine as the tile (None = full res)."""
+        level = None
+        for i, factor in enumerate(self.overviews):
+            if self.resolution * factor <= tile_resolution:
+                level = i
+        return level
+
+
+_rasters: dict[str, tuple[int, list[RegionRaster]]] = {}  # layer → (generation, rasters)
+_rasters_lock = threading.Lock()
+_scans: dict[str, tuple[int, float, int, list[str]]] = {}  # layer → (local gen, time, generation, paths)
+_scans_lock = threading.Lock()
+_tile_cache: Optional[ByteLRUCache] = None
+_tile_cache_lock = threading.Lock()  # the sync /tiles route runs on the threadpool
+
+
+def layer_generation(layer: str) -> tuple[int, list[str]]:
+    """
+    Hash of the (path, mtime, size) of a layer's region COGs, and the paths;
+    the listing is reused until this process replaces one of the layer's
+    COGs or it is TILE_SCAN_TTL_SECONDS old.
+    """
+    local = region_layer_generation(layer)
+    now = time.monotonic()
+    with _scans_lock:
+        cached = _scans.get(layer)
+        if cached is not None and cached[0] == local and now - cached[1] < get_settings().TILE_SCAN_TTL_SECONDS:
+            return cached[2], cached[3]
+    generation, paths = _list_layer(layer)
+    with _scans_lock:
+        _scans[layer] = (local, now, generation, paths)
+    return generation, paths
+
+
+def _list_layer(layer: str) -> tuple[int, list[str]]:
+    pattern = os.path.join(get_settings().EXPORT_DIR, "regions", "*", f"{layer}.tif")
+    paths, signature = [], []
+    for path in sorted(glob.glob(pattern)):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        paths.append(path)
+        signature.append((path, st.st_mtime_ns, st.st_size))
+    return hash(tuple(signature)), paths
+
+
+def _scan_layer(paths: list[str]) -> list[RegionRaster]:
+    rasters = []
+    for path in paths:
+        try:
+            with rasterio.open(path) as src:
+                if src.crs is None:
+                    continue
+                bounds = transform_bounds(src.crs, WEB_MERCATOR, *src.bounds)
+                resolution = (bounds[2] - bounds[0]) / src.width
+                rasters.append(RegionRaster(path, bounds, resolution, tuple(src.overviews(1))))
+        except Exception as e:
+            logger.warning(f"Skipping unreadable region raster {path}: {e}")
+    return rasters
+
+
+def region_rasters(layer: str) -> tuple[int, list[RegionRaster]]:
+    """(generation, region COGs) of a layer; rescanned whenever a COG changes on disk."""
+    generation, paths = layer_generation(layer)
+    with _rasters_lock:
+        cached = _rasters.get(layer)
+        if cached is None or cached[0] != generation:
+            _rasters[layer] = cached = (generation, _scan_layer(paths))
+        return cached
+
+
+def get_tile_cache() -> ByteLRUCache:
+    global _tile_cache
+    with _tile_cache_lock:
+        if _tile_cache is None:
+            _tile_cache = ByteLRUCache(get_settings().TILE_CACHE_MB * 1024 * 1024)
+        return _tile_cache
+
+
+# ---------------------------------------------------------------------------
+# Rendering
+# ---------------------------------------------------------------------------
+
+def _read_tile(raster: RegionRaster, bounds) -> np.ndarray:
+    """Warp one region raster onto the tile grid (int16, nodata outside)."""
+    tile_resolution = (bounds[2] - bounds[0]) / TILE_SIZE
+    level = raster.overview_level(tile_resolution)
+    open_kwargs = {} if level is None else {"overview_level": level}
+    with rasterio.open(raster.path, **open_kwargs) as src:
+        with WarpedVRT(
+            src,
+            crs=WEB_MERCATOR,
+            transform=from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+            width=TILE_SIZE,
+            height=TILE_SIZE,
+            nodata=EXPORT_NODATA,
+            resampling=Resampling.nearest,
+        ) as vrt:
+            return vrt.read(1)
+
+
+def render_tile(rasters: list[RegionRaster], layer: str, z: int, x: int, y: int) -> Optional[bytes]:
+    """Render a tile as PNG bytes, or None when no region covers it."""
+    bounds = tile_bounds(z, x, y)
+    rgba = None
+    for raster in rasters:
+        if not raster.intersects(bounds):
+            continue
+        part, valid = colorize(_read_tile(raster, bounds), layer)
+        if rgba is None:
+            rgba = part
+        else:
+            fill = valid & (rgba[..., 3] == 0)
+            rgba[fill] = part[fill]
+    if rgba is None or not rgba[..., 3].any():
+        return None
+    return _encode_png(rgba)
+
+
+def get_tile(layer: str, z: int, x: int, y: int) -> bytes:
+    """
+    PNG bytes of an XYZ tile (transparent where no region data exists).
+
+    Raises ValueError for unknown layers or out-of-range tile coordinates.
+    """
+    if layer not in TILE_LAYERS:
+        raise ValueError(f"Unknown layer '{layer}'. Available: {', '.join(TILE_LAYERS)}")
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise ValueError(f"Tile {z}/{x}/{y} out of range")
+
+    cache = get_tile_cache()
+    generation, rasters = region_rasters(layer)
+    key = (layer, z, x, y, generation)
+    png = cache.get(key)
+    if png is None:
+        png = render_tile(rasters, layer, z, x, y) or EMPTY_TILE
+        cache.put(key, png)
+    return png
@@ -0,0 +1,240 @@
+"""
+Zonal Service — Per-polygon NDVI/NDWI statistics over an uploaded raster.
+
+All polygons of a GeoJSON FeatureCollection are rasterized into one label
+raster (zone id per pixel, 0 = outside every zone) block by block, and
+per-zone counts / means / centered second moments are accumulated with
+np.bincount per index per block — no per-polygon masked passes — so
+thousands of zones cost about the same as one. Block moments are merged
+with Chan's update (as RunningStats does), so the std of large, low-spread
+zones does not cancel away.
+
+Overlap rule: zones are burned in feature order, so a pixel inside several
+polygons is labelled with (and counted toward) the last of them only.
+
+Pipeline:
+  GeoJSON → reproject to raster CRS → bounds per zone
+  Streaming pass: block → rasterize intersecting zones → bincount per index
+"""
+
+import json
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.services.raster_stream_service import (
+    BlockVisitor, stream_index_stats, DEFAULT_INDICES,
+)
+from app.services.index_service import IndexWorkspace
+from app.utils.raster_utils import resolve_band_indexes, open_geotiff_bytes
+from app.core.config import get_settings
+
+try:
+    from rasterio.features import rasterize, bounds as geometry_bounds
+    from rasterio.warp import transform_geom
+    HAS_RASTERIO = True
+except ImportError:
+    HAS_RASTERIO = False
+
+GEOJSON_CRS = "EPSG:4326"
+OVERLAP_RULE = "last_feature_wins"  # pixels shared by overlapping zones count toward the later feature
+
+
+# ---------------------------------------------------------------------------
+# Zone accumulator
+# ---------------------------------------------------------------------------
+
+class ZonalAccumulator(BlockVisitor):
+    """Per-zone count / mean / M2 for each index (BlockVisitor)."""
+
+    def __init__(self, geometries: list[dict], zone_bounds: np.ndarray, indices: tuple[str, ...]):
+        self.geometries = geometries
+        self.zone_bounds = zone_bounds  # (n, 4): minx, miny, maxx, maxy
+        self.indices = indices
+        size = len(geometries) + 1  # label 0 = no zone
+        self.counts = {name: np.zeros(size, dtype=np.int64) for name in indices}
+        self.means = {name: np.zeros(size, dtype=np.float64) for name in indices}
+        self.m2 = {name: np.zeros(size, dtype=np.float64) for name in indices}
+
+    def fork(self) -> "ZonalAccumulator":
+        return ZonalAccumulator(self.geometries, self.zone_bounds, self.indices)
+
+    def merge(self, other: "ZonalAccumulator") -> None:
+        for name in self.indices:
+            self._combine(name, other.counts[name], other.means[name], other.m2[name])
+
+    def _combine(self, name: str, n: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> None:
+        """Chan's parallel update of every zone's moments with a partial (n, mean, m2)."""
+        count = self.counts[name]
+        total = count + n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(total > 0, n / total, 0.0)
+        delta = mean - self.means[name]
+        self.means[name] += delta * weight
+        self.m2[name] += m2 + delta * delta * count * weight
+        self.counts[name] = total
+
+    def _block_labels(self, transform, shape: tuple[int, int], ws: IndexWorkspace) -> Optional[np.ndarray]:
+        """Rasterize only the zones whose bounds intersect this block."""
+        left, top = transform * (0, 0)
+        right, bottom = transform * (shape[1], shape[0])
+        minx, maxx = min(left, right), max(left, right)
+        miny, maxy = min(top, bottom), max(top, bottom)
+
+        b = self.zone_bounds
+        hits = np.flatnonzero((b[:, 0] <= maxx) & (b[:, 2] >= minx) & (b[:, 1] <= maxy) & (b[:, 3] >= miny))
+        if hits.size == 0:
+            return None
+
+        labels = ws.get("zone_labels", shape, np.int32)
+        labels[...] = 0
+        rasterize(
+            ((self.geometries[i], int(i) + 1) for i in hits),
+            out=labels,
+            transform=transform,
+            fill=0,
+        )
+        return labels
+
+    def visit(self, transform, values: dict[str, np.ndarray], ws: IndexWorkspace) -> None:
+        shape = next(iter(values.values())).shape
+        labels = self._block_labels(transform, shape, ws)
+        if labels is None:
+            return
+
+        in_zone = np.greater(labels, 0, out=ws.get("zone_in", shape, np.bool_))
+        if not in_zone.any():
+            return
+        size = len(self.geometries) + 1
+        select = ws.get("zone_select", shape, np.bool_)
+
+        for name in self.indices:
+            np.isfinite(values[name], out=select)
+            select &= in_zone
+            zone_ids = labels[select]
+            v = values[name][select].astype(np.float64)
+            n = np.bincount(zone_ids, minlength=size)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.bincount(zone_ids, weights=v, minlength=size) / n
+            np.nan_to_num(mean, copy=False)
+            v -= mean[zone_ids]
+            m2 = np.bincount(zone_ids, weights=v * v, minlength=size)
+            self._combine(name, n, mean, m2)
+
+    def summary(self, name: str) -> dict[str, np.ndarray]:
+        """Vectorized mean / std / count per zone (label 0 dropped)."""
+        counts = self.counts[name][1:]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(counts > 0, self.means[name][1:], np.nan)
+            var = self.m2[name][1:] / counts
+        return {"mean": mean, "std": np.sqrt(var), "count": counts}
+
+
+# ---------------------------------------------------------------------------
+# GeoJSON handling
+# ---------------------------------------------------------------------------
+
+def _feature_collection_crs(fc: dict) -> str:
+    """Legacy GeoJSON 'crs' member, else the RFC 7946 default (WGS84)."""
+    crs = fc.get("crs")
+    if isinstance(crs, dict):
+        name = crs.get("properties", {}).get("name")
+        if name:
+            return name
+    return GEOJSON_CRS
+
+
+def parse_zones(fc: dict, raster_crs) -> tuple[list[dict], list[dict], np.ndarray]:
+    """
+    Validate a FeatureCollection and project its polygons to the raster CRS.
+
+    Returns (features, geometries, bounds array).
+    """
+    if fc.get("type") != "FeatureCollection" or not isinstance(fc.get("features"), list):
+        raise ValueError("Expected a GeoJSON FeatureCollection")
+
+    settings = get_settings()
+    features = [f for f in fc["features"] if f.get("geometry")]
+    if not features:
+        raise ValueError("FeatureCollection contains no geometries")
+    if len(features) > settings.ZONAL_MAX_FEATURES:
+        raise ValueError(f"Maximum {settings.ZONAL_MAX_FEATURES} features per request. Got {len(features)}.")
+
+    for f in features:
+        if f["geometry"].get("type") not in ("Polygon", "MultiPolygon"):
+            raise ValueError(f"Unsupported geometry type {f['geometry'].get('type')!r}; expected Polygon/MultiPolygon")
+
+    src_crs = _feature_collection_crs(fc)
+    geometries = [f["geometry"] for f in features]
+    if raster_crs is not None and raster_crs != src_crs:
+        geometries = [transform_geom(src_crs, raster_crs, g) for g in geometries]
+
+    zone_bounds = np.array([geometry_bounds(g) for g in geometries], dtype=np.float64)
+    return features, geometries, zone_bounds
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+
+def compute_zonal_stats(src, fc: dict, indices: tuple[str, ...] = DEFAULT_INDICES) -> dict:
+    """Per-zone mean/std/count of each index over an open rasterio dataset."""
+    band_indexes = resolve_band_indexes(src.count)
+    if band_indexes is None:
+        raise ValueError(f"At least 3 bands required, got {src.count}")
+
+    features, geometries, zone_bounds = parse_zones(fc, src.crs)
+    accumulator = ZonalAccumulator(geometries, zone_bounds, indices)
+    stream = stream_index_stats(src, band_indexes, indices, histograms=(), visitors=(accumulator,))
+
+    summaries = {name: accumulator.summary(name) for name in indices}
+    zones = []
+    for i, feature in enumerate(features):
+        zone = {
+            "zone_id": i + 1,
+            "feature_id": feature.get("id"),
+            "properties": feature.get("properties") or {},
+        }
+        for name in indices:
+            count = int(summaries[name]["count"][i])
+            zone[name] = {
+                "mean": round(float(summaries[name]["mean"][i]), 4) if count else None,
+                "std": round(float(summaries[name]["std"][i]), 4) if count else None,
+                "count": count,
+            }
+        zones.append(zone)
+
+    return {
+        "zones": zones,
+        "total_zones": len(zones),
+        "zones_with_data": sum(1 for z in zones if z[indices[0]]["count"]),
+        "valid_pixel_fraction": stream.valid_pixel_fraction,
+        "overlap_rule": OVERLAP_RULE,
+        "image_dimensions": f"{src.width}x{src.height}",
+    }
+
+
+def process_zonal_request(tiff_bytes: bytes, geojson_bytes: bytes) -> dict:
+    """Decode a GeoTIFF + GeoJSON upload pair and return zonal statistics."""
+    from fastapi import HTTPException
+
+    if not HAS_RASTERIO:
+        raise HTTPException(status_code=400, detail="rasterio not installed. Run: pip install rasterio")
+
+    start = time.time()
+    try:
+        fc = json.loads(geojson_bytes)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid GeoJSON")
+
+    try:
+        with open_geotiff_bytes(tiff_bytes) as src:
+            result = compute_zonal_stats(src, fc)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error computing zonal statistics: {e}")
+
+    result["processing_time_seconds"] = round(time.time() - start, 3)
+    return result
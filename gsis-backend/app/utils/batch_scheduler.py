@@ -0,0 +1,114 @@
+"""
+Batch scheduler — Dynamic micro-batching of concurrent requests.
+
+Callers submit single items from any thread and get a Future back. One
+scheduler thread collects queued items and flushes them through a batch
+function when either max_batch_size items are waiting or the oldest item
+has waited max_wait_ms, then hands each caller its own result.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Size- or deadline-triggered batching around `run_batch(items) -> outputs`."""
+
+    def __init__(
+        self,
+        run_batch: Callable[[Sequence[Any]], Sequence[Any]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        name: str = "micro-batcher",
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue: "queue.SimpleQueue[tuple[Any, Future, float]]" = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+        # Metrics
+        self._metrics_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes: Counter[int] = Counter()
+        self._waits_ms: deque[float] = deque(maxlen=1000)
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the Future resolves to its entry of the batch output."""
+        future: Future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        self._ensure_started()
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        """Submit and wait for the result."""
+        return self.submit(item).result()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch: list[tuple[Any, Future, float]]) -> None:
+        started = time.perf_counter()
+        self._record(len(batch), [(started - enqueued) * 1000 for _, _, enqueued in batch])
+        try:
+            outputs = self.run_batch([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), output in zip(batch, outputs):
+            future.set_result(output)
+
+    def _record(self, size: int, waits_ms: list[float]) -> None:
+        with self._metrics_lock:
+            self.batches += 1
+            self.items += size
+            self.batch_sizes[size] += 1
+            self._waits_ms.extend(waits_ms)
+
+    def metrics(self) -> dict:
+        """Batch-size distribution and queue-wait percentiles (last 1000 items)."""
+        with self._metrics_lock:
+            waits = np.array(self._waits_ms) if self._waits_ms else np.zeros(1)
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "batch_size_counts": dict(sorted(self.batch_sizes.items())),
+                "queue_wait_ms": {
+                    "mean": round(float(waits.mean()), 2),
+                    "p50": round(float(np.percentile(waits, 50)), 2),
+                    "p95": round(float(np.percentile(waits, 95)), 2),
+                    "max": round(float(waits.max()), 2),
+                },
+            }
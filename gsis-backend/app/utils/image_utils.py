@@ -0,0 +1,61 @@
+"""
+Image utilities — Single-pass decode of RGB uploads to the model input size.
+"""
+
+import io
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+MODEL_INPUT_SIZE = 224
+
+# Bump whenever decode_rgb's output changes (resampling, draft decoding) —
+# part of the result-cache key, so cached results from older preprocessing
+# are never served.
+PREPROCESS_VERSION = 2
+
+
+@dataclass
+class DecodedImage:
+    """
+    An upload decoded once, plus its original size.
+
+    pixels        224x224x3 uint8, bilinear — CNN and pixel-classifier input
+    stats_pixels  224x224x3 uint8, bicubic — the resampling the RGB pixel
+                  statistics (NDVI/NDWI approximations, dominant RGB) have
+                  always used
+    """
+    pixels: np.ndarray
+    stats_pixels: np.ndarray
+    width: int
+    height: int
+
+
+def resize_rgb(image: Image.Image, size: int = MODEL_INPUT_SIZE, resample: int = Image.BILINEAR) -> np.ndarray:
+    """
+    Convert to RGB and resize to (size, size) uint8.
+
+    Bilinear (the default) is what torchvision's Resize does on PIL images,
+    so the array matches the CNN's training-time preprocessing exactly.
+    """
+    image = image.convert("RGB").resize((size, size), resample)
+    return np.array(image, dtype=np.uint8)
+
+
+def decode_rgb(contents: bytes, size: int = MODEL_INPUT_SIZE) -> DecodedImage:
+    """
+    Decode image bytes straight to (size, size, 3) uint8 arrays.
+
+    JPEGs are decoded in draft mode: libjpeg's DCT scaling decodes at the
+    smallest 1/2, 1/4 or 1/8 scale that is still >= size, so a large photo
+    is never fully decompressed just to be shrunk to the model input.
+    """
+    image = Image.open(io.BytesIO(contents))
+    width, height = image.size
+    if image.format == "JPEG":
+        image.draft("RGB", (size, size))
+    image = image.convert("RGB")
+    return DecodedImage(
+        resize_rgb(image, size), resize_rgb(image, size, Image.BICUBIC), width, height,
+    )
@@ -1,12 +1,18 @@
 """
-Raster utilities — Band extraction helpers.
+Raster utilities — Band extraction and dataset opening helpers.
 """
 
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
 import numpy as np
-from typing import Optional
+
+from app.core.config import get_settings
+from app.utils.file_utils import save_temp_file, cleanup_temp_file
 
 try:
     import rasterio
+    from rasterio.io import MemoryFile
     HAS_RASTERIO = True
 except ImportError:
     HAS_RASTERIO = False
@@ -16,6 +22,58 @@ def is_rasterio_available() -> bool:
     return HAS_RASTERIO
 
 
+def resolve_band_indexes(band_count: int) -> Optional[dict[str, int]]:
+    """
+    Map band roles (nir, red, green, blue, swir1, swir2) to 1-based band
+    indexes for a GeoTIFF. Handles Sentinel-2, Landsat, and RGB-only TIFFs
+    (Green as NIR proxy). SWIR roles are only present for full stacks.
+    Returns None when there are too few bands to compute indices.
+    """
+    if band_count >= 8:
+        # Sentinel-2: B2=Blue, B3=Green, B4=Red, B8=NIR
+        bands = {"nir": 8, "red": 4, "green": 3, "blue": 2}
+        if band_count >= 12:
+            # Full L1C/L2A stacks end with B11 (SWIR1), B12 (SWIR2)
+            bands.update(swir1=band_count - 1, swir2=band_count)
+        return bands
+    elif band_count >= 4:
+        # Landsat: B1=Blue, B2=Green, B3=Red, B4=NIR
+        bands = {"nir": 4, "red": 3, "green": 2, "blue": 1}
+        if band_count >= 6:
+            # TM/ETM+: B5=SWIR1, B7=SWIR2 (B6 thermal may be dropped)
+            bands.update(swir1=5, swir2=7 if band_count >= 7 else 6)
+        return bands
+    elif band_count >= 3:
+        # RGB GeoTIFF — use Green as NIR proxy
+        return {"nir": 2, "red": 1, "green": 2, "blue": 3}
+    return None
+
+
+@contextmanager
+def open_geotiff_bytes(contents: bytes) -> Iterator["rasterio.DatasetReader"]:
+    """
+    Open an uploaded GeoTIFF directly from its bytes.
+
+    Uploads up to TIFF_SPILL_THRESHOLD_MB are served from an in-memory
+    dataset (no temp-file round trip). Larger uploads spill to a temp file,
+    which is removed when the context exits.
+    """
+    threshold = get_settings().TIFF_SPILL_THRESHOLD_MB * 1024 * 1024
+
+    if len(contents) <= threshold:
+        with MemoryFile(contents) as memfile:
+            with memfile.open() as src:
+                yield src
+        return
+
+    tmp_path = save_temp_file(contents, suffix=".tif")
+    try:
+        with rasterio.open(tmp_path) as src:
+            yield src
+    finally:
+        cleanup_temp_file(tmp_path)
+
+
 def get_band_info(file_path: str) -> dict:
     """Extract band metadata from a GeoTIFF file."""
     if not HAS_RASTERIO:
@@ -45,41 +103,12 @@ def extract_bands(file_path: str) -> dict[str, Optional[np.ndarray]]:
     """
     with rasterio.open(file_path) as src:
         band_count = src.count
+        band_indexes = resolve_band_indexes(band_count) or {}
 
-        if band_count >= 8:
-            return {
-                "nir": src.read(8).astype(np.float64),
-                "red": src.read(4).astype(np.float64),
-                "green": src.read(3).astype(np.float64),
-                "blue": src.read(2).astype(np.float64),
-                "band_count": band_count,
-                "dimensions": (src.width, src.height),
-            }
-        elif band_count >= 4:
-            return {
-                "nir": src.read(4).astype(np.float64),
-                "red": src.read(3).astype(np.float64),
-                "green": src.read(2).astype(np.float64),
-                "blue": src.read(1).astype(np.float64),
-                "band_count": band_count,
-                "dimensions": (src.width, src.height),
-            }
-        elif band_count >= 3:
-            green = src.read(2).astype(np.float64)
-            return {
-                "nir": green,  # proxy
-                "red": src.read(1).astype(np.float64),
-                "green": green,
-                "blue": src.read(3).astype(np.float64),
-                "band_count": band_count,
-                "dimensions": (src.width, src.height),
-            }
-        else:
-            return {
-                "nir": None,
-                "red": None,
-                "green": None,
-                "blue": None,
-                "band_count": band_count,
-                "dimensions": (src.width, src.height),
-            }
+        # Read each physical band once (proxy roles share an array)
+        loaded = {idx: src.read(idx).astype(np.float64) for idx in set(band_indexes.values())}
+        result = {role: None for role in ("nir", "red", "green", "blue")}
+        result.update({role: loaded[idx] for role, idx in band_indexes.items()})
+        result["band_count"] = band_count
+        result["dimensions"] = (src.width, src.height)
+        return result
@@ -2,8 +2,11 @@
 Input validators.
 """
 
+from typing import Optional
+
 from fastapi import HTTPException, UploadFile
 from app.core.config import get_settings
+from app.services.index_service import INDEX_REGISTRY
 
 
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff"}
@@ -39,3 +42,17 @@ def validate_batch_size(count: int) -> None:
 def is_tiff(filename: str) -> bool:
     """Check if filename is a TIFF/GeoTIFF."""
     return filename.lower().endswith((".tif", ".tiff"))
+
+
+def parse_index_list(raw: Optional[str]) -> Optional[list[str]]:
+    """Parse a comma-separated spectral index list (e.g. "evi,savi,nbr")."""
+    if not raw:
+        return None
+    names = [n.strip().lower() for n in raw.split(",") if n.strip()]
+    unknown = [n for n in names if n not in INDEX_REGISTRY]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown index {unknown}. Available: {', '.join(INDEX_REGISTRY)}"
+        )
+    return names
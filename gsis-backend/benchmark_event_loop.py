@@ -0,0 +1,142 @@
+"""
+Event-loop latency benchmark — light requests while /predict runs heavy analysis.
+
+Starts uvicorn with app.main:app (pinned to --cpus cores, rate limits off),
+then for --duration seconds runs --heavy clients looping POST /predict on a
+synthetic --size x --size 4-band GeoTIFF and --light clients polling GET /
+every --interval-ms. Prints p50/p99/max latency of GET / and the /predict
+status counts.
+
+Run it on two revisions to compare them, e.g. before and after /predict
+moved onto the analysis pool (copy this file into a worktree of the older
+revision; both servers then run with the same settings):
+    python benchmark_event_loop.py --cpus 1 --duration 25
+Defaults: 3000x3000 scene, 2 heavy and 2 light clients, 20 ms light
+interval, rate limits and the result cache off.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import requests
+
+import rasterio
+from rasterio.transform import from_origin
+
+
+def write_scene(path: str, size: int) -> None:
+    """Smooth 4-band uint16 scene (compresses well, so the upload stays small)."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    bands = np.stack([
+        1000 + 800 * np.sin(6 * x + k) * np.cos(4 * y - k) + rng.normal(0, 20, (size, size))
+        for k in range(4)
+    ]).clip(1, 65535).astype(np.uint16)
+    profile = dict(driver="GTiff", width=size, height=size, count=4, dtype="uint16",
+                   crs="EPSG:4326", transform=from_origin(0, 1, 1 / size, 1 / size),
+                   compress="deflate", tiled=True)
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(bands)
+
+
+def start_server(port: int, cpus: int) -> subprocess.Popen:
+    """
+    uvicorn without rate limits (they would turn most of the load into 429s)
+    and without the result cache (every request uploads the same scene, so
+    all but the first would be cache hits).
+    """
+    env = {**os.environ, "RATELIMIT_ENABLED": "false", "RESULT_CACHE_ENABLED": "false"}
+
+    def pin() -> None:
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, set(range(cpus)))
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, preexec_fn=pin,
+    )
+    url = f"http://127.0.0.1:{port}/"
+    for _ in range(300):
+        try:
+            requests.get(url, timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Server did not start")
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GET / latency while /predict is busy")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cpus", type=int, default=1, help="Cores the server may use (0 = all)")
+    parser.add_argument("--size", type=int, default=3000)
+    parser.add_argument("--heavy", type=int, default=2)
+    parser.add_argument("--light", type=int, default=2)
+    parser.add_argument("--interval-ms", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=25.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scene = os.path.join(tmp, "scene.tif")
+        write_scene(scene, args.size)
+        with open(scene, "rb") as f:
+            tiff = f.read()
+        print(f"Scene: {args.size}x{args.size}x4 uint16, {len(tiff) / 1e6:.1f} MB")
+
+        server = start_server(args.port, args.cpus)
+        base = f"http://127.0.0.1:{args.port}"
+        deadline = time.perf_counter() + args.duration
+        light_ms: list[float] = []
+        predict_status: Counter[int] = Counter()
+        lock = threading.Lock()
+
+        def heavy() -> None:
+            with requests.Session() as s:
+                while time.perf_counter() < deadline:
+                    r = s.post(f"{base}/predict/", files={"file": ("scene.tif", tiff)})
+                    with lock:
+                        predict_status[r.status_code] += 1
+
+        def light() -> None:
+            with requests.Session() as s:
+                while time.perf_counter() < deadline:
+                    t = time.perf_counter()
+                    s.get(f"{base}/")
+                    elapsed = (time.perf_counter() - t) * 1000
+                    with lock:
+                        light_ms.append(elapsed)
+                    time.sleep(max(0.0, args.interval_ms / 1000 - elapsed / 1000))
+
+        try:
+            threads = ([threading.Thread(target=heavy) for _ in range(args.heavy)]
+                       + [threading.Thread(target=light) for _ in range(args.light)])
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"\nGET / over {args.duration:.0f}s ({len(light_ms)} requests, server on "
+          f"{args.cpus or 'all'} core(s)):")
+    print(f"  p50 {percentile(light_ms, 50):8.1f} ms")
+    print(f"  p99 {percentile(light_ms, 99):8.1f} ms")
+    print(f"  max {max(light_ms, default=float('nan')):8.1f} ms")
+    print(f"POST /predict/ status counts: {dict(predict_status)}")
+
+
+if __name__ == "__main__":
+    main()
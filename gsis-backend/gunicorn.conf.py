@@ -0,0 +1,42 @@
+"""
+Gunicorn config — Preload-then-fork serving with uvicorn workers.
+
+Run with (this is what the Procfile runs):
+    cd gsis-backend
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app and the CNN are loaded and warmed up once in the master before the
+worker forks, so the first request does not pay for the model load. Trained
+weights are mmap-backed (cnn_model.load_trained_model), so every process
+that loads the same .pt — including ANALYSIS_POOL="process" workers — maps
+one page-cache copy. Per-worker memory (USS = private, PSS = fair share of
+shared pages) is reported by /admin/system-health.
+
+One worker only, for now: the monitoring scheduler (24 h region cycle,
+startup cycle, hourly export sweep) runs in every worker's lifespan, and
+region data and monitor alerts live in each worker's memory, so a second
+worker would repeat every region cycle and serve its own region state.
+The worker count is therefore pinned to 1 until that state is shared between
+processes; copy-on-write sharing of the preloaded weights across several
+forked workers only pays off from then on.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+# Pinned (see above); platforms that export WEB_CONCURRENCY only get a warning
+workers = 1
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def on_starting(server):
+    if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1:
+        server.log.warning("Ignoring WEB_CONCURRENCY: one worker until region state is shared between processes")
+    from app.services.cnn_service import preload_model
+    preload_model()
+    # Move everything loaded so far out of the collector's reach: otherwise
+    # GC passes in the workers touch those objects and un-share their pages
+    gc.freeze()
@@ -0,0 +1,71 @@
+"""Shared test setup (run from gsis-backend: python -m pytest)."""
+
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENE_NODATA = 0
+
+
+@dataclass
+class SyntheticScene:
+    """A 4-band uint16 GeoTIFF on disk plus the arrays it was written from."""
+    path: str
+    bands: np.ndarray  # (4, rows, cols) uint16: blue, green, red, nir
+    transform: object
+
+    @property
+    def valid(self) -> np.ndarray:
+        return (self.bands != SCENE_NODATA).all(axis=0)
+
+    def index(self, a: int, b: int) -> np.ndarray:
+        """Float64 reference (a - b) / (a + b) of two 0-based bands, NaN where invalid."""
+        a, b = self.bands[a].astype(np.float64), self.bands[b].astype(np.float64)
+        with np.errstate(invalid="ignore"):
+            return np.where(self.valid, (a - b) / (a + b), np.nan)
+
+    @property
+    def ndvi(self) -> np.ndarray:
+        return self.index(3, 2)
+
+    @property
+    def ndwi(self) -> np.ndarray:
+        return self.index(1, 3)
+
+
+@pytest.fixture
+def scene(tmp_path) -> SyntheticScene:
+    """
+    200x150 EPSG:4326 scene in 64x64 tiles (partial tiles on the right and
+    bottom edges) with nodata 0: a nodata rectangle in the NIR band, 2%
+    scattered nodata pixels in the red band and one all-nodata tile.
+    """
+    rasterio = pytest.importorskip("rasterio")
+    from rasterio.transform import from_origin
+
+    rows, cols = 150, 200
+    rng = np.random.default_rng(42)
+    bands = np.stack([
+        rng.integers(200, 2500, (rows, cols)),   # blue
+        rng.integers(300, 4000, (rows, cols)),   # green
+        rng.integers(200, 3500, (rows, cols)),   # red
+        rng.integers(500, 6500, (rows, cols)),   # nir
+    ]).astype(np.uint16)
+    bands[3, 10:30, 20:90] = SCENE_NODATA
+    bands[2][rng.random((rows, cols)) < 0.02] = SCENE_NODATA
+    bands[:, 64:128, 128:192] = SCENE_NODATA
+
+    transform = from_origin(10.0, 50.0, 0.001, 0.001)
+    path = str(tmp_path / "scene.tif")
+    with rasterio.open(
+        path, "w", driver="GTiff", width=cols, height=rows, count=4, dtype="uint16",
+        crs="EPSG:4326", transform=transform, nodata=SCENE_NODATA,
+        tiled=True, blockxsize=64, blockysize=64,
+    ) as dst:
+        dst.write(bands)
+    return SyntheticScene(path, bands, transform)
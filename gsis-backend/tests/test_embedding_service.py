@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from app.services.embedding_service import EMBEDDING_DIM, RERANK_FACTOR, EmbeddingStore, IVFPQIndex, normalize
+
+
+@pytest.fixture(scope="module")
+def clustered():
+    """3000 unit vectors around 40 centers (dim 128)."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, 128))
+    return normalize(centers[rng.integers(0, 40, 3000)] + 0.6 * rng.normal(size=(3000, 128)))
+
+
+@pytest.fixture(scope="module")
+def index(clustered):
+    index = IVFPQIndex(n_lists=32, n_probe=8, n_subvectors=16)
+    index.train(clustered)
+    index.add(clustered[:1000])
+    index.add(clustered[1000:])  # second batch exercises list growth
+    return index
+
+
+def test_inverted_lists_hold_every_row_once_in_order(index, clustered):
+    assert len(index) == len(clustered)
+    assert index.list_sizes.sum() == len(clustered)
+    for l in range(index.n_lists):
+        rows = index.list_rows[l][:index.list_sizes[l]]
+        np.testing.assert_array_equal(rows, np.flatnonzero(index.lists == l))
+
+
+def test_every_row_finds_itself(index, clustered):
+    queries = range(0, len(clustered), 15)
+    assert all(q in index.search(clustered[q], 10) for q in queries)
+
+
+def test_reranked_recall_at_10(index, clustered):
+    recalls = []
+    for q in range(0, len(clustered), 15):
+        query = clustered[q]
+        candidates = index.search(query, 10 * RERANK_FACTOR)
+        found = candidates[np.argsort(-(clustered[candidates] @ query))[:10]]
+        exact = np.argsort(-(clustered @ query))[:10]
+        recalls.append(len(np.intersect1d(found, exact)) / 10)
+    assert np.mean(recalls) >= 0.95
+
+
+def test_probing_every_list_returns_every_row(clustered):
+    index = IVFPQIndex(n_lists=4, n_probe=4, n_subvectors=16)
+    index.train(clustered[:500])
+    index.add(clustered[:500])
+    np.testing.assert_array_equal(np.sort(index.search(clustered[0], 500)), np.arange(500))
+
+
+def test_store_rows_are_ids_and_shared_across_instances(tmp_path):
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(5, EMBEDDING_DIM)).astype(np.float32)
+    writer = EmbeddingStore(str(tmp_path), ann_threshold=10_000, n_probe=8)
+    reader = EmbeddingStore(str(tmp_path), ann_threshold=10_000, n_probe=8)
+
+    ids = [writer.add(f"key{i}", v, name=f"scene{i}") for i, v in enumerate(vectors)]
+    assert ids == list(range(5))
+    assert writer.add("key2", vectors[0]) == 2  # duplicate key keeps its row
+
+    found = reader.search(vectors[3], k=2)  # picks up the writer's rows first
+    assert found["method"] == "brute_force" and found["store_size"] == 5
+    assert found["results"][0]["id"] == 3 and found["results"][0]["name"] == "scene3"
+    assert found["results"][0]["similarity"] == pytest.approx(1.0, abs=1e-3)
+    assert reader.search(vectors[3], k=2, exclude_key="key3")["results"][0]["id"] != 3
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services.export_service import EXPORT_NODATA, EXPORT_SCALE, IndexRasterExporter
+from app.services.raster_stream_service import stream_index_stats
+
+rasterio = pytest.importorskip("rasterio")
+
+BANDS = {"blue": 1, "green": 2, "red": 3, "nir": 4}
+
+
+def _export(scene, out_dir, workers=1):
+    os.makedirs(out_dir, exist_ok=True)
+    with rasterio.open(scene.path) as src:
+        with IndexRasterExporter(src, ["ndvi", "ndwi"], out_dir) as exporter:
+            stream_index_stats(src, BANDS, workers=workers, visitors=(exporter,))
+    return exporter.paths
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_int16_cog_values_match_reference(scene, tmp_path, workers):
+    paths = _export(scene, str(tmp_path / "out"), workers)
+
+    assert sorted(os.listdir(tmp_path / "out")) == ["ndvi.tif", "ndwi.tif"]
+    for name, reference in (("ndvi", scene.ndvi), ("ndwi", scene.ndwi)):
+        with rasterio.open(paths[name]) as dst:
+            assert dst.dtypes[0] == "int16" and dst.nodata == EXPORT_NODATA
+            assert dst.scales == (1 / EXPORT_SCALE,)
+            assert dst.transform == scene.transform and dst.crs.to_string() == "EPSG:4326"
+            values = dst.read(1)
+        valid = np.isfinite(reference)
+        np.testing.assert_array_equal(values[~valid], EXPORT_NODATA)
+        expected = np.rint(reference[valid] * EXPORT_SCALE)
+        # float32 kernel vs float64 reference: at most one quantization step apart
+        assert np.abs(values[valid] - expected).max() <= 1
+        assert (values[valid] == expected).mean() > 0.99
+
+
+def test_failed_pass_leaves_no_output(scene, tmp_path):
+    out_dir = str(tmp_path / "out")
+    os.makedirs(out_dir)
+    with rasterio.open(scene.path) as src:
+        with pytest.raises(RuntimeError):
+            with IndexRasterExporter(src, ["ndvi"], out_dir) as exporter:
+                stream_index_stats(src, BANDS, workers=1, visitors=(exporter,))
+                raise RuntimeError("client went away")
+    assert os.listdir(out_dir) == []
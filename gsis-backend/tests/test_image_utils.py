@@ -0,0 +1,27 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_utils import decode_rgb
+
+
+def _png(width: int, height: int) -> tuple[Image.Image, bytes]:
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    image.save(buf, "PNG")
+    return image, buf.getvalue()
+
+
+def test_stats_pixels_keep_the_bicubic_resize():
+    image, contents = _png(400, 300)
+    decoded = decode_rgb(contents)
+    assert (decoded.width, decoded.height) == (400, 300)
+    np.testing.assert_array_equal(decoded.stats_pixels, np.asarray(image.resize((224, 224), Image.BICUBIC)))
+
+
+def test_pixels_match_the_cnn_bilinear_resize():
+    image, contents = _png(400, 300)
+    decoded = decode_rgb(contents)
+    assert decoded.pixels.shape == (224, 224, 3) and decoded.pixels.dtype == np.uint8
+    np.testing.assert_array_equal(decoded.pixels, np.asarray(image.resize((224, 224), Image.BILINEAR)))
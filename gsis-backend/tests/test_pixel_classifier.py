@@ -0,0 +1,64 @@
+import threading
+import time
+
+import numpy as np
+
+import app.models.pixel_classifier as pixel_module
+from app.models.pixel_classifier import PixelClassifier, extract_features
+
+
+def _tiny_model() -> PixelClassifier:
+    n = len(extract_features(np.zeros((64, 64, 3), np.uint8)))
+    rng = np.random.default_rng(0)
+    return PixelClassifier(["A", "B"], np.zeros(n), np.ones(n), rng.normal(size=(n, 2)), np.zeros(2))
+
+
+def test_save_load_round_trip(tmp_path):
+    model = _tiny_model()
+    path = str(tmp_path / "landuse_pixel.npz")
+    model.save(path, val_accuracy=50.0)
+    loaded = PixelClassifier.load(path)
+    pixels = np.random.default_rng(1).integers(0, 256, (224, 224, 3), dtype=np.uint8)
+    assert loaded.classes == ["A", "B"]
+    assert loaded.version.startswith("pixel-")
+    np.testing.assert_allclose(loaded.classify(pixels), model.classify(pixels), rtol=1e-6)
+
+
+def test_concurrent_first_calls_all_see_the_loaded_model(tmp_path, monkeypatch):
+    path = str(tmp_path / "landuse_pixel.npz")
+    _tiny_model().save(path)
+    real_load = PixelClassifier.load.__func__
+    loads = []
+
+    def slow_load(cls, p):
+        loads.append(p)
+        time.sleep(0.2)  # keep the first load in flight while the other threads arrive
+        return real_load(cls, p)
+
+    monkeypatch.setattr(pixel_module, "pixel_classifier_path", lambda: path)
+    monkeypatch.setattr(PixelClassifier, "load", classmethod(slow_load))
+    monkeypatch.setattr(pixel_module, "_classifier", None)
+    monkeypatch.setattr(pixel_module, "_classifier_loaded", False)
+
+    results = [None] * 8
+    barrier = threading.Barrier(len(results))
+
+    def call(i):
+        barrier.wait()
+        results[i] = pixel_module.get_pixel_classifier()
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(results))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(loads) == 1
+    assert all(r is not None and r is results[0] for r in results)
+
+
+def test_missing_model_means_heuristics(tmp_path, monkeypatch):
+    monkeypatch.setattr(pixel_module, "pixel_classifier_path", lambda: str(tmp_path / "absent.npz"))
+    monkeypatch.setattr(pixel_module, "_classifier", None)
+    monkeypatch.setattr(pixel_module, "_classifier_loaded", False)
+    assert pixel_module.get_pixel_classifier() is None
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from app.services.raster_stream_service import RunningHistogram, RunningStats, stream_index_stats
+
+rasterio = pytest.importorskip("rasterio")
+
+BANDS = {"blue": 1, "green": 2, "red": 3, "nir": 4}
+
+
+def _finite(values: np.ndarray) -> np.ndarray:
+    return values[np.isfinite(values)]
+
+
+def test_running_stats_merge_matches_single_pass():
+    rng = np.random.default_rng(0)
+    values = rng.normal(0.3, 0.2, 10_000).astype(np.float32)
+    values[::97] = np.nan
+    values[::211] = np.inf
+
+    single = RunningStats()
+    single.update(values)
+    parts = []
+    for chunk in np.array_split(values, 7):
+        part = RunningStats()
+        part.update(chunk)
+        parts.append(part)
+    merged = RunningStats()
+    for part in parts:
+        merged.merge(part)
+
+    reference = _finite(values).astype(np.float64)
+    for stats in (single, merged):
+        assert stats.count == reference.size
+        assert stats.mean == pytest.approx(reference.mean(), rel=1e-6)
+        assert stats.std == pytest.approx(reference.std(), rel=1e-6)
+        assert stats.min == reference.min() and stats.max == reference.max()
+
+
+def test_running_stats_keeps_the_spread_of_a_large_offset():
+    # sum-of-squares variance cancels here; Chan's update must not
+    values = (1e4 + np.random.default_rng(1).normal(0, 1e-3, 50_000)).astype(np.float64)
+    stats = RunningStats()
+    for chunk in np.array_split(values, 50):
+        stats.update(chunk)
+    assert stats.std == pytest.approx(values.std(), rel=1e-4)
+
+
+def test_running_histogram_percentiles_within_one_bin():
+    values = np.clip(np.random.default_rng(2).normal(0.2, 0.3, 20_000), -1, 1).astype(np.float32)
+    hist = RunningHistogram(bins=100)
+    for chunk in np.array_split(values, 9):
+        hist.update(chunk)
+    assert hist.counts.sum() == values.size
+    width = 2 / hist.bins
+    for q in RunningHistogram.PERCENTILES:
+        assert abs(hist.percentile(q) - np.percentile(values, q)) <= width
+
+
+def test_running_histogram_clamps_out_of_range_values():
+    hist = RunningHistogram(bins=10)
+    hist.update(np.array([-5.0, -1.0, 0.05, 1.0, 5.0, np.nan], dtype=np.float32))
+    assert hist.counts[0] == 2 and hist.counts[-1] == 2 and hist.counts.sum() == 5
+
+
+def test_stream_stats_match_numpy_reference(scene):
+    with rasterio.open(scene.path) as src:
+        result = stream_index_stats(src, BANDS, workers=1)
+
+    assert result.valid_pixels == int(scene.valid.sum())
+    assert result.valid_pixel_fraction == round(scene.valid.mean(), 4)
+    for name, reference in (("ndvi", scene.ndvi), ("ndwi", scene.ndwi)):
+        reference = _finite(reference)
+        stats = result.stats[name]
+        assert stats.count == reference.size
+        assert stats.mean == pytest.approx(reference.mean(), abs=1e-6)
+        assert stats.std == pytest.approx(reference.std(), abs=1e-6)
+        assert stats.min == pytest.approx(reference.min(), abs=1e-6)
+        assert stats.max == pytest.approx(reference.max(), abs=1e-6)
+        width = 2 / result.histograms[name].bins
+        assert abs(result.histograms[name].percentile(50) - np.median(reference)) <= width
+
+
+def test_parallel_pass_matches_serial(scene):
+    with rasterio.open(scene.path) as src:
+        serial = stream_index_stats(src, BANDS, workers=1)
+        parallel = stream_index_stats(src, BANDS, workers=4)
+
+    assert parallel.total_pixels == serial.total_pixels
+    assert parallel.valid_pixels == serial.valid_pixels
+    for name in ("ndvi", "ndwi"):
+        a, b = serial.stats[name], parallel.stats[name]
+        assert b.count == a.count
+        assert b.mean == pytest.approx(a.mean, abs=1e-9)
+        assert b.std == pytest.approx(a.std, abs=1e-9)
+        assert (b.min, b.max) == (a.min, a.max)
+        np.testing.assert_array_equal(parallel.histograms[name].counts, serial.histograms[name].counts)
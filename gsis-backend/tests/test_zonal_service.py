@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app.services.raster_stream_service import stream_index_stats
+from app.services.zonal_service import ZonalAccumulator, compute_zonal_stats, parse_zones
+
+rasterio = pytest.importorskip("rasterio")
+
+# (row_start, row_stop, col_start, col_stop) pixel rectangles, in feature order.
+# Zone 2 overlaps zone 1 (rows 40:60, cols 80:100); zone 3 lies inside the
+# all-nodata tile; zone 4 is off the raster.
+ZONES = [(5, 60, 10, 100), (40, 100, 80, 150), (70, 90, 130, 180), None]
+
+
+def _polygon(scene, rect):
+    if rect is None:
+        ring = [[20.0, 40.0], [20.1, 40.0], [20.1, 40.1], [20.0, 40.1], [20.0, 40.0]]
+    else:
+        r0, r1, c0, c1 = rect
+        (x0, y0), (x1, y1) = scene.transform * (c0, r0), scene.transform * (c1, r1)
+        ring = [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def _feature_collection(scene):
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "id": f"z{i}", "properties": {"n": i}, "geometry": _polygon(scene, rect)}
+            for i, rect in enumerate(ZONES)
+        ],
+    }
+
+
+def _reference(scene, values):
+    """Per-zone (count, mean, std) with later features overwriting earlier ones."""
+    labels = np.zeros(values.shape, dtype=np.int32)
+    for i, rect in enumerate(ZONES):
+        if rect is not None:
+            r0, r1, c0, c1 = rect
+            labels[r0:r1, c0:c1] = i + 1
+    out = []
+    for i in range(len(ZONES)):
+        v = values[(labels == i + 1) & np.isfinite(values)]
+        out.append((v.size, v.mean() if v.size else None, v.std() if v.size else None))
+    return out
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_accumulator_matches_reference_with_overlaps(scene, workers):
+    with rasterio.open(scene.path) as src:
+        _, geometries, bounds = parse_zones(_feature_collection(scene), src.crs)
+        accumulator = ZonalAccumulator(geometries, bounds, ("ndvi", "ndwi"))
+        stream_index_stats(src, {"blue": 1, "green": 2, "red": 3, "nir": 4},
+                           histograms=(), workers=workers, visitors=(accumulator,))
+
+    for name, values in (("ndvi", scene.ndvi), ("ndwi", scene.ndwi)):
+        summary = accumulator.summary(name)
+        for i, (count, mean, std) in enumerate(_reference(scene, values)):
+            assert summary["count"][i] == count
+            if count:
+                assert summary["mean"][i] == pytest.approx(mean, abs=1e-6)
+                assert summary["std"][i] == pytest.approx(std, abs=1e-6)
+            else:
+                assert np.isnan(summary["mean"][i])
+
+
+def test_compute_zonal_stats_reports_last_feature_wins(scene):
+    with rasterio.open(scene.path) as src:
+        result = compute_zonal_stats(src, _feature_collection(scene))
+
+    assert result["overlap_rule"] == "last_feature_wins"
+    assert result["total_zones"] == 4 and result["zones_with_data"] == 2
+    assert [z["feature_id"] for z in result["zones"]] == ["z0", "z1", "z2", "z3"]
+    reference = _reference(scene, scene.ndvi)
+    for zone, (count, mean, std) in zip(result["zones"], reference):
+        assert zone["ndvi"]["count"] == count
+        if count:
+            assert zone["ndvi"]["mean"] == pytest.approx(mean, abs=1e-4)
+            assert zone["ndvi"]["std"] == pytest.approx(std, abs=1e-4)
+        else:
+            assert zone["ndvi"]["mean"] is None
+    # Pixels in the overlap count toward zone 2 only
+    valid = scene.valid
+    assert result["zones"][0]["ndvi"]["count"] == valid[5:60, 10:100].sum() - valid[40:60, 80:100].sum()
+    assert result["zones"][1]["ndvi"]["count"] == valid[40:100, 80:150].sum()
+
+
+def test_parse_zones_rejects_points(scene):
+    fc = {"type": "FeatureCollection",
+          "features": [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [10.0, 50.0]}}]}
+    with pytest.raises(ValueError, match="Unsupported geometry type"):
+        parse_zones(fc, "EPSG:4326")